@@ -1,8 +1,9 @@
 from typing import List, Optional, Dict
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form, BackgroundTasks, Response
 from fastapi.responses import StreamingResponse
 from app.schemas.coffee_beans import CoffeeBeanAnalysis, CoffeeBeanResult
 from app.services.coffee_beans_service import CoffeeBeansService
+from app.services.firebase_service import FirebaseService
 from app.api.deps import get_current_user
 from datetime import datetime
 import base64
@@ -11,10 +12,17 @@ import asyncio
 
 router = APIRouter()
 coffee_beans_service = CoffeeBeansService()
+firebase_service = FirebaseService()
 
 # Store for video processing status
 video_processing_status = {}
 
+# Fields list views return; leaves out the per-frame results of video analyses
+ANALYSIS_SUMMARY_FIELDS = [
+    "analysis", "image_url", "video_url", "is_video", "timestamp", "created_at",
+    "farm_id", "field_id", "notes", "filename", "user_id"
+]
+
 @router.post("/analyze-test")
 async def analyze_coffee_beans_test(
     file: UploadFile = File(...),
@@ -44,7 +52,7 @@ async def analyze_coffee_beans_test(
         "is_video": False
     }
     
-    saved_analysis = await coffee_beans_service.save_analysis(analysis_data)
+    saved_analysis = await coffee_beans_service.save_analysis(analysis_data, write_behind=True)
     
     return {
         "id": saved_analysis["id"],
@@ -89,7 +97,7 @@ async def analyze_coffee_beans(
         "is_video": False  # Explicitly set for image analyses
     }
     
-    saved_analysis = await coffee_beans_service.save_analysis(analysis_data)
+    saved_analysis = await coffee_beans_service.save_analysis(analysis_data, write_behind=True)
     
     return {
         "id": saved_analysis["id"],
@@ -107,15 +115,28 @@ async def analyze_coffee_beans(
 
 @router.get("/history")
 async def get_analysis_history(
+    response: Response,
     farm_id: Optional[str] = Query(None),
     field_id: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+    page_token: Optional[str] = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
-    history = await coffee_beans_service.get_user_history(
-        current_user["id"],
-        farm_id=farm_id,
-        field_id=field_id
-    )
+    """Analysis history, newest first. With limit, the next page's token is
+    returned in the X-Next-Page-Token header."""
+    try:
+        history, next_page_token = await coffee_beans_service.get_user_history(
+            current_user["id"],
+            farm_id=farm_id,
+            field_id=field_id,
+            limit=limit,
+            page_token=page_token,
+            select=ANALYSIS_SUMMARY_FIELDS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_page_token:
+        response.headers["X-Next-Page-Token"] = next_page_token
     
     # Format response to match frontend expectations
     formatted_history = []
@@ -155,6 +176,67 @@ async def get_farm_statistics(
     stats = await coffee_beans_service.get_farm_statistics(farm_id, start, end)
     return stats
 
+@router.get("/analyses")
+async def get_all_analyses(
+    response: Response,
+    limit: int = Query(100, ge=1),
+    page_token: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get all coffee beans analyses, newest first.
+
+    The next page's token is returned in the X-Next-Page-Token header.
+    """
+    try:
+        # Ordered and limited by Firestore
+        analyses, next_page_token = await firebase_service.query_page(
+            "coffee_beans_analyses",
+            order_by=[("created_at", "desc")],
+            page_size=limit,
+            page_token=page_token,
+            select=ANALYSIS_SUMMARY_FIELDS
+        )
+        if next_page_token:
+            response.headers["X-Next-Page-Token"] = next_page_token
+        
+        return analyses
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error getting analyses: {e}")
+        import traceback
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{analysis_id}/timeline")
+async def get_analysis_timeline(
+    analysis_id: str,
+    start: Optional[float] = Query(None, ge=0, description="First timestamp in seconds"),
+    end: Optional[float] = Query(None, ge=0, description="Last timestamp in seconds"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Per-frame results of a video analysis, optionally limited to a time range"""
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    try:
+        frames = await coffee_beans_service.get_frame_timeline(analysis_id, start, end)
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Frame data for this analysis is no longer available")
+    except OSError as e:
+        print(f"Error reading frame data of {analysis_id}: {e}")
+        raise HTTPException(status_code=500, detail="Frame data for this analysis could not be read")
+    if frames is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return {
+        "analysis_id": analysis_id,
+        "start": start,
+        "end": end,
+        "total": len(frames),
+        "frames": frames
+    }
+
 @router.get("/{analysis_id}", response_model=CoffeeBeanResult)
 async def get_analysis(analysis_id: str, current_user: dict = Depends(get_current_user)):
     analysis = await coffee_beans_service.get_analysis(analysis_id)
@@ -283,7 +365,7 @@ async def process_video_background(
             "frame_analyses": results["frame_analyses"]
         }
         
-        saved_analysis = await coffee_beans_service.save_video_analysis(analysis_data)
+        saved_analysis = await coffee_beans_service.save_video_analysis(analysis_data, write_behind=True)
         
         # Update job status
         video_processing_status[job_id].update({
@@ -308,26 +390,3 @@ def update_job_progress(job_id: str, progress: dict):
     """Update job progress."""
     if job_id in video_processing_status:
         video_processing_status[job_id].update(progress)
-
-@router.get("/analyses")
-async def get_all_analyses(
-    limit: int = 100,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get all coffee beans analyses"""
-    try:
-        # Get analyses from Firestore
-        analyses = await firebase_service.query_documents(
-            "coffee_beans_analyses",
-            limit=limit
-        )
-        
-        # Sort manually by created_at
-        analyses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        return analyses
-    except Exception as e:
-        print(f"Error getting analyses: {e}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
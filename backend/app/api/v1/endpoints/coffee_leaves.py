@@ -1,5 +1,5 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form, Response
 from app.schemas.coffee_leaves import CoffeeLeafAnalysis, CoffeeLeafResult
 from app.services.coffee_leaves_service import CoffeeLeavesService
 from app.services.firebase_service import FirebaseService
@@ -10,6 +10,11 @@ router = APIRouter()
 coffee_leaves_service = CoffeeLeavesService()
 firebase_service = FirebaseService()
 
+# Fields of CoffeeLeafResult, read instead of whole documents by list views
+ANALYSIS_SUMMARY_FIELDS = [
+    "user_id", "filename", "analysis", "image_url", "farm_id", "field_id", "notes", "timestamp", "created_at"
+]
+
 @router.post("/analyze-test")
 async def analyze_coffee_leaves_test(
     file: UploadFile = File(...),
@@ -38,7 +43,7 @@ async def analyze_coffee_leaves_test(
         "notes": notes or ""
     }
     
-    saved_analysis = await coffee_leaves_service.save_analysis(analysis_data)
+    saved_analysis = await coffee_leaves_service.save_analysis(analysis_data, write_behind=True)
     
     return {
         "id": saved_analysis["id"],
@@ -81,7 +86,7 @@ async def analyze_coffee_leaves(
         "timestamp": result.get("timestamp")
     }
     
-    saved_analysis = await coffee_leaves_service.save_analysis(analysis_data)
+    saved_analysis = await coffee_leaves_service.save_analysis(analysis_data, write_behind=True)
     
     return {
         "id": saved_analysis["id"],
@@ -93,34 +98,58 @@ async def analyze_coffee_leaves(
 
 @router.get("/history", response_model=List[CoffeeLeafResult])
 async def get_analysis_history(
+    response: Response,
     farm_id: Optional[str] = Query(None),
     field_id: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+    page_token: Optional[str] = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
-    history = await coffee_leaves_service.get_user_history(
-        current_user["id"],
-        farm_id=farm_id,
-        field_id=field_id
-    )
+    """Analysis history, newest first. With limit, the next page's token is
+    returned in the X-Next-Page-Token header."""
+    try:
+        history, next_page_token = await coffee_leaves_service.get_user_history(
+            current_user["id"],
+            farm_id=farm_id,
+            field_id=field_id,
+            limit=limit,
+            page_token=page_token,
+            select=ANALYSIS_SUMMARY_FIELDS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_page_token:
+        response.headers["X-Next-Page-Token"] = next_page_token
     return history
 
 @router.get("/analyses")
 async def get_all_analyses(
-    limit: int = 100,
+    response: Response,
+    limit: int = Query(100, ge=1),
+    page_token: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all coffee leaves analyses"""
+    """Get all coffee leaves analyses, newest first.
+
+    The next page's token is returned in the X-Next-Page-Token header.
+    """
     try:
-        # Get analyses from Firestore
-        analyses = await firebase_service.query_documents(
+        # Ordered and limited by Firestore
+        analyses, next_page_token = await firebase_service.query_page(
             "coffee_leaves_analyses",
-            limit=limit
+            order_by=[("created_at", "desc")],
+            page_size=limit,
+            page_token=page_token,
+            select=ANALYSIS_SUMMARY_FIELDS
         )
-        
-        # Sort manually by created_at
-        analyses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+        if next_page_token:
+            response.headers["X-Next-Page-Token"] = next_page_token
         
         return analyses
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting analyses: {e}")
         import traceback
@@ -87,9 +87,11 @@ async def enroll_face(
         "face_enrollment_date": datetime.now().isoformat()
     }
     
+    # The response already carries the URLs, so the farmer update is written behind
     await firebase_service.update_farmer(
         enrollment_data.farmer_id,
-        update_data
+        update_data,
+        write_behind=True
     )
     
     message = f"Successfully {'updated' if is_overwriting else 'enrolled'} face with {embeddings_saved} angles"
@@ -120,12 +122,11 @@ async def verify_face(
     result = await face_service.recognize_face(image_bytes)
     
     if result["success"]:
-        # Get farmer details
-        farmer = await firebase_service.get_farmer(result["farmer_id"])
+        # recognize_face already looked up the farmer
         return {
             "verified": True,
             "farmer_id": result["farmer_id"],
-            "farmer_name": farmer.get("name") or farmer.get("full_name") or "Unknown" if farmer else "Unknown",
+            "farmer_name": result["farmer"]["name"],
             "confidence": result["confidence"],
             "message": "Face verified successfully"
         }
@@ -166,6 +167,8 @@ async def check_face_quality(
         quality_result = await face_service.check_face_quality(image_bytes, expected_angle=request.expected_angle)
         
         return quality_result
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in check_face_quality: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
@@ -243,13 +246,12 @@ async def verify_face_json(
         result = await face_service.recognize_face(image_bytes)
         
         if result["success"]:
-            # Get farmer details
-            farmer = await firebase_service.get_farmer(result["farmer_id"])
+            # recognize_face already looked up the farmer
             return {
                 "verified": True,
                 "farmer_id": result["farmer_id"],
-                "farmer_name": farmer.get("name") or farmer.get("full_name") or "Unknown" if farmer else "Unknown",
-                "farm_id": farmer.get("farm_id") if farmer else None,
+                "farmer_name": result["farmer"]["name"],
+                "farm_id": result["farmer"]["farm_id"],
                 "confidence": result["confidence"],
                 "message": "Face verified successfully"
             }
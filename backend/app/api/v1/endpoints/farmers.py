@@ -1,5 +1,5 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from app.schemas.farmer import Farmer, FarmerCreate, FarmerUpdate
 from app.services.firebase_service import FirebaseService
 from app.api.deps import get_current_user
@@ -7,9 +7,16 @@ from app.api.deps import get_current_user
 router = APIRouter()
 firebase_service = FirebaseService()
 
+# Fields the farmer list returns (and the legacy names mapped onto them); face_images is left out
+FARMER_LIST_FIELDS = [
+    "name", "full_name", "email", "phone", "address", "farm_id", "farm_name", "field_id", "field_name",
+    "section_id", "section_name", "gender", "date_of_birth", "farmer_code", "face_enrolled",
+    "has_face_enrolled", "created_at", "updated_at", "updatedAt", "is_active"
+]
+
 @router.get("/", response_model=List[Farmer])
 async def get_farmers(current_user: dict = Depends(get_current_user)):
-    farmers = await firebase_service.get_farmers()
+    farmers = await firebase_service.get_farmers(select=FARMER_LIST_FIELDS)
     # Transform data to match schema
     transformed_farmers = []
     for farmer in farmers:
@@ -57,7 +64,9 @@ async def update_farmer(
     farmer_data: FarmerUpdate,
     current_user: dict = Depends(get_current_user)
 ):
-    farmer = await firebase_service.update_farmer(farmer_id, farmer_data.dict(exclude_unset=True))
+    farmer = await firebase_service.update_farmer(
+        farmer_id, farmer_data.dict(exclude_unset=True), return_document="merged"
+    )
     if not farmer:
         raise HTTPException(status_code=404, detail="Farmer not found")
     return farmer
@@ -72,13 +81,19 @@ async def delete_farmer(farmer_id: str, current_user: dict = Depends(get_current
 @router.get("/{farmer_id}/attendances")
 async def get_farmer_attendances(
     farmer_id: str,
-    limit: int = 100,  # Increased default limit
-    offset: int = 0,
+    limit: int = Query(100, ge=1),  # Increased default limit
+    page_token: Optional[str] = None,
+    offset: int = Query(0, ge=0, deprecated=True),
     date_from: str = None,
     date_to: str = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get attendance records for a specific farmer with improved filtering"""
+    """Get attendance records for a specific farmer with improved filtering.
+
+    Records are returned a page at a time, newest first; pass the returned
+    next_page_token to get the following page. offset is still accepted for
+    the first page, for older clients; it cannot be combined with page_token.
+    """
     from datetime import date, timedelta
     
     # Get farmer details first
@@ -99,31 +114,22 @@ async def get_farmer_attendances(
     if date_to:
         filters.append(("date", "<=", date_to))
     
-    # Get attendance records for this farmer
-    attendances = await firebase_service.query_documents(
-        "attendance",
-        filters=filters
-    )
-    
-    # Remove duplicates: keep only the latest attendance per farmer per date
-    unique_attendances = {}
-    for attendance in attendances:
-        key = f"{attendance.get('farmer_id')}_{attendance.get('date')}"
-        if key not in unique_attendances:
-            unique_attendances[key] = attendance
-        else:
-            # Keep the one with latest check_in_time
-            existing_time = unique_attendances[key].get('check_in_time', '')
-            current_time = attendance.get('check_in_time', '')
-            if current_time > existing_time:
-                unique_attendances[key] = attendance
-    
-    # Convert back to list and sort by date first, then check_in_time (newest first)
-    attendances = list(unique_attendances.values())
-    attendances.sort(key=lambda x: (x.get("date", ""), x.get("check_in_time", "")), reverse=True)
+    if offset and page_token:
+        raise HTTPException(status_code=400, detail="Use either offset or page_token, not both")
     
-    # Apply offset and limit
-    paginated_attendances = attendances[offset:offset + limit] if limit else attendances[offset:]
+    # Get one page of attendance records, sorted by date first, then check_in_time (newest first)
+    try:
+        attendances, next_page_token = await firebase_service.query_page(
+            "attendance",
+            filters=filters,
+            order_by=[("date", "desc"), ("check_in_time", "desc")],
+            page_size=offset + limit,
+            page_token=page_token
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Deprecated offset paging: skip the first records; the token still continues after the last one
+    attendances = attendances[offset:]
     
     return {
         "farmer_id": farmer_id,
@@ -133,5 +139,6 @@ async def get_farmer_attendances(
         "total_records": len(attendances),
         "limit": limit,
         "offset": offset,
-        "attendances": paginated_attendances
+        "next_page_token": next_page_token,
+        "attendances": attendances
     }
\ No newline at end of file
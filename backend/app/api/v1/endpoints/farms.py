@@ -234,6 +234,8 @@ async def generate_dummy_farms_test():
             "farms_created": [f.get("farm_name", "Unknown") for f in dummy_farms]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error generating dummy farms: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -6,6 +6,9 @@ from typing import List, Optional
 
 router = APIRouter()
 
+# Payroll only needs each farmer's name; farmers are streamed with just these fields
+FARMER_NAME_FIELDS = ["full_name", "name"]
+
 def generate_mock_payroll_data(farmer_id: str, month: str, farmer_name: str = "Unknown"):
     """Generate mock payroll data for a farmer"""
     year, month_num = month.split('-')
@@ -95,6 +98,8 @@ async def get_farmer_payroll(
         payroll_data = generate_mock_payroll_data(farmer_id, month, farmer_name)
         
         return payroll_data
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -106,21 +111,17 @@ async def get_farm_payroll(
 ):
     """Get payroll summary for all farmers in a farm for a specific month"""
     try:
-        # Get all farmers in the farm
-        farmers = await firebase.query_documents(
-            "farmers",
-            filters=[("farm_id", "==", farm_id)]
-        )
-        
-        if not farmers:
-            return {"farm_id": farm_id, "month": month, "payrolls": [], "summary": {}}
-        
         payrolls = []
         total_gross = 0
         total_deductions = 0
         total_net = 0
         
-        for farmer in farmers:
+        # Stream all farmers in the farm
+        async for farmer in firebase.iter_documents(
+            "farmers",
+            filters=[("farm_id", "==", farm_id)],
+            select=FARMER_NAME_FIELDS
+        ):
             farmer_id = farmer["id"]
             farmer_name = farmer.get("full_name") or farmer.get("name") or "Unknown"
             
@@ -131,12 +132,15 @@ async def get_farm_payroll(
             total_deductions += payroll["deductions"]["total"]
             total_net += payroll["net_pay"]
         
+        if not payrolls:
+            return {"farm_id": farm_id, "month": month, "payrolls": [], "summary": {}}
+        
         summary = {
-            "total_farmers": len(farmers),
+            "total_farmers": len(payrolls),
             "total_gross_pay": total_gross,
             "total_deductions": total_deductions,
             "total_net_pay": total_net,
-            "average_net_pay": int(total_net / len(farmers)) if farmers else 0,
+            "average_net_pay": int(total_net / len(payrolls)),
             "payment_status_breakdown": {
                 "paid": len([p for p in payrolls if p["payment_status"] == "paid"]),
                 "pending": len([p for p in payrolls if p["payment_status"] == "pending"]),
@@ -150,6 +154,8 @@ async def get_farm_payroll(
             "payrolls": payrolls,
             "summary": summary
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -161,18 +167,12 @@ async def calculate_payroll(
 ):
     """Calculate payroll for all farmers or specific farm for a month"""
     try:
-        # Get farmers
-        if farm_id:
-            farmers = await firebase.query_documents(
-                "farmers",
-                filters=[("farm_id", "==", farm_id)]
-            )
-        else:
-            farmers = await firebase.query_documents("farmers")
+        # Stream farmers
+        filters = [("farm_id", "==", farm_id)] if farm_id else None
         
         calculated_payrolls = []
         
-        for farmer in farmers:
+        async for farmer in firebase.iter_documents("farmers", filters=filters, select=FARMER_NAME_FIELDS):
             farmer_id = farmer["id"]
             farmer_name = farmer.get("full_name") or farmer.get("name") or "Unknown"
             
@@ -192,6 +192,8 @@ async def calculate_payroll(
             "total_amount": sum(p["net_pay"] for p in calculated_payrolls),
             "payrolls": calculated_payrolls
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -203,30 +205,19 @@ async def get_payroll_summary(
 ):
     """Get overall payroll summary for a month"""
     try:
-        # Get farmers
-        if farm_id:
-            farmers = await firebase.query_documents(
-                "farmers",
-                filters=[("farm_id", "==", farm_id)]
-            )
-        else:
-            farmers = await firebase.query_documents("farmers")
-        
-        if not farmers:
-            return {
-                "month": month,
-                "farm_id": farm_id,
-                "summary": {"total_farmers": 0, "total_payroll": 0}
-            }
+        # Stream farmers, keeping only running totals
+        filters = [("farm_id", "==", farm_id)] if farm_id else None
         
         # Generate payroll data for summary
+        farmer_count = 0
         total_gross = 0
         total_deductions = 0
         total_net = 0
         payment_status_count = {"paid": 0, "pending": 0, "processing": 0}
-        performance_metrics = {"attendance": [], "productivity": [], "quality": []}
+        performance_totals = {"attendance": 0, "productivity": 0, "quality": 0}
         
-        for farmer in farmers:
+        async for farmer in firebase.iter_documents("farmers", filters=filters, select=FARMER_NAME_FIELDS):
+            farmer_count += 1
             farmer_id = farmer["id"]
             farmer_name = farmer.get("full_name") or farmer.get("name") or "Unknown"
             
@@ -237,23 +228,30 @@ async def get_payroll_summary(
             total_net += payroll["net_pay"]
             payment_status_count[payroll["payment_status"]] += 1
             
-            performance_metrics["attendance"].append(payroll["performance_metrics"]["attendance_rate"])
-            performance_metrics["productivity"].append(payroll["performance_metrics"]["productivity_score"])
-            performance_metrics["quality"].append(payroll["performance_metrics"]["quality_score"])
+            performance_totals["attendance"] += payroll["performance_metrics"]["attendance_rate"]
+            performance_totals["productivity"] += payroll["performance_metrics"]["productivity_score"]
+            performance_totals["quality"] += payroll["performance_metrics"]["quality_score"]
+        
+        if not farmer_count:
+            return {
+                "month": month,
+                "farm_id": farm_id,
+                "summary": {"total_farmers": 0, "total_payroll": 0}
+            }
         
-        avg_attendance = sum(performance_metrics["attendance"]) / len(farmers)
-        avg_productivity = sum(performance_metrics["productivity"]) / len(farmers)
-        avg_quality = sum(performance_metrics["quality"]) / len(farmers)
+        avg_attendance = performance_totals["attendance"] / farmer_count
+        avg_productivity = performance_totals["productivity"] / farmer_count
+        avg_quality = performance_totals["quality"] / farmer_count
         
         return {
             "month": month,
             "farm_id": farm_id,
             "summary": {
-                "total_farmers": len(farmers),
+                "total_farmers": farmer_count,
                 "total_gross_payroll": total_gross,
                 "total_deductions": total_deductions,
                 "total_net_payroll": total_net,
-                "average_net_pay": int(total_net / len(farmers)),
+                "average_net_pay": int(total_net / farmer_count),
                 "payment_status": payment_status_count,
                 "performance_averages": {
                     "attendance_rate": round(avg_attendance, 1),
@@ -269,6 +267,8 @@ async def get_payroll_summary(
                 }
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -289,6 +289,8 @@ async def process_payment(
             "payment_date": datetime.now().strftime("%Y-%m-%d"),
             "transaction_id": f"TXN_{random.randint(100000, 999999)}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -313,5 +315,7 @@ async def export_payroll(
             "expires_at": (datetime.now() + timedelta(hours=24)).isoformat(),
             "file_size": f"{random.randint(50, 500)}KB"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
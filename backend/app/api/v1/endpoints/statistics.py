@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.services.firebase_service import FirebaseService
 from datetime import datetime
+import asyncio
 
 router = APIRouter()
 
@@ -10,35 +11,44 @@ async def get_dashboard_statistics(
 ):
     """Get dashboard statistics"""
     try:
-        # Get farmers statistics
-        farmers = await firebase.get_farmers()
-        farmers_with_face = [f for f in farmers if f.get('face_enrolled', False) or f.get('has_face_enrolled', False)]
-        
-        # Get attendance statistics for today
         today = datetime.now().strftime("%Y-%m-%d")
-        attendances = await firebase.get_attendance_by_date(today)
-        active_attendances = [a for a in attendances if a.get('status') == 'working']
-        completed_attendances = [a for a in attendances if a.get('status') == 'completed']
         
-        # Get farms statistics
-        farms = await firebase.get_farms()
+        # Every figure is a count aggregation, so no documents are read
+        (
+            total_farmers, inactive_farmers, face_enrolled, legacy_face_enrolled, both_face_enrolled,
+            attendances_today, active_attendances, completed_attendances,
+            total_farms, inactive_farms
+        ) = await asyncio.gather(
+            firebase.count("farmers"),
+            firebase.count("farmers", [("is_active", "==", False)]),
+            # Enrollment is recorded in face_enrolled or the legacy has_face_enrolled
+            firebase.count("farmers", [("face_enrolled", "==", True)]),
+            firebase.count("farmers", [("has_face_enrolled", "==", True)]),
+            firebase.count("farmers", [("face_enrolled", "==", True), ("has_face_enrolled", "==", True)]),
+            firebase.count("attendance", [("date", "==", today)]),
+            firebase.count("attendance", [("date", "==", today), ("status", "==", "working")]),
+            firebase.count("attendance", [("date", "==", today), ("status", "==", "completed")]),
+            firebase.count("farms"),
+            firebase.count("farms", [("is_active", "==", False)])
+        )
+        farmers_with_face = face_enrolled + legacy_face_enrolled - both_face_enrolled
         
         return {
             "farmers": {
-                "total": len(farmers),
-                "active": len([f for f in farmers if f.get('is_active', True)]),
-                "with_face_enrolled": len(farmers_with_face),
-                "enrollment_rate": len(farmers_with_face) / len(farmers) if farmers else 0
+                "total": total_farmers,
+                "active": total_farmers - inactive_farmers,
+                "with_face_enrolled": farmers_with_face,
+                "enrollment_rate": farmers_with_face / total_farmers if total_farmers else 0
             },
             "attendances": {
-                "today": len(attendances),
-                "active": len(active_attendances),
-                "checked_out_today": len(completed_attendances),
-                "attendance_rate": len(attendances) / len(farmers) if farmers else 0
+                "today": attendances_today,
+                "active": active_attendances,
+                "checked_out_today": completed_attendances,
+                "attendance_rate": attendances_today / total_farmers if total_farmers else 0
             },
             "farms": {
-                "total": len(farms),
-                "active": len([f for f in farms if f.get('is_active', True)])
+                "total": total_farms,
+                "active": total_farms - inactive_farms
             },
             "system": {
                 "mode": "mock" if firebase.db is None else "production",
@@ -73,6 +83,13 @@ async def get_dashboard_statistics(
             }
         }
 
+@router.get("/datastore")
+async def get_datastore_statistics(
+    firebase: FirebaseService = Depends(FirebaseService)
+):
+    """Get datastore executor metrics (queue depth, in-flight calls, latency per collection)"""
+    return firebase.get_metrics()
+
 @router.get("/summary")
 async def get_summary_statistics(
     firebase: FirebaseService = Depends(FirebaseService)
@@ -125,6 +125,8 @@ async def get_farmer_tasks(
                               and t["status"] not in ["completed", "cancelled"]])
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -169,6 +171,8 @@ async def get_farm_tasks(
                               and t["status"] not in ["completed", "cancelled"]])
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -214,6 +218,8 @@ async def assign_task(
             "message": "Task assigned successfully",
             "task": task
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -246,6 +252,8 @@ async def update_task_status(
             "message": "Task updated successfully",
             "task": updated_task
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -312,6 +320,8 @@ async def get_tasks_dashboard(
                 if task["status"] == "completed"
             ][:5]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -368,5 +378,7 @@ async def get_farmer_task_performance(
             },
             "recent_tasks": recent_tasks[:10]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
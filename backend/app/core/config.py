@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 from pydantic_settings import BaseSettings
 from pydantic import validator
 import os
@@ -37,12 +37,104 @@ class Settings(BaseSettings):
     
     FIREBASE_CONFIG_PATH: str = os.getenv("FIREBASE_CONFIG_PATH", "app/credentials/firebase-admin.json")
     USE_MOCK_FIREBASE: bool = os.getenv("USE_MOCK_FIREBASE", "False").lower() == "true"
+    # Mock mode only: delay (and optionally fail) every datastore call like a real round trip, for
+    # benchmarking endpoints offline. Keys are operations (read, query, aggregate, write, delete),
+    # "collection.operation" overrides or "default"; values are median_ms, p95_ms and failure_rate
+    MOCK_DATASTORE_LATENCY: bool = os.getenv("MOCK_DATASTORE_LATENCY", "False").lower() == "true"
+    MOCK_DATASTORE_LATENCY_PROFILE: Dict[str, Dict[str, float]] = {
+        "read": {"median_ms": 60.0, "p95_ms": 120.0},
+        "query": {"median_ms": 80.0, "p95_ms": 150.0},
+        "aggregate": {"median_ms": 80.0, "p95_ms": 150.0},
+        "write": {"median_ms": 70.0, "p95_ms": 140.0},
+        "delete": {"median_ms": 70.0, "p95_ms": 140.0}
+    }
+    MOCK_DATASTORE_LATENCY_SEED: Optional[int] = None
+    
+    # Firestore client: "threaded" (sync SDK on a thread pool), "async" (native async client)
+    # or "sqlite" (embedded database and local file storage, no Firebase project needed)
+    FIRESTORE_BACKEND: str = os.getenv("FIRESTORE_BACKEND", "threaded")
+    SQLITE_DATABASE_PATH: str = os.getenv("SQLITE_DATABASE_PATH", "data/datastore.sqlite3")
+    SQLITE_POOL_SIZE: int = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+    # Fields stored as indexed generated columns so filters on them use an index
+    SQLITE_INDEXED_FIELDS: List[str] = ["farmer_id", "farm_id", "date", "status", "user_id"]
+    # Local directory that stands in for the Storage bucket, and the URL path it is served under
+    LOCAL_STORAGE_DIR: str = os.getenv("LOCAL_STORAGE_DIR", "uploads/storage")
+    LOCAL_STORAGE_URL_PREFIX: str = os.getenv("LOCAL_STORAGE_URL_PREFIX", "/storage")
+    
+    # Dedicated thread pool for blocking Firestore calls
+    FIRESTORE_MAX_WORKERS: int = int(os.getenv("FIRESTORE_MAX_WORKERS", "32"))
+    FIRESTORE_TIMEOUT_SECONDS: float = float(os.getenv("FIRESTORE_TIMEOUT_SECONDS", "30"))
+    # Per-operation timeouts (read, query, aggregate, write, delete), JSON in the environment
+    FIRESTORE_OPERATION_TIMEOUTS: Dict[str, float] = {
+        "read": 10.0, "query": 30.0, "aggregate": 30.0, "write": 15.0, "delete": 15.0
+    }
+    # Retry and hedging policy per operation, JSON in the environment. retries apply to transient
+    # errors only, after a full-jitter delay starting at backoff_seconds; hedge sends a duplicate
+    # read once a call is slower than that collection's p95. Writes are not retried: a timed-out
+    # write may still have been applied.
+    FIRESTORE_RETRY_POLICIES: Dict[str, Dict] = {
+        "read": {"retries": 2, "backoff_seconds": 0.2, "hedge": True},
+        "query": {"retries": 2, "backoff_seconds": 0.2, "hedge": True},
+        "aggregate": {"retries": 2, "backoff_seconds": 0.5},
+        "write": {"retries": 0},
+        "delete": {"retries": 0}
+    }
+    # Consecutive transient failures that open a collection's circuit, and seconds until it is probed
+    FIRESTORE_BREAKER_FAILURES: int = int(os.getenv("FIRESTORE_BREAKER_FAILURES", "5"))
+    FIRESTORE_BREAKER_RESET_SECONDS: float = float(os.getenv("FIRESTORE_BREAKER_RESET_SECONDS", "30"))
+    # Max concurrent calls per collection, e.g. {"coffee_beans_analyses": 4}
+    FIRESTORE_COLLECTION_CONCURRENCY: Dict[str, int] = {}
+    # Batches of a bulk write committed in parallel
+    FIRESTORE_BULK_CONCURRENCY: int = int(os.getenv("FIRESTORE_BULK_CONCURRENCY", "4"))
+    # Read-through cache for reference collections: TTL in seconds per collection (0 disables)
+    FIRESTORE_CACHE_TTL_SECONDS: Dict[str, float] = {"farmers": 300.0, "farms": 600.0, "users": 300.0}
+    # Max cached documents per collection before least recently used ones are evicted
+    FIRESTORE_CACHE_MAX_ENTRIES: Dict[str, int] = {"farmers": 5000, "farms": 1000, "users": 1000}
+    # Short-lived query result cache for hot dashboard collections: TTL in seconds per collection
+    FIRESTORE_QUERY_CACHE_TTL_SECONDS: Dict[str, float] = {"attendance": 5.0, "farms": 30.0}
+    # Max cached query results across all collections before least recently used ones are evicted
+    FIRESTORE_QUERY_CACHE_MAX_ENTRIES: int = int(os.getenv("FIRESTORE_QUERY_CACHE_MAX_ENTRIES", "256"))
+    # Small collections served from in-process mirrors kept current by snapshot listeners
+    FIRESTORE_LIVE_MIRRORS: List[str] = ["farmers", "farms", "face_embeddings"]
+    # How long a document written by this process is read directly while its change event is pending
+    FIRESTORE_MIRROR_DIRTY_SECONDS: float = float(os.getenv("FIRESTORE_MIRROR_DIRTY_SECONDS", "5"))
+    # Minimum wait before re-subscribing a listener that stopped
+    FIRESTORE_MIRROR_RESTART_SECONDS: float = float(os.getenv("FIRESTORE_MIRROR_RESTART_SECONDS", "30"))
+    # Write-behind queue for writes the client need not wait for, journaled locally until applied
+    WRITE_BEHIND_JOURNAL_PATH: str = os.getenv("WRITE_BEHIND_JOURNAL_PATH", "data/write_behind.jsonl")
+    WRITE_BEHIND_FLUSH_SECONDS: float = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "1"))
+    WRITE_BEHIND_MAX_BATCH: int = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+    # Failed attempts (with exponential backoff) before a write is moved to the dead-letter file
+    WRITE_BEHIND_MAX_ATTEMPTS: int = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "8"))
+    WRITE_BEHIND_DRAIN_TIMEOUT_SECONDS: float = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT_SECONDS", "30"))
+    # Keep per-farm daily attendance rollups on check-in/out and serve stats from them
+    # (backfill with scripts/rebuild_attendance_rollups.py)
+    ATTENDANCE_ROLLUPS_ENABLED: bool = os.getenv("ATTENDANCE_ROLLUPS_ENABLED", "True").lower() == "true"
+    # How long check-in/out responses are kept for replay to clients retrying with an Idempotency-Key
+    IDEMPOTENCY_KEY_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+    # Offline attendance sync: max events per batch, photos processed at once, and max
+    # uncompressed bytes read from one upload or archive
+    ATTENDANCE_SYNC_MAX_EVENTS: int = int(os.getenv("ATTENDANCE_SYNC_MAX_EVENTS", "1000"))
+    ATTENDANCE_SYNC_PHOTO_CONCURRENCY: int = int(os.getenv("ATTENDANCE_SYNC_PHOTO_CONCURRENCY", "8"))
+    ATTENDANCE_SYNC_MAX_UPLOAD_BYTES: int = int(os.getenv("ATTENDANCE_SYNC_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
     
     ONNX_MODEL_PATH: str = "app/models/face_recognition.onnx"
     INSIGHTFACE_MODEL_PATH: str = "/home/ailab/.insightface/models/buffalo_l"
     YOLO_BEANS_MODEL_PATH: str = "app/models/coffee_beans.pt"
     YOLO_LEAVES_MODEL_PATH: str = "app/models/coffee_leaves.pt"
     
+    # Storage uploads run on their own pool of this many threads; the timeout includes waiting for one
+    STORAGE_UPLOAD_CONCURRENCY: int = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))
+    STORAGE_UPLOAD_TIMEOUT_SECONDS: float = float(os.getenv("STORAGE_UPLOAD_TIMEOUT_SECONDS", "120"))
+    # Objects above the threshold use a chunked resumable upload (chunks are rounded to 256 KiB)
+    STORAGE_RESUMABLE_THRESHOLD_BYTES: int = int(os.getenv("STORAGE_RESUMABLE_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+    STORAGE_CHUNK_SIZE_BYTES: int = int(os.getenv("STORAGE_CHUNK_SIZE_BYTES", str(8 * 1024 * 1024)))
+    # True when the bucket grants public read (e.g. allUsers: Storage Object Viewer), so uploads skip make_public()
+    STORAGE_PUBLIC_BUCKET: bool = os.getenv("STORAGE_PUBLIC_BUCKET", "False").lower() == "true"
+    # Check-in/out photos are uploaded in the background from this durable queue
+    PHOTO_UPLOAD_JOURNAL_PATH: str = os.getenv("PHOTO_UPLOAD_JOURNAL_PATH", "data/photo_uploads.jsonl")
+    PHOTO_UPLOAD_MAX_ATTEMPTS: int = int(os.getenv("PHOTO_UPLOAD_MAX_ATTEMPTS", "20"))
+    
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     
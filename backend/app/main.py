@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.services.firebase_service import (
+    FirebaseService, drain_write_behind_queue, get_photo_upload_queue, get_write_behind_queue,
+    shutdown_firestore_executor, shutdown_storage_uploader, stop_live_mirrors, stop_photo_upload_queue
+)
+from app.services.datastore_trace import start_trace
+from app.services.firebase_sqlite_service import close_sqlite_client
 import os
 
 app = FastAPI(
@@ -20,6 +26,14 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_datastore_calls(request: Request, call_next):
+    """Report the datastore calls each request made, e.g. to catch N+1 query regressions"""
+    trace = start_trace()
+    response = await call_next(request)
+    response.headers.update(trace.headers())
+    return response
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 # Mount static files
@@ -27,6 +41,27 @@ uploads_path = os.path.join(os.path.dirname(__file__), "..", "uploads")
 os.makedirs(uploads_path, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=uploads_path), name="uploads")
 
+# Files "uploaded" to the local stand-in for the Storage bucket, at the URLs its blobs report
+if settings.FIRESTORE_BACKEND == "sqlite":
+    os.makedirs(settings.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(settings.LOCAL_STORAGE_URL_PREFIX, StaticFiles(directory=settings.LOCAL_STORAGE_DIR), name="storage")
+
+@app.on_event("startup")
+async def start_datastore():
+    FirebaseService().start_live_mirrors()
+    # Replay writes and uploads journaled before the last shutdown or crash
+    get_write_behind_queue().start()
+    get_photo_upload_queue().start()
+
+@app.on_event("shutdown")
+async def shutdown_datastore():
+    await stop_photo_upload_queue()
+    await drain_write_behind_queue()
+    stop_live_mirrors()
+    shutdown_firestore_executor()
+    shutdown_storage_uploader()
+    close_sqlite_client()
+
 @app.get("/")
 def root():
     return {"message": "AI Coffee Portal API", "version": settings.VERSION}
\ No newline at end of file
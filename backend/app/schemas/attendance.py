@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Literal, Optional
 from datetime import datetime
 
 class AttendanceBase(BaseModel):
@@ -23,4 +23,14 @@ class AttendanceStats(BaseModel):
     total_today: int
     total_week: int
     total_month: int
-    average_confidence: float
\ No newline at end of file
+    average_confidence: float
+
+class SyncEvent(BaseModel):
+    """A check-in or check-out queued on a device while it was offline"""
+    event_id: str  # generated on the device; resending it never repeats the event
+    type: Literal["check_in", "check_out"]
+    farmer_id: str
+    farm_id: Optional[str] = None  # required for check_in
+    timestamp: datetime  # when it happened on the device; taken as UTC without a zone
+    location: Optional[Dict[str, float]] = None
+    photo: str  # name of the face photo's file in the upload
@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, Optional
+from datetime import datetime
+import copy
+
+# Per-farm, per-day attendance counters, document ID "{farm_id}_{date}"
+ROLLUP_COLLECTION = "attendance_daily"
+# Check-ins from this hour on count as late
+LATE_CHECK_IN_HOUR = 8
+# Work beyond this many minutes counts as overtime
+OVERTIME_AFTER_MINUTES = 480
+
+
+def check_in_hour(check_in_time) -> int:
+    """Hour of a check-in time (datetime or ISO string), or -1 if there is none"""
+    if isinstance(check_in_time, str):
+        check_in_time = datetime.fromisoformat(check_in_time.replace('Z', '+00:00'))
+    return check_in_time.hour if check_in_time is not None else -1
+
+
+def rollup_id(farm_id: str, date_str: str) -> str:
+    return f"{farm_id}_{date_str}"
+
+
+def empty_rollup(farm_id: str, date_str: str) -> Dict:
+    return {
+        "farm_id": farm_id,
+        "date": date_str,
+        "present": 0,
+        "completed": 0,
+        "late": 0,
+        "overtime": 0,
+        "total_minutes": 0,
+        "active_farmers": [],
+        "updated_at": datetime.now()
+    }
+
+
+def apply_check_in(rollup: Optional[Dict], record: Dict) -> Optional[Dict]:
+    """Rollup with a check-in counted, or None if the farmer is already counted as working"""
+    rollup = copy.deepcopy(rollup) if rollup is not None else empty_rollup(record["farm_id"], record["date"])
+    if record["farmer_id"] in rollup["active_farmers"]:
+        return None
+    rollup["present"] += 1
+    if check_in_hour(record.get("check_in_time")) >= LATE_CHECK_IN_HOUR:
+        rollup["late"] += 1
+    rollup["active_farmers"].append(record["farmer_id"])
+    rollup["updated_at"] = datetime.now()
+    return rollup
+
+
+def apply_check_out(rollup: Optional[Dict], record: Dict) -> Optional[Dict]:
+    """Rollup with a check-out counted, or None if the farmer is not counted as working"""
+    if rollup is None or record["farmer_id"] not in rollup["active_farmers"]:
+        return None
+    rollup = copy.deepcopy(rollup)
+    minutes = record.get("work_duration_minutes") or 0
+    rollup["active_farmers"].remove(record["farmer_id"])
+    rollup["completed"] += 1
+    rollup["total_minutes"] += minutes
+    if minutes > OVERTIME_AFTER_MINUTES:
+        rollup["overtime"] += 1
+    rollup["updated_at"] = datetime.now()
+    return rollup
+
+
+def build_rollups(records: Iterable[Dict], date_str: str) -> Dict[str, Dict]:
+    """Rollups by farm ID recomputed from one date's attendance records.
+
+    Each farmer's first record counts, replayed as a check-in and, once
+    checked out, a check-out, so rebuilt and incrementally kept rollups agree.
+    """
+    rollups: Dict[str, Dict] = {}
+    seen = set()
+    for record in records:
+        farmer_id, farm_id = record.get("farmer_id"), record.get("farm_id")
+        if not farmer_id or not farm_id or farmer_id in seen:
+            continue
+        seen.add(farmer_id)
+        record = {**record, "date": date_str}
+        rollup = apply_check_in(rollups.get(farm_id), record) or rollups.get(farm_id)
+        if record.get("check_out_time") or record.get("status") == "completed":
+            rollup = apply_check_out(rollup, record) or rollup
+        rollups[farm_id] = rollup
+    return rollups
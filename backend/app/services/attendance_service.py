@@ -1,11 +1,44 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, date, timedelta, timezone
+import asyncio
 import logging
+import numpy as np
 
+from app.core.config import settings
+from app.services.attendance_rollups import (
+    LATE_CHECK_IN_HOUR, OVERTIME_AFTER_MINUTES, ROLLUP_COLLECTION, apply_check_in, apply_check_out,
+    build_rollups, check_in_hour, empty_rollup, rollup_id
+)
 from app.services.firebase_service import FirebaseService
 
 logger = logging.getLogger(__name__)
 
+
+def _summary(farm_id: str, date_str: str, total_farmers: int, present: int, late: int, overtime: int) -> Dict:
+    # Rollups count a check-in under the record's farm even if the farmer has since
+    # moved or been deactivated, so present can exceed the active farmers
+    attendance_rate = min(present / total_farmers * 100, 100) if total_farmers > 0 else 0
+    return {
+        "farm_id": farm_id,
+        "date": date_str,
+        "total_farmers": total_farmers,
+        "present": present,
+        "absent": max(total_farmers - present, 0),
+        "late": late,
+        "overtime": overtime,
+        "attendance_rate": round(attendance_rate, 2)
+    }
+
+
+def attendance_id(farmer_id: str, date_str: str) -> str:
+    """Document ID of a farmer's attendance on a date, so a retried check-in finds the first one"""
+    return f"attendance_{farmer_id}_{date_str}"
+
+
+def _empty_summary(farm_id: str, date_str: str) -> Dict:
+    return {**_summary(farm_id, date_str, 0, 0, 0, 0), "attendance_rate": 0.0}
+
+
 class AttendanceService:
     """Service for attendance management with daily validation"""
     
@@ -40,8 +73,11 @@ class AttendanceService:
         """Get attendance record for a specific farmer on a specific date"""
         try:
             date_str = target_date.isoformat()
+            record = await self.db_service.get_document("attendance", attendance_id(farmer_id, date_str))
+            if record:
+                return record
             
-            # Query attendance for farmer on specific date
+            # Records saved before IDs were per farmer and date have to be queried
             filters = [
                 ("farmer_id", "==", farmer_id),
                 ("date", "==", date_str)
@@ -117,59 +153,197 @@ class AttendanceService:
     
     async def get_attendance_summary(self, farm_id: str, target_date: date) -> Dict:
         """Get attendance summary for a farm on specific date"""
+        summaries = await self.get_attendance_summaries(target_date, [farm_id])
+        return summaries[farm_id]
+
+    async def get_attendance_summaries(self, target_date: date, farm_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Attendance summaries for one date, by farm ID.
+
+        Makes two calls however many farms and farmers there are: the active
+        farmers query, and either one batched read of the farms' daily
+        rollups (ATTENDANCE_ROLLUPS_ENABLED) or the date's attendance query
+        grouped per farm with numpy. Farms without a rollup for the date
+        (no check-in through the API yet, or a date not backfilled) are
+        grouped from the attendance query, one more call. farm_ids=None
+        summarizes every farm that has active farmers.
+        """
+        date_str = target_date.isoformat()
         try:
-            date_str = target_date.isoformat()
-            
-            # Get all farmers for the farm
-            farmers = await self.db_service.query_documents(
-                "farmers",
-                filters=[("farm_id", "==", farm_id), ("is_active", "==", True)]
-            )
-            total_farmers = len(farmers)
-            
-            # Get attendance records for the date
-            present = 0
-            late = 0
-            overtime = 0
-            
-            for farmer in farmers:
-                attendance = await self.get_today_attendance_for_farmer(farmer['id'], target_date)
-                if attendance:
-                    present += 1
-                    
-                    # Check if late (after 8 AM)
-                    check_in_time = attendance.get('check_in_time')
-                    if isinstance(check_in_time, str):
-                        check_in_time = datetime.fromisoformat(check_in_time.replace('Z', '+00:00'))
-                    
-                    if check_in_time.hour >= 8:
-                        late += 1
-                    
-                    # Check overtime
-                    if attendance.get('work_duration_minutes', 0) > 480:  # 8 hours
-                        overtime += 1
-            
-            attendance_rate = (present / total_farmers * 100) if total_farmers > 0 else 0
-            
-            return {
-                "farm_id": farm_id,
-                "date": date_str,
-                "total_farmers": total_farmers,
-                "present": present,
-                "absent": total_farmers - present,
-                "late": late,
-                "overtime": overtime,
-                "attendance_rate": round(attendance_rate, 2)
-            }
+            farmer_filters = [("is_active", "==", True)]
+            if farm_ids is not None and len(farm_ids) == 1:
+                farmer_filters.insert(0, ("farm_id", "==", farm_ids[0]))
+            farmers_query = self.db_service.query_documents("farmers", filters=farmer_filters, select=["farm_id"])
+            if settings.ATTENDANCE_ROLLUPS_ENABLED and farm_ids is not None:
+                # Rollup IDs are known up front, so both reads run concurrently
+                farm_ids = list(dict.fromkeys(farm_ids))
+                farmers, rollups = await asyncio.gather(
+                    farmers_query,
+                    self.db_service.get_documents(ROLLUP_COLLECTION, [rollup_id(farm_id, date_str) for farm_id in farm_ids])
+                )
+            elif settings.ATTENDANCE_ROLLUPS_ENABLED:
+                farmers = await farmers_query
+                farm_ids = sorted({farmer.get("farm_id") for farmer in farmers if farmer.get("farm_id")})
+                rollups = await self.db_service.get_documents(
+                    ROLLUP_COLLECTION, [rollup_id(farm_id, date_str) for farm_id in farm_ids]
+                )
+            else:
+                farmers, records = await asyncio.gather(
+                    farmers_query,
+                    self.db_service.query_documents("attendance", filters=[("date", "==", date_str)])
+                )
+                if farm_ids is None:
+                    farm_ids = sorted({farmer.get("farm_id") for farmer in farmers if farmer.get("farm_id")})
+                farm_ids = list(dict.fromkeys(farm_ids))
+                return self._summaries_from_records(farm_ids, farmers, records, date_str)
         except Exception as e:
             logger.error(f"Error getting attendance summary: {e}")
-            return {
-                "farm_id": farm_id,
-                "date": target_date.isoformat(),
-                "total_farmers": 0,
-                "present": 0,
-                "absent": 0,
-                "late": 0,
-                "overtime": 0,
-                "attendance_rate": 0.0
-            }
\ No newline at end of file
+            return {farm_id: _empty_summary(farm_id, date_str) for farm_id in farm_ids or []}
+
+        summaries = {}
+        missing = [farm_id for farm_id in farm_ids if rollup_id(farm_id, date_str) not in rollups]
+        if missing:
+            try:
+                records = await self.db_service.query_documents("attendance", filters=[("date", "==", date_str)])
+                summaries = self._summaries_from_records(missing, farmers, records, date_str)
+            except Exception as e:
+                logger.error(f"Error getting attendance summary: {e}")
+                summaries = {farm_id: _empty_summary(farm_id, date_str) for farm_id in missing}
+
+        totals: Dict[str, int] = {}
+        for farmer in farmers:
+            totals[farmer.get("farm_id")] = totals.get(farmer.get("farm_id"), 0) + 1
+        for farm_id in farm_ids:
+            rollup = rollups.get(rollup_id(farm_id, date_str))
+            if rollup is not None:
+                summaries[farm_id] = _summary(farm_id, date_str, totals.get(farm_id, 0), rollup["present"],
+                                              rollup["late"], rollup["overtime"])
+        return {farm_id: summaries[farm_id] for farm_id in farm_ids}
+
+    def _summaries_from_records(self, farm_ids: List[str], farmers: List[Dict], records: List[Dict],
+                                date_str: str) -> Dict[str, Dict]:
+        """Summaries grouped from raw attendance; each farmer's first record for the date counts"""
+        farm_index = {farm_id: i for i, farm_id in enumerate(farm_ids)}
+        farmer_farms = {
+            farmer["id"]: farm_index[farmer.get("farm_id")]
+            for farmer in farmers if farmer.get("farm_id") in farm_index
+        }
+        first_records: Dict[str, Dict] = {}
+        for record in records:
+            if record.get("farmer_id") in farmer_farms:
+                first_records.setdefault(record["farmer_id"], record)
+
+        count = len(first_records)
+        present_farms = np.fromiter((farmer_farms[farmer_id] for farmer_id in first_records), dtype=np.int64, count=count)
+        hours = np.fromiter(
+            (check_in_hour(record.get("check_in_time")) for record in first_records.values()), dtype=np.int64, count=count
+        )
+        minutes = np.fromiter(
+            (record.get("work_duration_minutes") or 0 for record in first_records.values()), dtype=np.float64, count=count
+        )
+        size = len(farm_ids)
+        totals = np.bincount(np.fromiter(farmer_farms.values(), dtype=np.int64, count=len(farmer_farms)), minlength=size)
+        present = np.bincount(present_farms, minlength=size)
+        late = np.bincount(present_farms, weights=hours >= LATE_CHECK_IN_HOUR, minlength=size)
+        overtime = np.bincount(present_farms, weights=minutes > OVERTIME_AFTER_MINUTES, minlength=size)
+        return {
+            farm_id: _summary(farm_id, date_str, int(totals[i]), int(present[i]), int(late[i]), int(overtime[i]))
+            for farm_id, i in farm_index.items()
+        }
+
+    async def create_check_in(self, attendance: Dict) -> Tuple[Dict, bool]:
+        """Save a check-in unless the farmer already has attendance on its date.
+
+        Returns the stored record and whether it is this one; a repeated
+        check-in gets the first record back and leaves it unchanged.
+        """
+        doc_id = attendance_id(attendance["farmer_id"], attendance["date"])
+        attendance = {**attendance, "id": doc_id}
+        stored = await self.db_service.transform_document(
+            "attendance", doc_id, lambda current: attendance if current is None else None
+        )
+        # transform_document returns the transform's own result when it wrote it
+        return stored, stored is attendance
+
+    async def complete_check_out(self, doc_id: str, update_data: Dict) -> Tuple[Optional[Dict], bool]:
+        """Apply a check-out unless the attendance is already checked out.
+
+        Returns the stored record (None if there is none) and whether this
+        check-out was applied; a repeated check-out leaves the first one.
+        """
+        stored = await self.db_service.transform_document(
+            "attendance", doc_id,
+            lambda current: None if current is None or current.get("check_out_time") else {**current, **update_data}
+        )
+        applied = stored is not None and stored.get("check_out_time") == update_data["check_out_time"]
+        return stored, applied
+
+    async def record_check_in(self, attendance: Dict):
+        """Count a new check-in in its farm's daily rollup"""
+        await self.record_rollup_changes([(apply_check_in, attendance)])
+
+    async def record_check_out(self, attendance: Dict):
+        """Count a check-out (attendance with work_duration_minutes) in its farm's daily rollup"""
+        await self.record_rollup_changes([(apply_check_out, attendance)])
+
+    async def record_rollup_changes(self, changes: List[Tuple[Callable, Dict]]):
+        """Count many check-ins and check-outs, given as (apply_check_in or apply_check_out, attendance).
+
+        Changes to one farm's day are applied in order in a single rollup
+        transaction, and different rollups are updated concurrently.
+        """
+        if not settings.ATTENDANCE_ROLLUPS_ENABLED:
+            return
+        by_rollup: Dict[str, List[Tuple[Callable, Dict]]] = {}
+        for apply, attendance in changes:
+            if attendance.get("farm_id"):
+                by_rollup.setdefault(rollup_id(attendance["farm_id"], attendance["date"]), []).append((apply, attendance))
+        await asyncio.gather(*[self._update_rollup(doc_id, rollup_changes) for doc_id, rollup_changes in by_rollup.items()])
+
+    async def _update_rollup(self, doc_id: str, changes: List[Tuple[Callable, Dict]]):
+        def transform(rollup):
+            changed = False
+            for apply, attendance in changes:
+                updated = apply(rollup, attendance)
+                if updated is not None:
+                    rollup, changed = updated, True
+            return rollup if changed else None
+
+        try:
+            await self.db_service.transform_document(ROLLUP_COLLECTION, doc_id, transform)
+        except Exception as e:
+            # The attendance records are saved; rebuild_rollups() repairs the count
+            logger.error(f"Error updating attendance rollup: {e}")
+
+    async def rebuild_rollups(self, target_date: date) -> int:
+        """Recompute one date's rollups from its attendance records; returns how many were written.
+
+        Rollups of farms with no attendance left that day are reset. Check-ins
+        recorded while this runs can be lost, so rebuild past dates, or today's
+        when check-ins are quiet.
+        """
+        date_str = target_date.isoformat()
+        records, existing = await asyncio.gather(
+            self.db_service.query_documents("attendance", filters=[("date", "==", date_str)], cache=False),
+            self.db_service.query_documents(ROLLUP_COLLECTION, filters=[("date", "==", date_str)], cache=False)
+        )
+        rollups = {
+            rollup_id(farm_id, date_str): rollup for farm_id, rollup in build_rollups(records, date_str).items()
+        }
+        for rollup in existing:
+            rollups.setdefault(rollup_id(rollup["farm_id"], date_str), empty_rollup(rollup["farm_id"], date_str))
+        if rollups:
+            result = await self.db_service.save_documents_bulk(ROLLUP_COLLECTION, rollups)
+            if result["failed"]:
+                raise RuntimeError(f"Could not write rollups for {date_str}: {result['failed']}")
+        return len(rollups)
+
+    async def rebuild_rollups_for_dates(self, dates: List[date]) -> int:
+        """rebuild_rollups for several dates concurrently, for code that bulk-writes attendance.
+
+        Returns how many rollups were written; nothing is done while
+        ATTENDANCE_ROLLUPS_ENABLED is off.
+        """
+        if not settings.ATTENDANCE_ROLLUPS_ENABLED:
+            return 0
+        written = await asyncio.gather(*[self.rebuild_rollups(target_date) for target_date in dict.fromkeys(dates)])
+        return sum(written)
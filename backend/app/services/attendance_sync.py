@@ -0,0 +1,376 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+import asyncio
+import json
+import logging
+import os
+import tarfile
+import zipfile
+
+from PIL import Image
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.schemas.attendance import SyncEvent
+from app.services.attendance_rollups import apply_check_in, apply_check_out
+from app.services.attendance_service import AttendanceService, attendance_id
+from app.services.idempotency import IdempotencyStore
+
+logger = logging.getLogger(__name__)
+
+# The events list inside a sync archive, next to the photos it names
+SYNC_MANIFEST = "events.json"
+# Device clocks may run this far ahead of the server's
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+UPLOAD_DIR = "uploads/attendance"
+
+
+class SyncUploadError(ValueError):
+    """The upload as a whole cannot be used (malformed events list or archive)"""
+
+
+class SyncUploadTooLarge(SyncUploadError):
+    """The upload has more events or bytes than one sync accepts"""
+
+
+def parse_events(manifest) -> List:
+    """Events from a JSON list, or an object with an "events" list"""
+    try:
+        events = json.loads(manifest)
+    except ValueError as e:
+        raise SyncUploadError(f"Events are not valid JSON: {e}")
+    if isinstance(events, dict):
+        events = events.get("events")
+    if not isinstance(events, list):
+        raise SyncUploadError("Events must be a JSON list")
+    if len(events) > settings.ATTENDANCE_SYNC_MAX_EVENTS:
+        raise SyncUploadTooLarge(f"At most {settings.ATTENDANCE_SYNC_MAX_EVENTS} events can be synced at once")
+    return events
+
+
+def read_sync_archive(data: bytes) -> Tuple[List, Dict[str, bytes]]:
+    """Events and photos ({file name: bytes}) from a zip or tar archive (plain, gz, bz2 or xz).
+
+    Files are keyed by base name, so directories inside the archive do not
+    matter; the uncompressed total is limited by ATTENDANCE_SYNC_MAX_UPLOAD_BYTES.
+    """
+    max_bytes = settings.ATTENDANCE_SYNC_MAX_UPLOAD_BYTES
+    too_large = SyncUploadTooLarge(f"Archive contents exceed {max_bytes} bytes")
+    files = {}
+    try:
+        if zipfile.is_zipfile(BytesIO(data)):
+            with zipfile.ZipFile(BytesIO(data)) as archive:
+                members = [info for info in archive.infolist() if not info.is_dir()]
+                if sum(info.file_size for info in members) > max_bytes:
+                    raise too_large
+                for info in members:
+                    files[os.path.basename(info.filename)] = archive.read(info)
+        else:
+            with tarfile.open(fileobj=BytesIO(data), mode="r:*") as archive:
+                members = [member for member in archive.getmembers() if member.isfile()]
+                if sum(member.size for member in members) > max_bytes:
+                    raise too_large
+                for member in members:
+                    files[os.path.basename(member.name)] = archive.extractfile(member).read()
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError):
+        raise SyncUploadError("Archive must be a zip or tar file")
+    manifest = files.pop(SYNC_MANIFEST, None)
+    if manifest is None:
+        raise SyncUploadError(f"Archive has no {SYNC_MANIFEST}")
+    return parse_events(manifest), files
+
+
+def _as_utc(value) -> datetime:
+    """A datetime or ISO string as an aware UTC datetime; naive values are taken as UTC"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _event_time(event: SyncEvent) -> datetime:
+    return _as_utc(event.timestamp)
+
+
+def _event_date(event: SyncEvent) -> str:
+    # Server-local date, as date.today() gives the online check-in
+    return _event_time(event).astimezone().date().isoformat()
+
+
+def _photo_name(event: SyncEvent) -> str:
+    # Photos are keyed by base name, however the device laid them out
+    return os.path.basename(event.photo)
+
+
+def _result(event_id, status: str, attendance_id: Optional[str] = None, error: Optional[str] = None) -> Dict:
+    result = {"event_id": event_id, "status": status, "attendance_id": attendance_id}
+    if error:
+        result["error"] = error
+    return result
+
+
+def _check_photo(data: bytes) -> Optional[str]:
+    """Why a photo cannot be used, or None if it is a readable image"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.verify()
+        return None
+    except Exception:
+        return "Photo is not a readable image"
+
+
+def _save_photo(local_path: str, data: bytes):
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    with open(local_path, "wb") as f:
+        f.write(data)
+
+
+class AttendanceSyncService:
+    """Applies check-ins and check-outs that field devices queued while offline.
+
+    A batch is validated and de-duplicated, its photos checked and saved by a
+    bounded pool of worker threads, and its records written with batched
+    writes, so one call costs a handful of datastore round trips however
+    many events it carries. Each event gets its own result:
+
+    - accepted: applied now
+    - duplicate: the farmer already has that check-in or check-out for the day
+    - rejected: cannot apply (e.g. a check-out without a check-in)
+    - invalid: malformed event or photo
+    - failed: the write failed; sending the event again retries it
+
+    Accepted and duplicate results are stored under the event ID, so a
+    device resending a batch it got no answer to gets the same results;
+    the other events are looked at afresh.
+    """
+
+    def __init__(self, attendance_service: Optional[AttendanceService] = None,
+                 idempotency_store: Optional[IdempotencyStore] = None):
+        self.attendance_service = attendance_service or AttendanceService()
+        self.db_service = self.attendance_service.db_service
+        self.idempotency_store = idempotency_store or IdempotencyStore(self.db_service)
+
+    @staticmethod
+    def _scope(event: SyncEvent) -> str:
+        return f"sync:{event.type}:{event.farmer_id}:{_event_date(event)}"
+
+    async def _in_pool(self, func: Callable, items: List[tuple]) -> List:
+        """func(*item) for each item on worker threads, at most ATTENDANCE_SYNC_PHOTO_CONCURRENCY at once"""
+        semaphore = asyncio.Semaphore(settings.ATTENDANCE_SYNC_PHOTO_CONCURRENCY)
+
+        async def run(item):
+            async with semaphore:
+                return await asyncio.to_thread(func, *item)
+        return await asyncio.gather(*[run(item) for item in items])
+
+    async def sync(self, raw_events: List, photos: Dict[str, bytes], user_id: str) -> Dict:
+        """Apply a batch of events, with photos keyed by file name; returns per-event results in input order"""
+        results: List[Optional[Dict]] = [None] * len(raw_events)
+        now = datetime.now(timezone.utc)
+
+        # Validate, and drop events repeated within the batch
+        events: List[Tuple[int, SyncEvent]] = []
+        first_index: Dict[str, int] = {}
+        for index, raw in enumerate(raw_events):
+            event_id = raw.get("event_id") if isinstance(raw, dict) else None
+            try:
+                event = SyncEvent.model_validate(raw)
+            except ValidationError as e:
+                errors = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+                results[index] = _result(event_id, "invalid", error=errors)
+                continue
+            if event.type == "check_in" and not event.farm_id:
+                results[index] = _result(event.event_id, "invalid", error="farm_id is required for check_in")
+            elif _photo_name(event) not in photos:
+                results[index] = _result(event.event_id, "invalid", error=f"Photo {event.photo} is not in the upload")
+            elif _event_time(event) > now + MAX_CLOCK_SKEW:
+                results[index] = _result(event.event_id, "invalid", error="Timestamp is in the future")
+            elif event.event_id in first_index:
+                results[index] = _result(event.event_id, "duplicate", error="Event repeated in the batch")
+            else:
+                first_index[event.event_id] = index
+                events.append((index, event))
+
+        # Events already synced by an earlier call get the results they got then
+        scoped_keys = {index: (self._scope(event), event.event_id) for index, event in events}
+        synced = await self.idempotency_store.get_many(list(scoped_keys.values()))
+        pending = []
+        for index, event in events:
+            if scoped_keys[index] in synced:
+                results[index] = synced[scoped_keys[index]]
+            else:
+                pending.append((index, event))
+
+        # Check photos before planning, so a bad check-in photo also rules out the check-out after it
+        photo_errors = await self._in_pool(_check_photo, [(photos[_photo_name(event)],) for _, event in pending])
+        usable = []
+        for (index, event), error in zip(pending, photo_errors):
+            if error:
+                results[index] = _result(event.event_id, "invalid", error=error)
+            else:
+                usable.append((index, event))
+
+        await self._apply(usable, photos, results, user_id, now)
+
+        await self.idempotency_store.save_many({
+            scoped_keys[index]: results[index] for index, _ in pending
+            if results[index]["status"] in ("accepted", "duplicate")
+        })
+
+        counts: Dict[str, int] = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return {"received": len(raw_events), **counts, "results": results}
+
+    async def _apply(self, events: List[Tuple[int, SyncEvent]], photos: Dict[str, bytes], results: List,
+                     user_id: str, now: datetime, attempts: int = 3):
+        """Plan events, save their photos and records, and fill in their results.
+
+        A record that cannot be created because it now exists was checked in
+        online after planning; its events are planned again against it, so
+        the check-in becomes a duplicate and a check-out applies to it.
+        """
+        planned, creates, updates, rollup_changes = await self._plan(events, results, user_id, now)
+
+        # Save photos before the records that point at them
+        await self._in_pool(_save_photo, [(local_path, photos[_photo_name(event)]) for _, event, _, local_path in planned])
+
+        created, (checked_out, already_out) = await asyncio.gather(
+            self.db_service.create_documents_bulk("attendance", creates),
+            self._check_out(updates)
+        )
+        failed = {**created["failed"], **checked_out}
+        conflicts = set()
+        if created["failed"] and attempts > 1:
+            conflicts = set(await self.db_service.get_documents("attendance", list(created["failed"])))
+
+        uploads, replan = [], []
+        for index, event, doc_id, local_path in planned:
+            if doc_id in conflicts:
+                replan.append((index, event))
+                os.remove(local_path)
+                continue
+            if doc_id in failed:
+                logger.error(f"Sync event {event.event_id} not saved: {failed[doc_id]}")
+                results[index] = _result(event.event_id, "failed", doc_id, error="Attendance record was not saved")
+                os.remove(local_path)
+                continue
+            if doc_id in already_out:
+                # Checked out online since the batch was planned; that check-out stands
+                results[index] = _result(event.event_id, "duplicate", doc_id, error="Already checked out")
+                os.remove(local_path)
+                continue
+            results[index] = _result(event.event_id, "accepted", doc_id)
+            # Upload to Firebase Storage in the background; the photo field is switched to the Storage URL after
+            field = "check_in_photo" if event.type == "check_in" else "check_out_photo"
+            firebase_path = f"attendance/{event.farmer_id}/{os.path.basename(local_path)}"
+            uploads.append(self.db_service.upload_file_later(firebase_path, local_path, "attendance", doc_id, field))
+        # Enqueued together, so the batch shares the upload journal's fsyncs
+        await asyncio.gather(*uploads)
+
+        await self.attendance_service.record_rollup_changes(
+            [(apply, record) for doc_id, apply, record in rollup_changes
+             if doc_id not in failed and doc_id not in already_out]
+        )
+
+        if replan:
+            await self._apply(replan, photos, results, user_id, now, attempts - 1)
+
+    async def _check_out(self, updates: Dict[str, Dict]) -> Tuple[Dict[str, str], set]:
+        """Apply check-outs to existing records, each only if the record is not checked out yet.
+
+        Returns errors by document ID for check-outs not saved, and the IDs
+        of records found already checked out.
+        """
+        doc_ids = list(updates)
+        outcomes = await asyncio.gather(
+            *[self.attendance_service.complete_check_out(doc_id, updates[doc_id]) for doc_id in doc_ids],
+            return_exceptions=True
+        )
+        failed, already_out = {}, set()
+        for doc_id, outcome in zip(doc_ids, outcomes):
+            if isinstance(outcome, Exception):
+                failed[doc_id] = str(outcome)
+            elif outcome[0] is None:
+                failed[doc_id] = "Attendance record no longer exists"
+            elif not outcome[1]:
+                already_out.add(doc_id)
+        return failed, already_out
+
+    async def _plan(self, events: List[Tuple[int, SyncEvent]], results: List, user_id: str, now: datetime):
+        """Replay events in time order against the farmers' records for their days.
+
+        Returns the accepted events as (index, event, doc_id, local photo
+        path), new records to create, updates to existing records, and the
+        rollup changes as (doc_id, apply, record); results of rejected and
+        duplicate events are filled in.
+        """
+        doc_ids = [attendance_id(event.farmer_id, _event_date(event)) for _, event in events]
+        records = await self.db_service.get_documents("attendance", doc_ids)
+        planned, creates, updates, rollup_changes = [], {}, {}, []
+
+        for index, event in sorted(events, key=lambda item: _event_time(item[1])):
+            date_str = _event_date(event)
+            doc_id = attendance_id(event.farmer_id, date_str)
+            record = records.get(doc_id)
+            timestamp = _event_time(event)
+            kind = "checkin" if event.type == "check_in" else "checkout"
+            local_path = os.path.join(UPLOAD_DIR, f"{kind}_{event.farmer_id}_{timestamp.strftime('%Y%m%d_%H%M%S')}.jpg")
+
+            if event.type == "check_in":
+                if record is not None:
+                    results[index] = _result(event.event_id, "duplicate", doc_id, error="Already checked in")
+                    continue
+                record = {
+                    "id": doc_id,
+                    "farmer_id": event.farmer_id,
+                    "farm_id": event.farm_id,
+                    "date": date_str,
+                    "check_in_time": timestamp.isoformat(),
+                    "check_in_location": event.location,
+                    "check_in_photo": f"/{local_path}",
+                    "check_in_photo_local": f"/{local_path}",
+                    "status": "working",
+                    "created_by": user_id,
+                    "synced_at": now.isoformat()
+                }
+                creates[doc_id] = record
+                rollup_changes.append((doc_id, apply_check_in, record))
+            else:
+                if record is None:
+                    results[index] = _result(event.event_id, "rejected", error="No check-in found for that day")
+                    continue
+                if record.get("check_out_time"):
+                    results[index] = _result(event.event_id, "duplicate", doc_id, error="Already checked out")
+                    continue
+                check_in_time = _as_utc(record["check_in_time"])
+                if timestamp < check_in_time:
+                    results[index] = _result(event.event_id, "rejected", doc_id, error="Check-out is before the check-in")
+                    continue
+                work_duration_minutes = int((timestamp - check_in_time).total_seconds() / 60)
+                update_data = {
+                    "check_out_time": timestamp.isoformat(),
+                    "check_out_location": event.location,
+                    "check_out_photo": f"/{local_path}",
+                    "check_out_photo_local": f"/{local_path}",
+                    "work_duration_minutes": work_duration_minutes,
+                    "work_hours": work_duration_minutes / 60,
+                    "status": "completed",
+                    "updated_at": now.isoformat(),
+                    "updated_by": user_id,
+                    "synced_at": now.isoformat()
+                }
+                record = {**record, **update_data}
+                if doc_id in creates:
+                    # Checked in and out within this batch: create the record complete
+                    creates[doc_id] = record
+                else:
+                    updates[doc_id] = update_data
+                rollup_changes.append((doc_id, apply_check_out, record))
+
+            records[doc_id] = record
+            planned.append((index, event, doc_id, local_path))
+
+        return planned, creates, updates, rollup_changes
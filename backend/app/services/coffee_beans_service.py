@@ -1,6 +1,6 @@
 import numpy as np
 import cv2
-from typing import Dict, List, Optional, Callable
+from typing import Dict, List, Optional, Callable, Tuple
 from app.core.config import settings
 import os
 from datetime import datetime
@@ -9,6 +9,7 @@ from fastapi import UploadFile
 import base64
 import asyncio
 from app.api.v1.endpoints.websocket import send_frame_update
+from app.utils.frame_series import load_frame_series, save_frame_series
 
 # Conditional import for YOLO
 try:
@@ -212,8 +213,8 @@ class CoffeeBeansService:
                 "message": f"Error analyzing image: {str(e)}"
             }
 
-    async def save_analysis(self, analysis_data: Dict) -> Dict:
-        """Save analysis to Firebase/Firestore"""
+    async def save_analysis(self, analysis_data: Dict, write_behind: bool = False) -> Dict:
+        """Save analysis to Firebase/Firestore; with write_behind the write is queued in the background"""
         from app.services.firebase_service import FirebaseService
         firebase = FirebaseService()
         
@@ -233,12 +234,18 @@ class CoffeeBeansService:
             analysis_data["is_video"] = False
         
         # Save to Firestore
-        await firebase.save_document("coffee_beans_analyses", analysis_id, analysis_data)
+        await firebase.save_document("coffee_beans_analyses", analysis_id, analysis_data, write_behind=write_behind)
         
         return analysis_data
 
-    async def get_user_history(self, user_id: str, farm_id: str = None, field_id: str = None) -> List[Dict]:
-        """Get analysis history for a user, optionally filtered by farm/field"""
+    async def get_user_history(self, user_id: str, farm_id: str = None, field_id: str = None,
+                               limit: Optional[int] = None, page_token: Optional[str] = None,
+                               select: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get analysis history for a user, newest first, optionally filtered by farm/field.
+
+        Returns (analyses, next_page_token); the token is None on the last page.
+        select limits the fields read, e.g. to leave out per-frame video results.
+        """
         from app.services.firebase_service import FirebaseService
         firebase = FirebaseService()
         
@@ -249,12 +256,14 @@ class CoffeeBeansService:
         if field_id:
             filters.append(("field_id", "==", field_id))
         
-        analyses = await firebase.query_documents("coffee_beans_analyses", filters)
-        
-        # Sort by created_at descending
-        analyses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        return analyses
+        return await firebase.query_page(
+            "coffee_beans_analyses",
+            filters,
+            order_by=[("created_at", "desc")],
+            page_size=limit,
+            page_token=page_token,
+            select=select
+        )
 
     async def get_analysis(self, analysis_id: str) -> Optional[Dict]:
         """Get a specific analysis by ID"""
@@ -263,6 +272,27 @@ class CoffeeBeansService:
         
         return await firebase.get_document("coffee_beans_analyses", analysis_id)
     
+    async def get_frame_timeline(self, analysis_id: str, start: Optional[float] = None,
+                                 end: Optional[float] = None) -> Optional[List[Dict]]:
+        """Per-frame results of a video analysis between start and end seconds, or None if it does not exist.
+
+        Raises FileNotFoundError if the analysis exists but its frame series file is gone.
+        """
+        from app.services.firebase_service import FirebaseService
+        firebase = FirebaseService()
+        
+        analysis = await firebase.get_document("coffee_beans_analyses", analysis_id, select=["frame_series", "frame_analyses"])
+        if analysis is None:
+            return None
+        series = analysis.get("frame_series")
+        if series:
+            return await asyncio.to_thread(load_frame_series, series["path"], start, end)
+        # Analyses saved before frame series were offloaded keep their frames inline
+        return [
+            frame for frame in analysis.get("frame_analyses", [])
+            if (start is None or frame["timestamp"] >= start) and (end is None or frame["timestamp"] <= end)
+        ]
+    
     async def get_farm_statistics(self, farm_id: str, start_date: datetime = None, end_date: datetime = None) -> Dict:
         """Get aggregated statistics for a farm"""
         from app.services.firebase_service import FirebaseService
@@ -274,22 +304,16 @@ class CoffeeBeansService:
         if end_date:
             filters.append(("created_at", "<=", end_date.isoformat()))
         
-        analyses = await firebase.query_documents("coffee_beans_analyses", filters)
-        
-        if not analyses:
-            return {
-                "total_analyses": 0,
-                "average_quality": 0,
-                "defect_distribution": {},
-                "quality_trend": []
-            }
-        
-        # Calculate statistics
+        # Calculate statistics as analyses are streamed, without per-frame video results
+        total_analyses = 0
         total_quality = 0
         defect_counts = {}
         quality_by_date = {}
         
-        for analysis in analyses:
+        async for analysis in firebase.iter_documents(
+            "coffee_beans_analyses", filters, select=["analysis", "created_at"]
+        ):
+            total_analyses += 1
             if "analysis" in analysis:
                 total_quality += analysis["analysis"].get("quality_score", 0)
                 
@@ -303,8 +327,16 @@ class CoffeeBeansService:
                     quality_by_date[date_str] = []
                 quality_by_date[date_str].append(analysis["analysis"].get("quality_score", 0))
         
+        if not total_analyses:
+            return {
+                "total_analyses": 0,
+                "average_quality": 0,
+                "defect_distribution": {},
+                "quality_trend": []
+            }
+        
         # Calculate averages
-        avg_quality = total_quality / len(analyses) if analyses else 0
+        avg_quality = total_quality / total_analyses
         
         # Calculate daily averages for trend
         quality_trend = []
@@ -316,7 +348,7 @@ class CoffeeBeansService:
             })
         
         return {
-            "total_analyses": len(analyses),
+            "total_analyses": total_analyses,
             "average_quality": round(avg_quality, 2),
             "defect_distribution": defect_counts,
             "quality_trend": quality_trend
@@ -697,8 +729,8 @@ class CoffeeBeansService:
                 "error": str(e)
             }
     
-    async def save_video_analysis(self, analysis_data: Dict) -> Dict:
-        """Save video analysis to Firebase/Firestore"""
+    async def save_video_analysis(self, analysis_data: Dict, write_behind: bool = False) -> Dict:
+        """Save video analysis to Firebase/Firestore; with write_behind the write is queued in the background"""
         from app.services.firebase_service import FirebaseService
         firebase = FirebaseService()
         
@@ -707,8 +739,14 @@ class CoffeeBeansService:
         analysis_data["id"] = analysis_id
         analysis_data["created_at"] = datetime.now().isoformat()
         
+        # Per-frame results go to a compressed file next to the videos; the document keeps a pointer
+        frame_analyses = analysis_data.pop("frame_analyses", None)
+        if frame_analyses:
+            series_path = os.path.join(settings.UPLOAD_DIR, "video_series", f"{analysis_id}.npz")
+            analysis_data["frame_series"] = await asyncio.to_thread(save_frame_series, series_path, frame_analyses)
+        
         # Save to Firestore
-        await firebase.save_document("coffee_beans_analyses", analysis_id, analysis_data)
+        await firebase.save_document("coffee_beans_analyses", analysis_id, analysis_data, write_behind=write_behind)
         
         return analysis_data
     
@@ -1,6 +1,6 @@
 import numpy as np
 import cv2
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from app.core.config import settings
 import os
 from datetime import datetime
@@ -218,8 +218,8 @@ class CoffeeLeavesService:
                 "message": f"Error analyzing image: {str(e)}"
             }
 
-    async def save_analysis(self, analysis_data: Dict) -> Dict:
-        """Save analysis to Firebase/Firestore"""
+    async def save_analysis(self, analysis_data: Dict, write_behind: bool = False) -> Dict:
+        """Save analysis to Firebase/Firestore; with write_behind the write is queued in the background"""
         from app.services.firebase_service import FirebaseService
         firebase = FirebaseService()
         
@@ -235,12 +235,18 @@ class CoffeeLeavesService:
             analysis_data["field_id"] = analysis_data.get("field_id", "default_field")
         
         # Save to Firestore
-        await firebase.save_document("coffee_leaves_analyses", analysis_id, analysis_data)
+        await firebase.save_document("coffee_leaves_analyses", analysis_id, analysis_data, write_behind=write_behind)
         
         return analysis_data
 
-    async def get_user_history(self, user_id: str, farm_id: str = None, field_id: str = None) -> List[Dict]:
-        """Get analysis history for a user, optionally filtered by farm/field"""
+    async def get_user_history(self, user_id: str, farm_id: str = None, field_id: str = None,
+                               limit: Optional[int] = None, page_token: Optional[str] = None,
+                               select: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get analysis history for a user, newest first, optionally filtered by farm/field.
+
+        Returns (analyses, next_page_token); the token is None on the last page.
+        select limits the fields read, e.g. to leave out per-frame video results.
+        """
         from app.services.firebase_service import FirebaseService
         firebase = FirebaseService()
         
@@ -251,12 +257,14 @@ class CoffeeLeavesService:
         if field_id:
             filters.append(("field_id", "==", field_id))
         
-        analyses = await firebase.query_documents("coffee_leaves_analyses", filters)
-        
-        # Sort by created_at descending
-        analyses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        return analyses
+        return await firebase.query_page(
+            "coffee_leaves_analyses",
+            filters,
+            order_by=[("created_at", "desc")],
+            page_size=limit,
+            page_token=page_token,
+            select=select
+        )
 
     async def get_analysis(self, analysis_id: str) -> Optional[Dict]:
         """Get a specific analysis by ID"""
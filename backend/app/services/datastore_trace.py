@@ -0,0 +1,63 @@
+from typing import Dict, List, Optional, Tuple
+from contextvars import ContextVar
+
+# Calls kept per trace for inspection; counts and totals keep growing past it
+_MAX_TRACED_CALLS = 1000
+
+
+class DatastoreTrace:
+    """Datastore calls made while serving one request.
+
+    Each logical call is recorded once (retries and hedges included in its
+    time), for every backend and in mock mode, so the count is what a
+    request costs in round trips.
+    """
+
+    def __init__(self):
+        self.calls: List[Tuple[str, str, float, bool]] = []
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, collection: str, operation: str, elapsed_ms: float, error: bool = False):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if error:
+            self.errors += 1
+        if len(self.calls) < _MAX_TRACED_CALLS:
+            self.calls.append((collection, operation, elapsed_ms, error))
+
+    def summary(self) -> Dict[str, int]:
+        """Call counts by "collection.operation", most frequent first"""
+        counts: Dict[str, int] = {}
+        for collection, operation, _, _ in self.calls:
+            name = f"{collection}.{operation}"
+            counts[name] = counts.get(name, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-Datastore-Calls": str(self.count),
+            "X-Datastore-Time-Ms": f"{self.total_ms:.1f}",
+            "X-Datastore-Trace": ",".join(f"{name}={count}" for name, count in self.summary().items())
+        }
+
+
+_CURRENT_TRACE: ContextVar[Optional[DatastoreTrace]] = ContextVar("datastore_trace", default=None)
+
+
+def start_trace() -> DatastoreTrace:
+    """Trace the datastore calls made from the current context (and tasks it starts)"""
+    trace = DatastoreTrace()
+    _CURRENT_TRACE.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[DatastoreTrace]:
+    return _CURRENT_TRACE.get()
+
+
+def record_call(collection: str, operation: str, elapsed_ms: float, error: bool = False):
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.record(collection, operation, elapsed_ms, error)
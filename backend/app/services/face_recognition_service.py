@@ -145,7 +145,11 @@ class FaceRecognitionService:
                 "success": True,
                 "farmer_id": best_match,
                 "confidence": float(best_similarity),
-                "farmer": {"id": best_match, "name": farmer_name}
+                "farmer": {
+                    "id": best_match,
+                    "name": farmer_name,
+                    "farm_id": farmer.get("farm_id") if farmer else None
+                }
             }
         else:
             print(f"[Face Recognition] No match found. Best similarity was {best_similarity:.3f}")
@@ -208,9 +212,12 @@ class FaceRecognitionService:
                 from app.services.firebase_service import FirebaseService
                 firebase = FirebaseService()
                 
-                for angle in ["front", "left", "right"]:
-                    doc_id = f"{farmer_id}_{angle}"
-                    doc = await firebase.get_document("face_embeddings", doc_id)
+                angles = ["front", "left", "right"]
+                docs = await firebase.get_documents(
+                    "face_embeddings", [f"{farmer_id}_{angle}" for angle in angles]
+                )
+                for angle in angles:
+                    doc = docs.get(f"{farmer_id}_{angle}")
                     if doc and "embedding" in doc:
                         # Convert list back to numpy array
                         embedding_list = doc["embedding"]
@@ -0,0 +1,57 @@
+from typing import Callable, Dict, List, Optional
+from app.core.config import settings
+from app.services.firebase_service import FirebaseService, get_firestore_executor, get_resilience_policy
+
+if not settings.USE_MOCK_FIREBASE:
+    try:
+        from firebase_admin import firestore_async
+    except ImportError:
+        firestore_async = None
+
+
+class AsyncFirebaseService(FirebaseService):
+    """FirebaseService backed by the native async Firestore client.
+
+    Query building is identical to the sync SDK; only the terminal calls
+    (get, set, update, delete, commit) are coroutines, so they are awaited
+    directly on the event loop instead of hopping onto the thread pool.
+    Selected with FIRESTORE_BACKEND=async. The async client is bound to the
+    event loop it is first used on, so use one loop per process.
+    """
+
+    def __init__(self):
+        super().__init__()
+        if not settings.USE_MOCK_FIREBASE and firestore_async is not None:
+            self.db = firestore_async.client()
+
+    async def _run(self, collection: str, operation: str, func, *args, **kwargs):
+        """Await a native async Firestore call with the shared timeouts, metrics and retry policy"""
+        executor = get_firestore_executor()
+        return await get_resilience_policy().call(
+            collection, operation,
+            lambda: executor.run_async(func, *args, collection=collection, operation=operation, **kwargs)
+        )
+
+    async def _get_all(self, collection: str, doc_refs: List) -> List:
+        """The async client streams batched gets as an async generator"""
+        async def collect():
+            return [doc async for doc in self.db.get_all(doc_refs)]
+        return await self._run(collection, 'read', collect)
+
+    async def _transact(self, doc_ref, transform: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        """transform_document with the async client's transaction"""
+        @firestore_async.async_transactional
+        async def run(transaction):
+            snapshot = await doc_ref.get(transaction=transaction)
+            current = snapshot.to_dict() if snapshot.exists else None
+            updated = transform(current)
+            if updated is None:
+                return current
+            transaction.set(doc_ref, updated)
+            return updated
+        return await run(self.db.transaction())
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        metrics["backend"] = "async"
+        return metrics
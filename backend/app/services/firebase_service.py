@@ -1,13 +1,26 @@
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+from datetime import datetime, timedelta, timezone
 from app.core.config import settings
 from app.core.security import get_password_hash
 import asyncio
+import base64
+import binascii
+import copy
+import json
 import traceback
-from functools import wraps
+from app.services.firestore_executor import FirestoreExecutor
+from app.services.firestore_cache import DocumentCache, QueryCache
+from app.services.firestore_filters import ASCENDING, apply_update, normalize_order, project_document
+from app.services.firestore_mirror import LiveMirror
+from app.services.firestore_resilience import DatastoreUnavailableError, ResiliencePolicy
+from app.services.mock_datastore import MockDataStore
+from app.services.mock_latency import LatencyInjector
+from app.services.photo_upload_queue import PhotoUploadQueue
+from app.services.storage_uploader import StorageUploader
+from app.services.write_behind import WriteBehindQueue
 
-# Conditional imports for Firebase
-if not settings.USE_MOCK_FIREBASE:
+# Conditional imports for Firebase (the SQLite backend runs without them)
+if not settings.USE_MOCK_FIREBASE and settings.FIRESTORE_BACKEND != "sqlite":
     try:
         import firebase_admin
         from firebase_admin import credentials, firestore, storage
@@ -15,15 +28,264 @@ if not settings.USE_MOCK_FIREBASE:
         print("Warning: Firebase libraries not installed. Using mock mode.")
         settings.USE_MOCK_FIREBASE = True
 
-def async_wrap(func):
-    @wraps(func)
-    async def run(*args, **kwargs):
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, func, *args, **kwargs)
-    return run
+# Firestore rejects batched writes with more than 500 operations
+_MAX_BATCH_OPS = 500
+# Document references per batched get
+_MAX_GET_ALL_IDS = 100
+
+def _query_order(order_by, paged: bool = False, filters: Optional[List[tuple]] = None) -> List[Tuple[str, str]]:
+    """Normalized order_by with a document ID tie-breaker, so cursors are unambiguous"""
+    orders = normalize_order(order_by)
+    if paged and not orders:
+        # Firestore sorts by an inequality filter's field first; cursors must use the same order
+        for field, op, _ in filters or []:
+            if op in ("<", "<=", ">", ">=", "!=", "not-in"):
+                orders.append((field, ASCENDING))
+                break
+    if (orders or paged) and not any(field == "__name__" for field, _ in orders):
+        orders.append(("__name__", orders[-1][1] if orders else ASCENDING))
+    return orders
+
+def _projection(select: Optional[List[str]], orders: List[Tuple[str, str]]) -> Optional[List[str]]:
+    """Selected fields plus the ordered ones, which page tokens are built from"""
+    if select is None:
+        return None
+    return list(dict.fromkeys([*select, *(field for field, _ in orders if field != "__name__")]))
+
+def _cursor(doc: Dict, orders: List[Tuple[str, str]]) -> Dict:
+    """start_after cursor resuming a query after doc"""
+    return {field: doc.get("id") if field == "__name__" else doc.get(field) for field, _ in orders}
+
+def _encode_page_token(doc: Dict, orders: List[Tuple[str, str]]) -> str:
+    """Opaque token resuming a query after doc: its ordered values, base64-encoded JSON"""
+    values = [
+        {"$ts": value.isoformat()} if isinstance(value, datetime) else value
+        for value in _cursor(doc, orders).values()
+    ]
+    payload = {"f": [field for field, _ in orders], "v": values}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":"), default=str).encode()).decode()
+
+def _decode_page_token(token: str, orders: List[Tuple[str, str]]) -> Dict:
+    """start_after cursor from a page token; ValueError if it was not issued for this ordering"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        fields, values = payload["f"], payload["v"]
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid page token")
+    if fields != [field for field, _ in orders] or len(values) != len(fields):
+        raise ValueError("Invalid page token")
+    return {
+        field: datetime.fromisoformat(value["$ts"]) if isinstance(value, dict) and "$ts" in value else value
+        for field, value in zip(fields, values)
+    }
+
+def _field_path_value(doc: Dict, field: str):
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def _numeric_values(docs, field: str):
+    """Numeric values of a field; sum/avg aggregations ignore everything else"""
+    for doc in docs:
+        value = _field_path_value(doc, field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield value
+
+def _aggregate_values(kind: str, docs: List[Dict], field: Optional[str]):
+    """count/sum/avg over documents already in memory"""
+    if kind == "count":
+        return len(docs)
+    values = list(_numeric_values(docs, field))
+    if kind == "sum":
+        return sum(values)
+    return sum(values) / len(values) if values else None
+
+# Shared pool for blocking Firestore calls, created on first use
+_EXECUTOR: Optional[FirestoreExecutor] = None
+
+def get_firestore_executor() -> FirestoreExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = FirestoreExecutor(
+            max_workers=settings.FIRESTORE_MAX_WORKERS,
+            default_timeout=settings.FIRESTORE_TIMEOUT_SECONDS,
+            operation_timeouts=settings.FIRESTORE_OPERATION_TIMEOUTS,
+            collection_limits=settings.FIRESTORE_COLLECTION_CONCURRENCY
+        )
+    return _EXECUTOR
+
+def shutdown_firestore_executor():
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=True)
+        _EXECUTOR = None
+
+# Retry, hedging and circuit-breaker state shared by all service instances
+_RESILIENCE: Optional[ResiliencePolicy] = None
+
+def get_resilience_policy() -> ResiliencePolicy:
+    global _RESILIENCE
+    if _RESILIENCE is None:
+        _RESILIENCE = ResiliencePolicy(
+            policies=settings.FIRESTORE_RETRY_POLICIES,
+            failure_threshold=settings.FIRESTORE_BREAKER_FAILURES,
+            reset_seconds=settings.FIRESTORE_BREAKER_RESET_SECONDS
+        )
+    return _RESILIENCE
+
+# Simulated round trips for mock mode (MOCK_DATASTORE_LATENCY), shared by all service instances
+_LATENCY_INJECTOR: Optional[LatencyInjector] = None
+
+def get_latency_injector() -> Optional[LatencyInjector]:
+    global _LATENCY_INJECTOR
+    if _LATENCY_INJECTOR is None and settings.MOCK_DATASTORE_LATENCY:
+        _LATENCY_INJECTOR = LatencyInjector(
+            settings.MOCK_DATASTORE_LATENCY_PROFILE, seed=settings.MOCK_DATASTORE_LATENCY_SEED
+        )
+    return _LATENCY_INJECTOR
+
+async def _no_round_trip():
+    return None
+
+# Thread pool for blocking Storage uploads, kept apart from the Firestore pool
+_UPLOADER: Optional[StorageUploader] = None
+
+def get_storage_uploader() -> StorageUploader:
+    global _UPLOADER
+    if _UPLOADER is None:
+        _UPLOADER = StorageUploader(
+            max_concurrency=settings.STORAGE_UPLOAD_CONCURRENCY,
+            timeout=settings.STORAGE_UPLOAD_TIMEOUT_SECONDS,
+            resumable_threshold=settings.STORAGE_RESUMABLE_THRESHOLD_BYTES,
+            chunk_size=settings.STORAGE_CHUNK_SIZE_BYTES,
+            public_bucket=settings.STORAGE_PUBLIC_BUCKET
+        )
+    return _UPLOADER
+
+def shutdown_storage_uploader():
+    global _UPLOADER
+    if _UPLOADER is not None:
+        _UPLOADER.shutdown(wait=True)
+        _UPLOADER = None
+
+# Background uploads of photos saved locally, created (and its journal replayed) on first use
+_PHOTO_UPLOADS: Optional[PhotoUploadQueue] = None
+
+async def _patch_photo_url(collection: str, doc_id: str, update_data: Dict) -> bool:
+    service = FirebaseService()
+    if await service.update_document(collection, doc_id, update_data) is not None:
+        return True
+    if await service.get_document(collection, doc_id) is not None:
+        raise RuntimeError(f"Could not update {collection}/{doc_id}")
+    return False
+
+def get_photo_upload_queue() -> PhotoUploadQueue:
+    global _PHOTO_UPLOADS
+    if _PHOTO_UPLOADS is None:
+        _PHOTO_UPLOADS = PhotoUploadQueue(
+            settings.PHOTO_UPLOAD_JOURNAL_PATH,
+            upload=lambda file_path, local_path, content_type: FirebaseService().upload_local_file(
+                file_path, local_path, content_type
+            ),
+            patch=_patch_photo_url,
+            max_attempts=settings.PHOTO_UPLOAD_MAX_ATTEMPTS,
+            max_concurrency=settings.STORAGE_UPLOAD_CONCURRENCY
+        )
+    return _PHOTO_UPLOADS
+
+async def stop_photo_upload_queue():
+    global _PHOTO_UPLOADS
+    if _PHOTO_UPLOADS is not None:
+        await _PHOTO_UPLOADS.stop()
+        _PHOTO_UPLOADS = None
+
+# Read-through cache for reference collections, shared by all service instances
+_CACHE: Optional[DocumentCache] = None
+
+def get_document_cache() -> DocumentCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = DocumentCache(
+            ttls=settings.FIRESTORE_CACHE_TTL_SECONDS,
+            max_entries=settings.FIRESTORE_CACHE_MAX_ENTRIES
+        )
+    return _CACHE
+
+# Short-lived query results for hot collections, shared by all service instances
+_QUERY_CACHE: Optional[QueryCache] = None
+
+def get_query_cache() -> QueryCache:
+    global _QUERY_CACHE
+    if _QUERY_CACHE is None:
+        _QUERY_CACHE = QueryCache(
+            ttls=settings.FIRESTORE_QUERY_CACHE_TTL_SECONDS,
+            max_entries=settings.FIRESTORE_QUERY_CACHE_MAX_ENTRIES
+        )
+    return _QUERY_CACHE
+
+# Snapshot-listener mirrors by collection, registered with register_live_mirror()
+_MIRRORS: Dict[str, LiveMirror] = {}
+
+def stop_live_mirrors():
+    for mirror in _MIRRORS.values():
+        mirror.stop()
+    _MIRRORS.clear()
+
+# Write-behind queue for opted-in writes, created (and its journal replayed) on first use
+_WRITE_BEHIND: Optional[WriteBehindQueue] = None
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    global _WRITE_BEHIND
+    if _WRITE_BEHIND is None:
+        _WRITE_BEHIND = WriteBehindQueue(
+            settings.WRITE_BEHIND_JOURNAL_PATH,
+            apply=lambda collection, operations: FirebaseService()._write_bulk(collection, operations),
+            flush_interval=settings.WRITE_BEHIND_FLUSH_SECONDS,
+            max_batch=settings.WRITE_BEHIND_MAX_BATCH,
+            max_attempts=settings.WRITE_BEHIND_MAX_ATTEMPTS
+        )
+    return _WRITE_BEHIND
+
+async def drain_write_behind_queue():
+    """Apply queued writes before shutdown; whatever fails stays journaled for the next start"""
+    global _WRITE_BEHIND
+    if _WRITE_BEHIND is not None:
+        await _WRITE_BEHIND.drain(timeout=settings.WRITE_BEHIND_DRAIN_TIMEOUT_SECONDS)
+        _WRITE_BEHIND.close()
+        _WRITE_BEHIND = None
+
+def _overlay_pending(collection: str, doc_id: str, doc: Optional[Dict]) -> Optional[Dict]:
+    """doc with queued writes applied, so callers read their own write-behind writes"""
+    if _WRITE_BEHIND is None or not _WRITE_BEHIND.has_pending(collection, doc_id):
+        return doc
+    doc = _WRITE_BEHIND.overlay(collection, doc_id, doc)
+    return {**doc, "id": doc_id} if doc is not None else None
+
+# Indexes kept by the mock datastore: hash fields serve ==/in filters,
+# sorted fields serve range filters
+_MOCK_INDEXES = {
+    "users": {"hash_fields": ["email"]},
+    "farmers": {"hash_fields": ["farm_id", "is_active"]},
+    "attendance": {
+        "hash_fields": ["date", "farmer_id", "farm_id", "status"],
+        "sorted_fields": ["date", "check_in_time", "created_at"]
+    },
+    "coffee_beans_analyses": {
+        "hash_fields": ["user_id", "farm_id", "field_id", "is_video"],
+        "sorted_fields": ["created_at"]
+    },
+    "coffee_leaves_analyses": {
+        "hash_fields": ["user_id", "farm_id", "field_id", "is_video"],
+        "sorted_fields": ["created_at"]
+    },
+    "face_embeddings": {"hash_fields": ["farmer_id"]}
+}
 
 # Global mock data storage for consistency
-_MOCK_DATA_STORE = {
+_MOCK_DATA_STORE = MockDataStore({
     "users": {},
     "farmers": {},
     "farms": {},
@@ -32,9 +294,20 @@ _MOCK_DATA_STORE = {
     "coffee_leaves": {},
     "coffee_beans_analyses": {},
     "coffee_leaves_analyses": {}
-}
+}, indexes=_MOCK_INDEXES)
 
 class FirebaseService:
+    def __new__(cls):
+        # FirebaseService() picks the configured backend so existing callers need no changes
+        if cls is FirebaseService and not settings.USE_MOCK_FIREBASE:
+            if settings.FIRESTORE_BACKEND == "async":
+                from app.services.firebase_async_service import AsyncFirebaseService
+                cls = AsyncFirebaseService
+            elif settings.FIRESTORE_BACKEND == "sqlite":
+                from app.services.firebase_sqlite_service import SQLiteFirebaseService
+                cls = SQLiteFirebaseService
+        return super().__new__(cls)
+
     def __init__(self):
         if settings.USE_MOCK_FIREBASE:
             self.db = None
@@ -113,19 +386,93 @@ class FirebaseService:
             self.db = firestore.client() if 'firestore' in globals() else None
             self.bucket = storage.bucket() if 'storage' in globals() else None
 
+    async def _run(self, collection: str, operation: str, func, *args, **kwargs):
+        """Run a blocking Firestore call on the dedicated database pool, under the operation's retry policy"""
+        executor = get_firestore_executor()
+        return await get_resilience_policy().call(
+            collection, operation,
+            lambda: executor.run(func, *args, collection=collection, operation=operation, **kwargs)
+        )
+
+    async def _mock_round_trip(self, collection: str, operation: str):
+        """Mock-mode stand-in for one datastore call: traced and retried like _run, and
+        delayed or failed per MOCK_DATASTORE_LATENCY_PROFILE when latency injection is on"""
+        injector = get_latency_injector()
+        attempt = (lambda: injector.round_trip(collection, operation)) if injector is not None else _no_round_trip
+        await get_resilience_policy().call(collection, operation, attempt)
+
+    def get_metrics(self) -> Dict:
+        """Datastore metrics for monitoring"""
+        return {
+            "mode": "mock" if settings.USE_MOCK_FIREBASE else "firebase",
+            "backend": "threaded",
+            "executor": get_firestore_executor().get_metrics(),
+            "resilience": get_resilience_policy().get_metrics(),
+            "storage": get_storage_uploader().get_metrics(),
+            "photo_uploads": _PHOTO_UPLOADS.get_metrics() if _PHOTO_UPLOADS is not None else None,
+            "cache": get_document_cache().get_metrics(),
+            "query_cache": get_query_cache().get_metrics(),
+            "mirrors": {name: mirror.to_dict() for name, mirror in sorted(_MIRRORS.items())},
+            "write_behind": _WRITE_BEHIND.get_metrics() if _WRITE_BEHIND is not None else None,
+            "latency_injection": _LATENCY_INJECTOR.get_metrics() if _LATENCY_INJECTOR is not None else None
+        }
+
+    def register_live_mirror(self, collection: str) -> bool:
+        """Serve reads of a collection from memory, kept current by a snapshot listener.
+
+        Returns False in mock mode, where data is already in memory.
+        """
+        if settings.USE_MOCK_FIREBASE or 'firestore' not in globals():
+            return False
+        if collection not in _MIRRORS:
+            mirror = LiveMirror(
+                collection,
+                dirty_seconds=settings.FIRESTORE_MIRROR_DIRTY_SECONDS,
+                restart_seconds=settings.FIRESTORE_MIRROR_RESTART_SECONDS
+            )
+            # Listeners need the sync client, whichever backend serves other calls
+            mirror.start(firestore.client())
+            _MIRRORS[collection] = mirror
+        return True
+
+    def start_live_mirrors(self):
+        for collection in settings.FIRESTORE_LIVE_MIRRORS:
+            self.register_live_mirror(collection)
+
+    async def _cached(self, collection: str, key: str, loader):
+        """Serve a read from the reference cache when the collection is cached"""
+        cache = get_document_cache()
+        if not cache.is_cached(collection):
+            return await loader()
+        return await cache.get_or_load(collection, key, loader)
+
+    def _invalidate(self, collection: str, doc_ids: List[str], changes: Optional[Dict[str, tuple]] = None):
+        """Forget cached copies of documents this process has just written.
+
+        changes ({doc_id: (kind, data)}) lets the query cache keep the results
+        those writes cannot affect; without it the collection's queries are dropped.
+        """
+        get_document_cache().invalidate(collection, doc_ids)
+        get_query_cache().invalidate(collection, changes)
+        mirror = _MIRRORS.get(collection)
+        if mirror is not None:
+            mirror.mark_dirty(doc_ids)
+
     async def get_user_by_email(self, email: str) -> Optional[Dict]:
         if settings.USE_MOCK_FIREBASE:
-            for user in self._mock_data["users"].values():
-                if user["email"] == email:
-                    return user
-            return None
+            await self._mock_round_trip('users', 'query')
+            users = self._mock_data["users"].query([("email", "==", email)])
+            return users[0] if users else None
         else:
-            users_ref = self.db.collection('users')
-            query = users_ref.where('email', '==', email).limit(1)
-            docs = await async_wrap(query.get)()
-            for doc in docs:
-                return {**doc.to_dict(), "id": doc.id}
-            return None
+            return await self._cached('users', f"email:{email}", lambda: self._query_user_by_email(email))
+
+    async def _query_user_by_email(self, email: str) -> Optional[Dict]:
+        users_ref = self.db.collection('users')
+        query = users_ref.where('email', '==', email).limit(1)
+        docs = await self._run('users', 'query', query.get)
+        for doc in docs:
+            return {**doc.to_dict(), "id": doc.id}
+        return None
 
     async def create_user(self, user_data: Dict) -> Dict:
         user_data["password"] = get_password_hash(user_data["password"])
@@ -133,6 +480,7 @@ class FirebaseService:
         user_data["updated_at"] = datetime.now()
         
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('users', 'write')
             user_id = f"user_{len(self._mock_data['users']) + 1}"
             user_data["id"] = user_id
             self._mock_data["users"][user_id] = user_data
@@ -140,26 +488,24 @@ class FirebaseService:
         else:
             doc_ref = self.db.collection('users').document()
             user_data["id"] = doc_ref.id
-            await async_wrap(doc_ref.set)(user_data)
+            await self._run('users', 'write', doc_ref.set, user_data)
             return user_data
 
-    async def get_farmers(self) -> List[Dict]:
+    async def get_farmers(self, select: Optional[List[str]] = None) -> List[Dict]:
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farmers', 'query')
+            if select is not None:
+                return self._mock_data["farmers"].query(select=select)
             return list(self._mock_data["farmers"].values())
         else:
-            farmers_ref = self.db.collection('farmers')
-            docs = await async_wrap(farmers_ref.get)()
-            return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+            return await self.query_documents('farmers', select=select)
 
     async def get_farmer(self, farmer_id: str) -> Optional[Dict]:
         if settings.USE_MOCK_FIREBASE:
-            return self._mock_data["farmers"].get(farmer_id)
+            await self._mock_round_trip('farmers', 'read')
+            return _overlay_pending('farmers', farmer_id, self._mock_data["farmers"].get(farmer_id))
         else:
-            doc_ref = self.db.collection('farmers').document(farmer_id)
-            doc = await async_wrap(doc_ref.get)()
-            if doc.exists:
-                return {**doc.to_dict(), "id": doc.id}
-            return None
+            return await self.get_document('farmers', farmer_id)
 
     async def create_farmer(self, farmer_data: Dict) -> Dict:
         farmer_data["created_at"] = datetime.now()
@@ -167,6 +513,7 @@ class FirebaseService:
         farmer_data["face_enrolled"] = False
         
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farmers', 'write')
             farmer_id = f"farmer_{len(self._mock_data['farmers']) + 1}"
             farmer_data["id"] = farmer_id
             self._mock_data["farmers"][farmer_id] = farmer_data
@@ -174,60 +521,218 @@ class FirebaseService:
         else:
             doc_ref = self.db.collection('farmers').document()
             farmer_data["id"] = doc_ref.id
-            await async_wrap(doc_ref.set)(farmer_data)
+            try:
+                await self._run('farmers', 'write', doc_ref.set, farmer_data)
+            finally:
+                self._invalidate('farmers', [doc_ref.id], {doc_ref.id: ("set", farmer_data)})
             return farmer_data
 
-    async def update_farmer(self, farmer_id: str, update_data: Dict) -> Optional[Dict]:
+    async def update_farmer(self, farmer_id: str, update_data: Dict, write_behind: bool = False,
+                            return_document: Union[bool, str] = False, base: Optional[Dict] = None) -> Optional[Dict]:
+        """Update a farmer; with write_behind the update is queued (see save_document).
+
+        Returns what return_document asks for, as in update_document.
+        """
         update_data["updated_at"] = datetime.now()
         
+        if write_behind:
+            await get_write_behind_queue().enqueue('farmers', farmer_id, "update", update_data)
+            return await self.get_farmer(farmer_id) if return_document else {"id": farmer_id, "update_time": None}
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farmers', 'write')
             if farmer_id in self._mock_data["farmers"]:
-                self._mock_data["farmers"][farmer_id].update(update_data)
-                return self._mock_data["farmers"][farmer_id]
+                doc = self._mock_data["farmers"].patch(farmer_id, update_data)
+                return doc if return_document else {"id": farmer_id, "update_time": datetime.now(timezone.utc)}
             return None
         else:
             doc_ref = self.db.collection('farmers').document(farmer_id)
-            await async_wrap(doc_ref.update)(update_data)
-            return await self.get_farmer(farmer_id)
+            if return_document == "merged" and base is None:
+                base = self._local_copy('farmers', farmer_id)
+            try:
+                result = await self._run('farmers', 'write', doc_ref.update, update_data)
+            finally:
+                self._invalidate('farmers', [farmer_id], {farmer_id: ("update", update_data)})
+            return await self._updated_document(
+                farmer_id, update_data, result, return_document, base, lambda: self.get_farmer(farmer_id)
+            )
 
     async def delete_farmer(self, farmer_id: str) -> bool:
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farmers', 'delete')
             if farmer_id in self._mock_data["farmers"]:
                 del self._mock_data["farmers"][farmer_id]
                 return True
             return False
         else:
             doc_ref = self.db.collection('farmers').document(farmer_id)
-            await async_wrap(doc_ref.delete)()
+            try:
+                await self._run('farmers', 'delete', doc_ref.delete)
+            finally:
+                self._invalidate('farmers', [farmer_id], {farmer_id: ("delete", None)})
             return True
 
     # Generic document methods
-    async def save_document(self, collection: str, doc_id: str, data: Dict) -> Dict:
-        """Save a document to a collection"""
+    async def save_document(self, collection: str, doc_id: str, data: Dict, write_behind: bool = False) -> Dict:
+        """Save a document to a collection.
+
+        With write_behind the write is journaled locally and applied in the
+        background, for writes the caller need not wait for. get_document sees
+        it at once; queries see it after the next flush.
+        """
+        if write_behind:
+            await get_write_behind_queue().enqueue(collection, doc_id, "set", data)
+            return data
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip(collection, 'write')
             if collection not in self._mock_data:
                 self._mock_data[collection] = {}
             self._mock_data[collection][doc_id] = data
             return data
         else:
             doc_ref = self.db.collection(collection).document(doc_id)
-            await async_wrap(doc_ref.set)(data)
+            try:
+                await self._run(collection, 'write', doc_ref.set, data)
+            finally:
+                self._invalidate(collection, [doc_id], {doc_id: ("set", data)})
             return data
     
-    async def get_document(self, collection: str, doc_id: str) -> Optional[Dict]:
-        """Get a document from a collection"""
+    async def get_document(self, collection: str, doc_id: str, select: Optional[List[str]] = None) -> Optional[Dict]:
+        """Get a document from a collection, optionally only the fields in select"""
+        pending = _WRITE_BEHIND.pending_write(collection, doc_id) if _WRITE_BEHIND is not None else None
+        if pending is not None:
+            # A queued set or delete decides the result; an update applies to the stored document
+            base = await self._get_document(collection, doc_id) if pending.kind == "update" else None
+            doc = _overlay_pending(collection, doc_id, base)
+            return project_document(doc, select) if doc is not None else None
+        return await self._get_document(collection, doc_id, select)
+
+    async def _get_document(self, collection: str, doc_id: str, select: Optional[List[str]] = None) -> Optional[Dict]:
         if settings.USE_MOCK_FIREBASE:
-            return self._mock_data.get(collection, {}).get(doc_id)
+            await self._mock_round_trip(collection, 'read')
+            doc = self._mock_data.get(collection, {}).get(doc_id)
+            if doc is None or select is None:
+                return doc
+            return project_document({**doc, "id": doc_id}, select)
         else:
-            doc_ref = self.db.collection(collection).document(doc_id)
-            doc = await async_wrap(doc_ref.get)()
-            if doc.exists:
-                return {**doc.to_dict(), "id": doc.id}
-            return None
+            mirror = _MIRRORS.get(collection)
+            if mirror is not None:
+                found = mirror.get([doc_id])
+                if found is not None:
+                    doc = found.get(doc_id)
+                    return project_document(doc, select) if doc is not None else None
+            if get_document_cache().is_cached(collection):
+                # Cache entries are whole documents; project the cached copy
+                doc = await self._cached(collection, doc_id, lambda: self._read_document(collection, doc_id))
+                return project_document(doc, select) if doc is not None else None
+            return await self._read_document(collection, doc_id, select)
+
+    async def _read_document(self, collection: str, doc_id: str, select: Optional[List[str]] = None) -> Optional[Dict]:
+        doc_ref = self.db.collection(collection).document(doc_id)
+        if select is not None:
+            doc = await self._run(collection, 'read', doc_ref.get, field_paths=select)
+        else:
+            doc = await self._run(collection, 'read', doc_ref.get)
+        if doc.exists:
+            return {**doc.to_dict(), "id": doc.id}
+        return None
+
+    def _local_copy(self, collection: str, doc_id: str) -> Optional[Dict]:
+        """A document as held by a live mirror or the document cache, without a read"""
+        mirror = _MIRRORS.get(collection)
+        if mirror is not None:
+            found = mirror.get([doc_id])
+            if found is not None and doc_id in found:
+                return found[doc_id]
+        if get_document_cache().is_cached(collection):
+            return get_document_cache().peek(collection, doc_id)
+        return None
+
+    async def _updated_document(self, doc_id: str, update_data: Dict, write_result,
+                                return_document: Union[bool, str], base: Optional[Dict], read) -> Optional[Dict]:
+        """What an update returns for its return_document option (see update_document)"""
+        # Firestore's WriteResult carries the commit time; other backends fall back to the clock
+        update_time = getattr(write_result, "update_time", None) or datetime.now(timezone.utc)
+        if not return_document:
+            return {"id": doc_id, "update_time": update_time}
+        if return_document == "merged" and base is not None:
+            return {**apply_update(base, update_data), "id": doc_id, "update_time": update_time}
+        return await read()
     
+    async def get_documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict]:
+        """Get many documents by ID in as few round trips as possible.
+
+        IDs are de-duplicated and empty IDs ignored. Returns {doc_id: document}
+        for the documents that exist, so callers can join in memory.
+        """
+        unique_ids = list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id))
+        if not unique_ids:
+            return {}
+
+        if settings.USE_MOCK_FIREBASE:
+            await asyncio.gather(*[
+                self._mock_round_trip(collection, 'read') for _ in range(0, len(unique_ids), _MAX_GET_ALL_IDS)
+            ])
+            store = self._mock_data.get(collection, {})
+            return {doc_id: store[doc_id] for doc_id in unique_ids if doc_id in store}
+
+        mirror = _MIRRORS.get(collection)
+        if mirror is not None:
+            found = mirror.get(unique_ids)
+            if found is not None:
+                return found
+
+        found = {}
+        cache = get_document_cache()
+        cached = cache.is_cached(collection)
+        if cached:
+            generation = cache.generation(collection)
+            for doc_id in unique_ids:
+                doc = cache.peek(collection, doc_id)
+                if doc is not None:
+                    found[doc_id] = doc
+            unique_ids = [doc_id for doc_id in unique_ids if doc_id not in found]
+
+        collection_ref = self.db.collection(collection)
+        chunks = [unique_ids[i:i + _MAX_GET_ALL_IDS] for i in range(0, len(unique_ids), _MAX_GET_ALL_IDS)]
+        chunk_results = await asyncio.gather(*[
+            self._get_all(collection, [collection_ref.document(doc_id) for doc_id in chunk])
+            for chunk in chunks
+        ])
+        for snapshots in chunk_results:
+            for doc in snapshots:
+                if doc.exists:
+                    found[doc.id] = {**doc.to_dict(), "id": doc.id}
+                    if cached:
+                        cache.put(collection, doc.id, found[doc.id], generation)
+        return found
+
+    async def join_documents(self, records: List[Dict], joins: Dict[str, Tuple[str, str]]) -> Dict[str, Dict[str, Dict]]:
+        """Resolve the documents that records refer to, for joining in memory.
+
+        joins maps a name to (collection, reference field), e.g.
+        {"farmer": ("farmers", "farmer_id"), "farm": ("farms", "farm_id")}.
+        The distinct IDs of each referenced collection are fetched with one
+        get_documents call (served by mirrors or the cache where configured),
+        collections concurrently. Returns {name: {doc_id: document}}.
+        """
+        ids_by_collection: Dict[str, List[str]] = {}
+        for collection, field in joins.values():
+            ids_by_collection.setdefault(collection, []).extend(record.get(field) for record in records)
+        collections = list(ids_by_collection)
+        fetched = await asyncio.gather(*[
+            self.get_documents(collection, ids_by_collection[collection]) for collection in collections
+        ])
+        by_collection = dict(zip(collections, fetched))
+        return {name: by_collection[collection] for name, (collection, _) in joins.items()}
+
+    async def _get_all(self, collection: str, doc_refs: List) -> List:
+        """Fetch document snapshots with a single batched get"""
+        return await self._run(collection, 'read', lambda: list(self.db.get_all(doc_refs)))
+
     async def delete_document(self, collection: str, doc_id: str) -> bool:
         """Delete a document from a collection"""
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip(collection, 'delete')
             if collection in self._mock_data and doc_id in self._mock_data[collection]:
                 del self._mock_data[collection][doc_id]
                 return True
@@ -235,90 +740,351 @@ class FirebaseService:
         else:
             try:
                 doc_ref = self.db.collection(collection).document(doc_id)
-                await async_wrap(doc_ref.delete)()
+                await self._run(collection, 'delete', doc_ref.delete)
                 return True
+            except DatastoreUnavailableError:
+                raise
             except Exception as e:
                 print(f"Error deleting document: {e}")
                 return False
+            finally:
+                self._invalidate(collection, [doc_id], {doc_id: ("delete", None)})
     
-    async def update_document(self, collection: str, doc_id: str, update_data: Dict) -> Optional[Dict]:
-        """Update a document in a collection"""
+    async def update_document(self, collection: str, doc_id: str, update_data: Dict, write_behind: bool = False,
+                              return_document: Union[bool, str] = False, base: Optional[Dict] = None) -> Optional[Dict]:
+        """Update a document in a collection; with write_behind the update is queued (see save_document).
+
+        By default no read follows the write: the result is {"id", "update_time"}
+        (the write's commit time), or None if the document does not exist.
+        return_document=True re-reads and returns the stored document.
+        return_document="merged" returns update_data applied to base (the
+        caller's copy of the document) or to a copy held by a mirror or the
+        cache, with the write's update_time, and only re-reads without one.
+        """
+        if write_behind:
+            await get_write_behind_queue().enqueue(collection, doc_id, "update", update_data)
+            return await self.get_document(collection, doc_id) if return_document else {"id": doc_id, "update_time": None}
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip(collection, 'write')
             if collection in self._mock_data and doc_id in self._mock_data[collection]:
-                self._mock_data[collection][doc_id].update(update_data)
-                return self._mock_data[collection][doc_id]
+                doc = self._mock_data[collection].patch(doc_id, update_data)
+                return doc if return_document else {"id": doc_id, "update_time": datetime.now(timezone.utc)}
             return None
         else:
             try:
                 doc_ref = self.db.collection(collection).document(doc_id)
-                await async_wrap(doc_ref.update)(update_data)
-                # Return the updated document
-                doc = await async_wrap(doc_ref.get)()
-                if doc.exists:
-                    return {**doc.to_dict(), "id": doc.id}
-                return None
+                if return_document == "merged" and base is None:
+                    base = self._local_copy(collection, doc_id)
+                try:
+                    result = await self._run(collection, 'write', doc_ref.update, update_data)
+                finally:
+                    self._invalidate(collection, [doc_id], {doc_id: ("update", update_data)})
+                return await self._updated_document(
+                    doc_id, update_data, result, return_document, base,
+                    lambda: self._get_document(collection, doc_id)
+                )
+            except DatastoreUnavailableError:
+                raise
             except Exception as e:
                 print(f"Error updating document: {e}")
                 import traceback
                 print(f"Traceback: {traceback.format_exc()}")
                 return None
     
-    async def query_documents(self, collection: str, filters: List[tuple] = None) -> List[Dict]:
-        """Query documents with filters"""
+    async def transform_document(self, collection: str, doc_id: str,
+                                 transform: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        """Read-modify-write one document in a transaction.
+
+        transform gets the current document (None if it does not exist) and
+        returns the document to store, or None to leave it unchanged. It may
+        run more than once when Firestore retries the transaction on
+        contention, so it must not have side effects. Returns the document
+        as stored afterwards.
+        """
         if settings.USE_MOCK_FIREBASE:
-            docs = self._mock_data.get(collection, {}).values()
-            if filters:
-                # Simple filter implementation for mock mode
-                filtered_docs = []
-                for doc in docs:
-                    match = True
-                    for field, op, value in filters:
-                        doc_value = doc.get(field)
-                        if op == "==" and doc_value != value:
-                            match = False
-                            break
-                        elif op == ">=" and doc_value < value:
-                            match = False
-                            break
-                        elif op == "<=" and doc_value > value:
-                            match = False
-                            break
-                    if match:
-                        filtered_docs.append(doc)
-                return filtered_docs
-            return list(docs)
+            await self._mock_round_trip(collection, 'write')
+            # No await between the read and the write, so this is atomic on the event loop
+            store = self._mock_data.setdefault(collection, {})
+            current = store.get(doc_id)
+            updated = transform(copy.deepcopy(current) if current is not None else None)
+            if updated is None:
+                return current
+            store[doc_id] = updated
+            return updated
+        else:
+            doc_ref = self.db.collection(collection).document(doc_id)
+            updated = None
+            try:
+                updated = await self._run(collection, 'write', self._transact, doc_ref, transform)
+            finally:
+                # None (failed or unchanged) counts as an unknown change
+                self._invalidate(collection, [doc_id], {doc_id: ("set", updated)})
+            return updated
+
+    def _transact(self, doc_ref, transform: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        """Blocking Firestore transaction for transform_document, retried by the client on contention"""
+        @firestore.transactional
+        def run(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            current = snapshot.to_dict() if snapshot.exists else None
+            updated = transform(current)
+            if updated is None:
+                return current
+            transaction.set(doc_ref, updated)
+            return updated
+        return run(self.db.transaction())
+
+    async def query_documents(self, collection: str, filters: List[tuple] = None, order_by: List = None,
+                              limit: Optional[int] = None, start_after: Optional[Dict] = None,
+                              select: Optional[List[str]] = None, cache: bool = True) -> List[Dict]:
+        """Query documents with filters.
+
+        order_by takes field names or (field, direction) pairs and is applied by
+        the datastore, as are limit and start_after, a {field: value} cursor
+        over the ordered fields. Use query_page() for opaque page tokens.
+        select limits the fields returned (ordered fields are always included).
+        Results for collections in FIRESTORE_QUERY_CACHE_TTL_SECONDS are cached
+        briefly; cache=False always reads, e.g. for one-off scans.
+        """
+        orders = _query_order(order_by, paged=bool(start_after), filters=filters)
+        fields = _projection(select, orders)
+        if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip(collection, 'query')
+            if collection not in self._mock_data:
+                return []
+            return self._mock_data[collection].query(filters, orders, start_after, limit, fields)
         else:
+            mirror = _MIRRORS.get(collection)
+            if mirror is not None:
+                docs = mirror.query(filters, orders, start_after, limit, fields)
+                if docs is not None:
+                    return docs
+            query_cache = get_query_cache()
+            if cache and query_cache.is_cached(collection):
+                key = query_cache.key(filters, orders, start_after, limit, fields)
+                return await query_cache.get_or_load(
+                    collection, key, filters, orders,
+                    lambda: self._query(collection, filters, orders, start_after, limit, fields)
+                )
+            return await self._query(collection, filters, orders, start_after, limit, fields)
+
+    async def _query(self, collection: str, filters: Optional[List[tuple]], orders: List[Tuple[str, str]],
+                     start_after: Optional[Dict], limit: Optional[int], fields: Optional[List[str]]) -> List[Dict]:
+        query = self.db.collection(collection)
+        if filters:
+            for field, op, value in filters:
+                query = query.where(field, op, value)
+        if fields is not None:
+            query = query.select(fields)
+        for field, direction in orders:
+            query = query.order_by(field, direction=direction)
+        if start_after:
+            query = query.start_after(start_after)
+        if limit is not None:
+            query = query.limit(limit)
+        docs = await self._run(collection, 'query', query.get)
+        return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+
+    async def query_page(self, collection: str, filters: List[tuple] = None, order_by: List = None,
+                         page_size: Optional[int] = None, page_token: Optional[str] = None,
+                         select: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of an ordered query and the token for the next page.
+
+        The token is None on the last page; without page_size every remaining
+        document is returned. Raises ValueError for a page_size below 1 or a
+        token that does not belong to this ordering.
+        """
+        if page_size is not None and page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        orders = _query_order(order_by, paged=True, filters=filters)
+        start_after = _decode_page_token(page_token, orders) if page_token else None
+        # One extra document tells whether another page follows
+        limit = page_size + 1 if page_size is not None else None
+        docs = await self.query_documents(collection, filters, orders, limit, start_after, select)
+        if page_size is None or len(docs) <= page_size:
+            return docs, None
+        docs = docs[:page_size]
+        return docs, _encode_page_token(docs[-1], orders)
+
+    async def iter_documents(self, collection: str, filters: List[tuple] = None, page_size: int = 500,
+                             order_by: List = None, select: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        """Yield matching documents a page at a time, so at most one page is held in memory.
+
+        Each page starts after the last document of the previous one (by the
+        ordered fields and document ID), so writes and deletes made while
+        iterating do not shift pages or repeat documents.
+        """
+        orders = _query_order(order_by, paged=True, filters=filters)
+        start_after = None
+        while True:
+            docs = await self.query_documents(collection, filters, orders, page_size, start_after, select, cache=False)
+            if not docs:
+                return
+            # Taken before yielding, in case the caller modifies the documents
+            start_after = _cursor(docs[-1], orders)
+            last_page = len(docs) < page_size
+            for doc in docs:
+                yield doc
+            if last_page:
+                return
+
+    # Aggregation queries
+    async def count(self, collection: str, filters: List[tuple] = None) -> int:
+        """Number of documents matching filters, counted by the datastore without reading them"""
+        return await self._aggregate(collection, "count", None, filters)
+
+    async def sum(self, collection: str, field: str, filters: List[tuple] = None):
+        """Sum of a field over matching documents; non-numeric values are ignored, as in Firestore"""
+        return await self._aggregate(collection, "sum", field, filters)
+
+    async def avg(self, collection: str, field: str, filters: List[tuple] = None) -> Optional[float]:
+        """Average of a numeric field over matching documents, or None if no document has one"""
+        return await self._aggregate(collection, "avg", field, filters)
+
+    async def _aggregate(self, collection: str, kind: str, field: Optional[str], filters: List[tuple] = None):
+        if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip(collection, 'aggregate')
+            docs = self._mock_data[collection].query(filters) if collection in self._mock_data else []
+            return _aggregate_values(kind, docs, field)
+        else:
+            mirror = _MIRRORS.get(collection)
+            if mirror is not None:
+                docs = mirror.query(filters, select=[] if field is None else [field])
+                if docs is not None:
+                    return _aggregate_values(kind, docs, field)
             query = self.db.collection(collection)
             if filters:
-                for field, op, value in filters:
-                    query = query.where(field, op, value)
-            docs = await async_wrap(query.get)()
-            return [{**doc.to_dict(), "id": doc.id} for doc in docs]
-    
+                for f, op, value in filters:
+                    query = query.where(f, op, value)
+            if hasattr(query, kind):
+                aggregation = query.count(alias=kind) if kind == "count" else getattr(query, kind)(field, alias=kind)
+                results = await self._run(collection, 'aggregate', aggregation.get)
+                for result in results[0] if results else []:
+                    if result.alias == kind:
+                        return result.value
+                return _aggregate_values(kind, [], field)
+            # The pinned SDK only has count(); read just this field, a page at a time
+            total = 0
+            numeric = 0
+            async for doc in self.iter_documents(collection, filters, select=[field]):
+                for value in _numeric_values([doc], field):
+                    total += value
+                    numeric += 1
+            if kind == "sum":
+                return total
+            return total / numeric if numeric else None
+
+    # Bulk write methods
+    async def save_documents_bulk(self, collection: str, documents: Dict[str, Dict]) -> Dict:
+        """Save many documents ({doc_id: data}) using chunked batch writes"""
+        return await self._write_bulk(collection, [(doc_id, "set", data) for doc_id, data in documents.items()])
+
+    async def create_documents_bulk(self, collection: str, documents: Dict[str, Dict]) -> Dict:
+        """Create many documents ({doc_id: data}); documents that already exist are reported as failed"""
+        return await self._write_bulk(collection, [(doc_id, "create", data) for doc_id, data in documents.items()])
+
+    async def update_documents_bulk(self, collection: str, updates: Dict[str, Dict]) -> Dict:
+        """Update many documents ({doc_id: update_data}); missing documents are reported as failed"""
+        return await self._write_bulk(collection, [(doc_id, "update", data) for doc_id, data in updates.items()])
+
+    async def delete_documents_bulk(self, collection: str, doc_ids: List[str]) -> Dict:
+        """Delete many documents; deleting a missing document succeeds, as in Firestore"""
+        return await self._write_bulk(collection, [(doc_id, "delete", None) for doc_id in doc_ids])
+
+    async def _write_bulk(self, collection: str, operations: List[tuple]) -> Dict:
+        """Apply (doc_id, kind, data) operations and report the outcome per document.
+
+        Returns {"succeeded": [doc_id, ...], "failed": {doc_id: error}}.
+        """
+        result = {"succeeded": [], "failed": {}}
+        if not operations:
+            return result
+
+        if settings.USE_MOCK_FIREBASE:
+            await asyncio.gather(*[
+                self._mock_round_trip(collection, 'write') for _ in range(0, len(operations), _MAX_BATCH_OPS)
+            ])
+            store = self._mock_data.setdefault(collection, {})
+            for doc_id, kind, data in operations:
+                if kind == "set":
+                    store[doc_id] = data
+                elif kind == "create":
+                    if doc_id in store:
+                        result["failed"][doc_id] = f"Document already exists: {collection}/{doc_id}"
+                        continue
+                    store[doc_id] = data
+                elif kind == "update":
+                    if doc_id not in store:
+                        result["failed"][doc_id] = f"No document to update: {collection}/{doc_id}"
+                        continue
+                    store.patch(doc_id, data)
+                else:
+                    store.pop(doc_id, None)
+                result["succeeded"].append(doc_id)
+            return result
+
+        chunks = [operations[i:i + _MAX_BATCH_OPS] for i in range(0, len(operations), _MAX_BATCH_OPS)]
+        semaphore = asyncio.Semaphore(settings.FIRESTORE_BULK_CONCURRENCY)
+
+        async def commit(chunk: List[tuple]):
+            batch = self.db.batch()
+            for doc_id, kind, data in chunk:
+                doc_ref = self.db.collection(collection).document(doc_id)
+                if kind == "set":
+                    batch.set(doc_ref, data)
+                elif kind == "create":
+                    batch.create(doc_ref, data)
+                elif kind == "update":
+                    batch.update(doc_ref, data)
+                else:
+                    batch.delete(doc_ref)
+            await self._run(collection, 'write', batch.commit)
+
+        async def write_chunk(chunk: List[tuple]):
+            async with semaphore:
+                try:
+                    await commit(chunk)
+                    result["succeeded"].extend(doc_id for doc_id, _, _ in chunk)
+                    return
+                except Exception as e:
+                    if len(chunk) == 1:
+                        result["failed"][chunk[0][0]] = str(e)
+                        return
+                    print(f"Batch write to {collection} failed ({e}), retrying {len(chunk)} documents individually")
+            # A batch is atomic, so one bad document fails the whole chunk; isolate it
+            await asyncio.gather(*[write_chunk([op]) for op in chunk])
+
+        changes = {}
+        for doc_id, kind, data in operations:
+            # Several writes to one document: treat it as an unknown change
+            changes[doc_id] = ("set", None) if doc_id in changes else ("set" if kind == "create" else kind, data)
+        try:
+            await asyncio.gather(*[write_chunk(chunk) for chunk in chunks])
+        finally:
+            self._invalidate(collection, list(changes), changes)
+        return result
+
     # Farm methods
     async def get_farms(self) -> List[Dict]:
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farms', 'query')
             return list(self._mock_data["farms"].values())
         else:
-            farms_ref = self.db.collection('farms')
-            docs = await async_wrap(farms_ref.get)()
-            return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+            return await self.query_documents('farms')
     
     async def get_farm(self, farm_id: str) -> Optional[Dict]:
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farms', 'read')
             return self._mock_data["farms"].get(farm_id)
         else:
-            doc_ref = self.db.collection('farms').document(farm_id)
-            doc = await async_wrap(doc_ref.get)()
-            if doc.exists:
-                return {**doc.to_dict(), "id": doc.id}
-            return None
+            return await self.get_document('farms', farm_id)
     
     async def create_farm(self, farm_data: Dict) -> Dict:
         farm_data["created_at"] = datetime.now()
         farm_data["updated_at"] = datetime.now()
         
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farms', 'write')
             farm_id = f"farm_{len(self._mock_data['farms']) + 1}"
             farm_data["id"] = farm_id
             self._mock_data["farms"][farm_id] = farm_data
@@ -326,31 +1092,48 @@ class FirebaseService:
         else:
             doc_ref = self.db.collection('farms').document()
             farm_data["id"] = doc_ref.id
-            await async_wrap(doc_ref.set)(farm_data)
+            try:
+                await self._run('farms', 'write', doc_ref.set, farm_data)
+            finally:
+                self._invalidate('farms', [doc_ref.id], {doc_ref.id: ("set", farm_data)})
             return farm_data
     
-    async def update_farm(self, farm_id: str, update_data: Dict) -> Optional[Dict]:
+    async def update_farm(self, farm_id: str, update_data: Dict, return_document: Union[bool, str] = False,
+                          base: Optional[Dict] = None) -> Optional[Dict]:
+        """Update a farm; returns what return_document asks for, as in update_document"""
         update_data["updated_at"] = datetime.now()
         
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farms', 'write')
             if farm_id in self._mock_data["farms"]:
-                self._mock_data["farms"][farm_id].update(update_data)
-                return self._mock_data["farms"][farm_id]
+                doc = self._mock_data["farms"].patch(farm_id, update_data)
+                return doc if return_document else {"id": farm_id, "update_time": datetime.now(timezone.utc)}
             return None
         else:
             doc_ref = self.db.collection('farms').document(farm_id)
-            await async_wrap(doc_ref.update)(update_data)
-            return await self.get_farm(farm_id)
+            if return_document == "merged" and base is None:
+                base = self._local_copy('farms', farm_id)
+            try:
+                result = await self._run('farms', 'write', doc_ref.update, update_data)
+            finally:
+                self._invalidate('farms', [farm_id], {farm_id: ("update", update_data)})
+            return await self._updated_document(
+                farm_id, update_data, result, return_document, base, lambda: self.get_farm(farm_id)
+            )
     
     async def delete_farm(self, farm_id: str) -> bool:
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('farms', 'delete')
             if farm_id in self._mock_data["farms"]:
                 del self._mock_data["farms"][farm_id]
                 return True
             return False
         else:
             doc_ref = self.db.collection('farms').document(farm_id)
-            await async_wrap(doc_ref.delete)()
+            try:
+                await self._run('farms', 'delete', doc_ref.delete)
+            finally:
+                self._invalidate('farms', [farm_id], {farm_id: ("delete", None)})
             return True
 
     # Attendance methods
@@ -358,6 +1141,7 @@ class FirebaseService:
         attendance_data["created_at"] = datetime.now()
         
         if settings.USE_MOCK_FIREBASE:
+            await self._mock_round_trip('attendance', 'write')
             attendance_id = f"attendance_{len(self._mock_data['attendance']) + 1}"
             attendance_data["id"] = attendance_id
             self._mock_data["attendance"][attendance_id] = attendance_data
@@ -365,55 +1149,68 @@ class FirebaseService:
         else:
             doc_ref = self.db.collection('attendance').document()
             attendance_data["id"] = doc_ref.id
-            await async_wrap(doc_ref.set)(attendance_data)
+            try:
+                await self._run('attendance', 'write', doc_ref.set, attendance_data)
+            finally:
+                self._invalidate('attendance', [doc_ref.id], {doc_ref.id: ("set", attendance_data)})
             return attendance_data
     
     async def get_attendance_by_date(self, date: str) -> List[Dict]:
         if settings.USE_MOCK_FIREBASE:
-            return [a for a in self._mock_data["attendance"].values() 
-                   if a.get("date", "") == date]
+            await self._mock_round_trip('attendance', 'query')
+            return self._mock_data["attendance"].query([("date", "==", date)])
         else:
             # Query by date field directly (stored as ISO date string)
-            attendance_ref = self.db.collection('attendance')
-            query = attendance_ref.where('date', '==', date)
-            docs = await async_wrap(query.get)()
-            return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+            return await self.query_documents('attendance', [('date', '==', date)])
     
     async def get_attendance_stats(self) -> Dict:
-        if settings.USE_MOCK_FIREBASE:
-            total = len(self._mock_data["attendance"])
-            return {
-                "total_today": total,
-                "total_week": total,
-                "total_month": total,
-                "average_confidence": 0.95
-            }
-        else:
-            # In production, implement actual stats calculation
-            return {
-                "total_today": 0,
-                "total_week": 0,
-                "total_month": 0,
-                "average_confidence": 0.0
-            }
+        """Check-ins today and over the last 7 and 30 days, counted by the datastore"""
+        today = datetime.now().date()
+        week_start = (today - timedelta(days=6)).isoformat()
+        month_start = (today - timedelta(days=29)).isoformat()
+        total_today, total_week, total_month, average_confidence = await asyncio.gather(
+            self.count("attendance", [("date", "==", today.isoformat())]),
+            self.count("attendance", [("date", ">=", week_start)]),
+            self.count("attendance", [("date", ">=", month_start)]),
+            self.avg("attendance", "face_confidence", [("date", ">=", month_start)])
+        )
+        return {
+            "total_today": total_today,
+            "total_week": total_week,
+            "total_month": total_month,
+            "average_confidence": round(average_confidence, 4) if average_confidence is not None else 0.0
+        }
     
     # Storage methods
     async def upload_file(self, file_path: str, file_data: bytes, content_type: str = 'image/jpeg') -> str:
+        """Upload bytes to Storage off the event loop and return the public URL"""
+        if settings.USE_MOCK_FIREBASE:
+            return f"https://storage.mock.com/{file_path}"
+        else:
+            return await get_storage_uploader().upload(self.bucket, file_path, file_data, content_type)
+
+    async def upload_local_file(self, file_path: str, local_path: str, content_type: str = 'video/mp4') -> str:
+        """Upload a file from disk (resumable and chunked when large) and return the public URL"""
         if settings.USE_MOCK_FIREBASE:
             return f"https://storage.mock.com/{file_path}"
         else:
-            blob = self.bucket.blob(file_path)
-            blob.upload_from_string(file_data, content_type=content_type)
-            blob.make_public()
-            return blob.public_url
+            return await get_storage_uploader().upload_from_path(self.bucket, file_path, local_path, content_type)
     
+    async def upload_file_later(self, file_path: str, local_path: str, collection: str, doc_id: str, field: str,
+                                content_type: str = 'image/jpeg'):
+        """Upload a saved local file in the background and set doc field to its URL once done.
+
+        The document should already point at the local copy; the queue is
+        durable, so the upload survives restarts.
+        """
+        await get_photo_upload_queue().enqueue(local_path, file_path, collection, doc_id, field, content_type)
+
     async def delete_file(self, file_path: str) -> bool:
         if settings.USE_MOCK_FIREBASE:
             return True
         else:
             try:
-                blob = self.bucket.blob(file_path)
-                blob.delete()
+                await get_storage_uploader().delete(self.bucket, file_path)
                 return True
             except Exception:
                 return False
\ No newline at end of file
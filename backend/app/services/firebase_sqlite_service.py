@@ -0,0 +1,61 @@
+from typing import Callable, Dict, Optional
+from app.core.config import settings
+from app.services.firebase_service import FirebaseService
+from app.services.sqlite_datastore import LocalBucket, SQLiteClient
+
+# One client (and connection pool) per process, shared by all service instances
+_CLIENT: Optional[SQLiteClient] = None
+_BUCKET: Optional[LocalBucket] = None
+
+
+def get_sqlite_client() -> SQLiteClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = SQLiteClient(
+            settings.SQLITE_DATABASE_PATH,
+            pool_size=settings.SQLITE_POOL_SIZE,
+            indexed_fields=settings.SQLITE_INDEXED_FIELDS
+        )
+    return _CLIENT
+
+
+def get_local_bucket() -> LocalBucket:
+    global _BUCKET
+    if _BUCKET is None:
+        _BUCKET = LocalBucket(settings.LOCAL_STORAGE_DIR, settings.LOCAL_STORAGE_URL_PREFIX)
+    return _BUCKET
+
+
+def close_sqlite_client():
+    global _CLIENT
+    if _CLIENT is not None:
+        _CLIENT.close()
+        _CLIENT = None
+
+
+class SQLiteFirebaseService(FirebaseService):
+    """FirebaseService backed by an embedded SQLite database and local files.
+
+    For on-site servers with unreliable connectivity and for CI: no Firebase
+    project or credentials are needed. SQLiteClient implements the part of
+    the Firestore client API the service uses, so every method runs the
+    same code path as production, on the shared thread pool.
+    Selected with FIRESTORE_BACKEND=sqlite.
+    """
+
+    def __init__(self):
+        self.db = get_sqlite_client()
+        self.bucket = get_local_bucket()
+
+    def register_live_mirror(self, collection: str) -> bool:
+        # Reads are already local
+        return False
+
+    def _transact(self, doc_ref, transform: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        return self.db.transform(doc_ref, transform)
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        metrics["backend"] = "sqlite"
+        metrics["sqlite"] = self.db.get_metrics()
+        return metrics
@@ -0,0 +1,305 @@
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict
+import asyncio
+import copy
+import time
+from app.services.firestore_filters import matches_filters
+
+
+class CollectionCache:
+    """LRU map of document key -> (expires_at, document) for one collection"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Bumped on invalidation so loads that started earlier are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Dict):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, doc_ids: Set[str]):
+        # Entries may be keyed by something other than the ID (e.g. users by email)
+        stale = [key for key, (_, value) in self.entries.items() if key in doc_ids or value.get("id") in doc_ids]
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+        self.generation += 1
+
+    def to_dict(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+class DocumentCache:
+    """Read-through cache for rarely changing reference collections.
+
+    Only collections with a configured TTL are cached. Concurrent misses for
+    the same key share one load, and callers always get their own copy of the
+    document so mutating a result never corrupts the cache.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: Optional[Dict[str, int]] = None, default_max_entries: int = 1000):
+        max_entries = max_entries or {}
+        self._collections: Dict[str, CollectionCache] = {
+            name: CollectionCache(ttl, max_entries.get(name, default_max_entries))
+            for name, ttl in ttls.items() if ttl > 0
+        }
+        self._loading: Dict[tuple, asyncio.Future] = {}
+
+    def is_cached(self, collection: str) -> bool:
+        return collection in self._collections
+
+    def peek(self, collection: str, key: str) -> Optional[Dict]:
+        """Return a copy of a cached document, counting a hit or miss"""
+        cache = self._collections[collection]
+        value = cache.get(key)
+        if value is None:
+            cache.misses += 1
+            return None
+        cache.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, collection: str, key: str, value: Optional[Dict], generation: Optional[int] = None):
+        """Store a loaded document unless the collection was invalidated since the load began"""
+        cache = self._collections[collection]
+        if value is None or (generation is not None and generation != cache.generation):
+            return
+        cache.put(key, copy.deepcopy(value))
+
+    def generation(self, collection: str) -> int:
+        return self._collections[collection].generation
+
+    async def get_or_load(self, collection: str, key: str, loader: Callable[[], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Return the cached document or load it once for all concurrent callers"""
+        cache = self._collections[collection]
+        value = cache.get(key)
+        if value is not None:
+            cache.hits += 1
+            return copy.deepcopy(value)
+
+        pending = self._loading.get((collection, key))
+        if pending is not None and pending.get_loop() is asyncio.get_running_loop():
+            cache.coalesced += 1
+            value = await asyncio.shield(pending)
+            return copy.deepcopy(value)
+
+        cache.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[(collection, key)] = future
+        generation = cache.generation
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self.put(collection, key, value, generation)
+            return value
+        finally:
+            if self._loading.get((collection, key)) is future:
+                del self._loading[(collection, key)]
+
+    def invalidate(self, collection: str, doc_ids: Iterable[str]):
+        if collection in self._collections:
+            self._collections[collection].invalidate(set(doc_ids))
+
+    def clear(self):
+        for cache in self._collections.values():
+            cache.entries.clear()
+            cache.generation += 1
+
+    def get_metrics(self) -> Dict:
+        return {name: cache.to_dict() for name, cache in sorted(self._collections.items())}
+
+
+class CachedQuery:
+    """One cached query result and what it depends on"""
+
+    def __init__(self, expires_at: float, docs: List[Dict], filters: List[tuple], fields: Set[str]):
+        self.expires_at = expires_at
+        self.docs = docs
+        self.doc_ids = {doc.get("id") for doc in docs}
+        self.filters = filters
+        # Top-level fields the query filters or orders on
+        self.fields = fields
+
+    def affected_by(self, doc_id: str, kind: str, data: Optional[Dict]) -> bool:
+        """Whether writing doc_id could change this result"""
+        if doc_id in self.doc_ids:
+            return True
+        if kind == "delete":
+            return False
+        if data is None:
+            return True
+        if kind == "set":
+            return matches_filters(data, self.filters)
+        # An update only moves a document into the result through a filtered or ordered field
+        return any(key.split(".")[0] in self.fields for key in data)
+
+
+class QueryCache:
+    """Short-TTL cache of query results for hot, repeated queries.
+
+    Results are keyed by collection, normalized filters, ordering, cursor,
+    limit and projection, and concurrent identical queries share one
+    datastore call. A write drops only the cached queries it can affect:
+    those whose results hold the document and those the written data could
+    now match. Only collections with a configured TTL are cached.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 256):
+        self.ttls = {name: ttl for name, ttl in ttls.items() if ttl > 0}
+        self.max_entries = max_entries
+        self._entries: Dict[str, "OrderedDict[str, CachedQuery]"] = {name: OrderedDict() for name in self.ttls}
+        self._generations: Dict[str, int] = {name: 0 for name in self.ttls}
+        self._loading: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {
+            name: {"hits": 0, "misses": 0, "coalesced": 0, "expirations": 0, "evictions": 0, "invalidations": 0}
+            for name in self.ttls
+        }
+
+    def is_cached(self, collection: str) -> bool:
+        return collection in self.ttls
+
+    @staticmethod
+    def key(filters: Optional[List[tuple]], orders: List[tuple], start_after: Optional[Dict],
+            limit: Optional[int], fields: Optional[List[str]]) -> str:
+        """Key that is the same for equivalent queries (filter order does not matter)"""
+        normalized = sorted(repr((field, op, value)) for field, op, value in filters or [])
+        cursor = sorted(repr(item) for item in (start_after or {}).items())
+        return repr((normalized, list(orders), cursor, limit, sorted(fields) if fields is not None else None))
+
+    def _get(self, collection: str, key: str) -> Optional[CachedQuery]:
+        entries = self._entries[collection]
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del entries[key]
+            self._stats[collection]["expirations"] += 1
+            return None
+        entries.move_to_end(key)
+        return entry
+
+    def _put(self, collection: str, key: str, docs: List[Dict], filters: List[tuple], fields: Set[str]):
+        entries = self._entries[collection]
+        entries[key] = CachedQuery(time.monotonic() + self.ttls[collection], copy.deepcopy(docs), filters, fields)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self._stats[collection]["evictions"] += 1
+
+    async def get_or_load(self, collection: str, key: str, filters: Optional[List[tuple]], orders: List[tuple],
+                          loader: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+        """Cached result of a query, or one load shared by every concurrent caller"""
+        stats = self._stats[collection]
+        entry = self._get(collection, key)
+        if entry is not None:
+            stats["hits"] += 1
+            return copy.deepcopy(entry.docs)
+
+        pending = self._loading.get((collection, key))
+        if pending is not None and pending.get_loop() is asyncio.get_running_loop():
+            stats["coalesced"] += 1
+            return copy.deepcopy(await asyncio.shield(pending))
+
+        stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[(collection, key)] = future
+        generation = self._generations[collection]
+        try:
+            docs = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an unawaited future does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(docs)
+            # A write that landed while the query ran may be missing from its result
+            if generation == self._generations[collection]:
+                fields = {field.split(".")[0] for field, _, _ in filters or []}
+                fields.update(field.split(".")[0] for field, _ in orders)
+                self._put(collection, key, docs, list(filters or []), fields)
+            return copy.deepcopy(docs)
+        finally:
+            if self._loading.get((collection, key)) is future:
+                del self._loading[(collection, key)]
+
+    def invalidate(self, collection: str, changes: Optional[Dict[str, tuple]] = None):
+        """Drop cached queries affected by writes, given as {doc_id: (kind, data)}; None drops them all"""
+        if collection not in self.ttls:
+            return
+        entries = self._entries[collection]
+        if changes is None:
+            stale = list(entries)
+        else:
+            stale = [
+                key for key, entry in entries.items()
+                if any(entry.affected_by(doc_id, kind, data) for doc_id, (kind, data) in changes.items())
+            ]
+        for key in stale:
+            del entries[key]
+        self._stats[collection]["invalidations"] += len(stale)
+        self._generations[collection] += 1
+
+    def clear(self):
+        for collection, entries in self._entries.items():
+            entries.clear()
+            self._generations[collection] += 1
+
+    def get_metrics(self) -> Dict:
+        metrics = {}
+        for name, stats in sorted(self._stats.items()):
+            lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+            metrics[name] = {
+                "ttl_seconds": self.ttls[name],
+                "size": len(self._entries[name]),
+                **stats,
+                "hit_rate": round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+            }
+        return metrics
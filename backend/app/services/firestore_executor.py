@@ -0,0 +1,214 @@
+from typing import Callable, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+import weakref
+
+
+class CollectionStats:
+    """Latency and error counters for one collection"""
+
+    def __init__(self, sample_size: int = 512):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=sample_size)
+
+    def record(self, elapsed_ms: float, error: bool = False, timeout: bool = False):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+        if error:
+            self.errors += 1
+        if timeout:
+            self.timeouts += 1
+
+    def to_dict(self) -> Dict:
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2] if ordered else 0.0
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            "p50_ms": round(p50, 2),
+            "p95_ms": round(p95, 2),
+            "max_ms": round(self.max_ms, 2)
+        }
+
+
+class FirestoreExecutor:
+    """Bounded thread pool for blocking Firestore SDK calls.
+
+    Every call is tagged with the collection it touches and the kind of
+    operation (read, query, write, delete) so it can get its own timeout,
+    an optional per-collection concurrency cap and latency statistics.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        default_timeout: float,
+        operation_timeouts: Optional[Dict[str, float]] = None,
+        collection_limits: Optional[Dict[str, int]] = None
+    ):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.operation_timeouts = operation_timeouts or {}
+        self.collection_limits = collection_limits or {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firestore")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._stats: Dict[str, CollectionStats] = {}
+        # asyncio primitives belong to one loop; scripts may call asyncio.run() repeatedly
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def timeout_for(self, operation: str) -> float:
+        return self.operation_timeouts.get(operation, self.default_timeout)
+
+    def _stats_for(self, collection: str) -> CollectionStats:
+        stats = self._stats.get(collection)
+        if stats is None:
+            stats = self._stats.setdefault(collection, CollectionStats())
+        return stats
+
+    def _semaphore_for(self, loop, collection: str) -> Optional[asyncio.Semaphore]:
+        limit = self.collection_limits.get(collection)
+        if not limit:
+            return None
+        per_loop = self._semaphores.setdefault(loop, {})
+        if collection not in per_loop:
+            per_loop[collection] = asyncio.Semaphore(limit)
+        return per_loop[collection]
+
+    async def run(
+        self,
+        func: Callable,
+        *args,
+        collection: str = "_default",
+        operation: str = "read",
+        timeout: Optional[float] = None,
+        **kwargs
+    ):
+        """Run a blocking call on the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        timeout = timeout if timeout is not None else self.timeout_for(operation)
+        stats = self._stats_for(collection)
+        semaphore = self._semaphore_for(loop, collection)
+        if semaphore is not None:
+            await semaphore.acquire()
+
+        started = {"value": False}
+
+        def call():
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+                stats.in_flight += 1
+            started["value"] = True
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    stats.in_flight -= 1
+
+        def on_done(_):
+            # Runs on the worker thread (or the caller if cancelled before start)
+            if not started["value"]:
+                with self._lock:
+                    self._queued -= 1
+            if semaphore is not None:
+                try:
+                    loop.call_soon_threadsafe(semaphore.release)
+                except RuntimeError:
+                    pass  # Loop already closed
+
+        with self._lock:
+            self._queued += 1
+        t0 = time.perf_counter()
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            # Not submitted (e.g. the pool is shut down), so on_done never runs
+            with self._lock:
+                self._queued -= 1
+            if semaphore is not None:
+                semaphore.release()
+            raise
+        future.add_done_callback(on_done)
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), timeout)
+        except asyncio.TimeoutError:
+            stats.record((time.perf_counter() - t0) * 1000, error=True, timeout=True)
+            raise asyncio.TimeoutError(
+                f"Firestore {operation} on '{collection}' timed out after {timeout}s"
+            )
+        except Exception:
+            stats.record((time.perf_counter() - t0) * 1000, error=True)
+            raise
+        stats.record((time.perf_counter() - t0) * 1000)
+        return result
+
+    async def run_async(
+        self,
+        coro_func: Callable,
+        *args,
+        collection: str = "_default",
+        operation: str = "read",
+        timeout: Optional[float] = None,
+        **kwargs
+    ):
+        """Await a native async call with the same timeout, cap and metrics as run()"""
+        loop = asyncio.get_running_loop()
+        timeout = timeout if timeout is not None else self.timeout_for(operation)
+        stats = self._stats_for(collection)
+        semaphore = self._semaphore_for(loop, collection)
+        if semaphore is not None:
+            await semaphore.acquire()
+        with self._lock:
+            self._in_flight += 1
+            stats.in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coro_func(*args, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            stats.record((time.perf_counter() - t0) * 1000, error=True, timeout=True)
+            raise asyncio.TimeoutError(
+                f"Firestore {operation} on '{collection}' timed out after {timeout}s"
+            )
+        except Exception:
+            stats.record((time.perf_counter() - t0) * 1000, error=True)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                stats.in_flight -= 1
+            if semaphore is not None:
+                semaphore.release()
+        stats.record((time.perf_counter() - t0) * 1000)
+        return result
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            queued, in_flight = self._queued, self._in_flight
+        return {
+            "max_workers": self.max_workers,
+            "queue_depth": queued,
+            "in_flight": in_flight,
+            "collection_limits": dict(self.collection_limits),
+            "collections": {name: stats.to_dict() for name, stats in sorted(self._stats.items())}
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
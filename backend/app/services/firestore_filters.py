@@ -0,0 +1,166 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import copy
+from datetime import date, datetime, timezone
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+# Firestore filter operators that can be evaluated in memory
+FILTER_OPERATORS: Dict[str, Callable] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array-contains": lambda a, b: isinstance(a, list) and b in a,
+    "array-contains-any": lambda a, b: isinstance(a, list) and any(value in a for value in b)
+}
+
+
+def matches_filters(doc: Dict, filters: List[tuple]) -> bool:
+    """Evaluate (field, op, value) filters against a document.
+
+    A missing field only matches equality-style filters, and values that
+    cannot be compared (e.g. a string against a datetime) do not match.
+    """
+    for field, op, value in filters:
+        doc_value = doc.get(field)
+        if doc_value is None and op not in ("==", "!=", "in", "not-in"):
+            return False
+        try:
+            if not FILTER_OPERATORS[op](doc_value, value):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def normalize_order(order_by) -> List[Tuple[str, str]]:
+    """[(field, direction)] from field names or (field, direction) pairs.
+
+    Directions may be given as "asc"/"desc" or Firestore's
+    ASCENDING/DESCENDING, in any case.
+    """
+    orders = []
+    for item in order_by or []:
+        field, direction = (item, ASCENDING) if isinstance(item, str) else item
+        direction = str(direction).upper()
+        if direction in ("ASC", ASCENDING):
+            direction = ASCENDING
+        elif direction in ("DESC", DESCENDING):
+            direction = DESCENDING
+        else:
+            raise ValueError(f"Unsupported order direction: {item[1]}")
+        orders.append((field, direction))
+    return orders
+
+
+def field_value(doc: Dict, field: str):
+    """Value a document is ordered by; __name__ is the document ID"""
+    return doc.get("id") if field == "__name__" else doc.get(field)
+
+
+def has_field(doc: Dict, field: str) -> bool:
+    """Whether a document has a field, even if its value is null"""
+    return field == "__name__" or field in doc
+
+
+def order_key(value) -> tuple:
+    """Sort key following Firestore's cross-type ordering:
+    null < booleans < numbers < timestamps < strings < bytes < others"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        # Naive datetimes are taken as UTC, as the SDK does when writing
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (3, value.timestamp())
+    if isinstance(value, date):
+        return (3, datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if hasattr(value, "id"):
+        # A document reference, as the SDK returns for __name__ cursors
+        return (4, value.id)
+    return (6, repr(value))
+
+
+def _after_cursor(doc: Dict, orders: List[Tuple[str, str]], cursor: Dict) -> bool:
+    for field, direction in orders:
+        if field not in cursor:
+            break
+        doc_key = order_key(field_value(doc, field))
+        cursor_key = order_key(cursor[field])
+        if doc_key != cursor_key:
+            return doc_key > cursor_key if direction == ASCENDING else doc_key < cursor_key
+    return False
+
+
+def order_documents(docs: List[Dict], order_by=None, start_after: Optional[Dict] = None,
+                    limit: Optional[int] = None) -> List[Dict]:
+    """Apply order_by, a start_after cursor and limit to documents in memory.
+
+    Mirrors Firestore: documents missing an ordered field are left out (an
+    explicit null is kept and sorts first), and start_after is a
+    {field: value} cursor over the ordered fields.
+    """
+    orders = normalize_order(order_by)
+    if orders:
+        docs = [doc for doc in docs if all(has_field(doc, field) for field, _ in orders)]
+        # Stable sorts from the last key to the first give mixed directions
+        for field, direction in reversed(orders):
+            docs.sort(key=lambda doc: order_key(field_value(doc, field)), reverse=direction == DESCENDING)
+        if start_after:
+            docs = [doc for doc in docs if _after_cursor(doc, orders, start_after)]
+    if limit is not None:
+        docs = docs[:limit]
+    return docs
+
+
+def project_document(doc: Dict, fields: Optional[List[str]]) -> Dict:
+    """Copy of doc with only the selected fields, like a Firestore select().
+
+    Dotted paths address nested maps. The document ID is always kept;
+    fields=None returns doc unchanged.
+    """
+    if fields is None:
+        return doc
+    projected: Dict = {}
+    for field in fields:
+        value = doc
+        parts = field.split(".")
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    if "id" in doc:
+        projected["id"] = doc["id"]
+    return projected
+
+
+def apply_update(doc: Dict, update_data: Dict) -> Dict:
+    """Copy of doc with Firestore-style update fields applied (dotted keys address nested maps)"""
+    doc = copy.deepcopy(doc)
+    for key, value in update_data.items():
+        parts = key.split(".")
+        target = doc
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[parts[-1]] = value
+    return doc
@@ -0,0 +1,164 @@
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+import copy
+import threading
+import time
+from app.services.firestore_filters import FILTER_OPERATORS, matches_filters, order_documents, project_document
+
+
+class LiveMirror:
+    """In-process copy of a collection kept current by an on_snapshot listener.
+
+    The listener delivers the full collection first and incremental changes
+    after that, on a background thread. Reads are served only while the
+    listener is active; documents written by this process are read directly
+    until their change event arrives, so callers still see their own writes.
+    """
+
+    def __init__(self, collection: str, dirty_seconds: float = 5.0, restart_seconds: float = 30.0):
+        self.collection = collection
+        self.dirty_seconds = dirty_seconds
+        self.restart_seconds = restart_seconds
+        self._docs: Dict[str, Dict] = {}
+        self._dirty: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._db = None
+        self._watch = None
+        self._started_at: Optional[float] = None
+        self.last_event_at: Optional[float] = None
+        self.read_time: Optional[datetime] = None
+        self.events = 0
+        self.changes = 0
+        self.restarts = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    def start(self, db):
+        self._db = db
+        self._ready.clear()
+        self._started_at = time.monotonic()
+        try:
+            self._watch = db.collection(self.collection).on_snapshot(self._on_snapshot)
+        except Exception as e:
+            self._watch = None
+            self._record_error(e)
+
+    def stop(self):
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception as e:
+                print(f"Error stopping {self.collection} mirror: {e}")
+            self._watch = None
+        self._ready.clear()
+
+    def _record_error(self, error: Exception):
+        self.errors += 1
+        self.last_error = str(error)
+        print(f"Live mirror for {self.collection} failed: {error}")
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            with self._lock:
+                if not self._ready.is_set():
+                    # First snapshot (also after a restart) is the whole collection
+                    self._docs = {doc.id: {**doc.to_dict(), "id": doc.id} for doc in docs}
+                    self._dirty.clear()
+                else:
+                    for change in changes:
+                        doc = change.document
+                        if change.type.name == "REMOVED":
+                            self._docs.pop(doc.id, None)
+                        else:
+                            self._docs[doc.id] = {**doc.to_dict(), "id": doc.id}
+                        self._dirty.pop(doc.id, None)
+                self.events += 1
+                self.changes += len(changes)
+                self.last_event_at = time.monotonic()
+                self.read_time = read_time
+            self._ready.set()
+        except Exception as e:
+            # A half-applied change set cannot be trusted; resync on the next read
+            self._ready.clear()
+            self._record_error(e)
+
+    @property
+    def active(self) -> bool:
+        return self._watch is not None and self._watch.is_active
+
+    def available(self) -> bool:
+        """True when reads can be served from memory, restarting a dead listener if due"""
+        if self._ready.is_set() and self.active:
+            return True
+        if self._db is not None and not self.active and time.monotonic() - self._started_at >= self.restart_seconds:
+            self.stop()
+            self.restarts += 1
+            self.start(self._db)
+        return False
+
+    def _is_dirty(self, doc_id: str) -> bool:
+        marked_at = self._dirty.get(doc_id)
+        if marked_at is None:
+            return False
+        if time.monotonic() - marked_at > self.dirty_seconds:
+            del self._dirty[doc_id]
+            return False
+        return True
+
+    def mark_dirty(self, doc_ids: Iterable[str]):
+        now = time.monotonic()
+        with self._lock:
+            for doc_id in doc_ids:
+                self._dirty[doc_id] = now
+
+    def get(self, doc_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """Documents that exist among doc_ids, or None if any must be read directly"""
+        if not self.available():
+            self.fallbacks += 1
+            return None
+        with self._lock:
+            if any(self._is_dirty(doc_id) for doc_id in doc_ids):
+                self.fallbacks += 1
+                return None
+            found = {doc_id: copy.deepcopy(self._docs[doc_id]) for doc_id in doc_ids if doc_id in self._docs}
+        self.hits += 1
+        return found
+
+    def query(self, filters: Optional[List[tuple]] = None, order_by=None, start_after: Optional[Dict] = None,
+              limit: Optional[int] = None, select: Optional[List[str]] = None) -> Optional[List[Dict]]:
+        """Matching documents, or None if the query cannot be answered from memory"""
+        filters = filters or []
+        if any(op not in FILTER_OPERATORS for _, op, _ in filters) or not self.available():
+            self.fallbacks += 1
+            return None
+        with self._lock:
+            if any(self._is_dirty(doc_id) for doc_id in list(self._dirty)):
+                self.fallbacks += 1
+                return None
+            results = [doc for doc in self._docs.values() if matches_filters(doc, filters)]
+            if order_by or start_after or limit is not None:
+                results = order_documents(results, order_by, start_after, limit)
+            results = [copy.deepcopy(project_document(doc, select)) for doc in results]
+        self.hits += 1
+        return results
+
+    def to_dict(self) -> Dict:
+        staleness = time.monotonic() - self.last_event_at if self.last_event_at is not None else None
+        return {
+            "active": self.active,
+            "ready": self._ready.is_set(),
+            "documents": len(self._docs),
+            "pending_writes": len(self._dirty),
+            "seconds_since_last_event": round(staleness, 3) if staleness is not None else None,
+            "read_time": self.read_time.isoformat() if self.read_time else None,
+            "events": self.events,
+            "changes": self.changes,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "restarts": self.restarts,
+            "errors": self.errors,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,286 @@
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from collections import deque
+from fastapi import HTTPException
+from app.services.datastore_trace import record_call
+import asyncio
+import random
+import sqlite3
+import time
+
+# Upper bounds (ms) of the latency histogram buckets; slower calls land in the last, open bucket
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# google.api_core exception names (matched by name so the SQLite backend needs no Google libraries)
+_TRANSIENT_ERROR_NAMES = {
+    "ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "TooManyRequests",
+    "ResourceExhausted", "Aborted", "BadGateway", "GatewayTimeout", "RetryError"
+}
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors worth retrying: timeouts, dropped connections, overload"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class DatastoreUnavailableError(HTTPException):
+    """The datastore is unreachable for a collection; served to clients as 503 with Retry-After"""
+
+    def __init__(self, collection: str, operation: str, reason: str, retry_after: float):
+        self.collection = collection
+        self.operation = operation
+        self.retry_after = retry_after
+        super().__init__(
+            status_code=503,
+            detail=f"Datastore unavailable for {operation} on '{collection}': {reason}",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+        )
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+class OperationPolicy:
+    """How calls of one operation kind are retried and hedged.
+
+    Only idempotent operations (reads, queries, aggregations) should get
+    retries or hedging: a write that timed out may still have been applied.
+    """
+
+    def __init__(self, retries: int = 0, backoff_seconds: float = 0.2, max_backoff_seconds: float = 5.0,
+                 hedge: bool = False, hedge_min_ms: float = 50.0, hedge_min_samples: int = 20):
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.hedge_min_samples = hedge_min_samples
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential delay before retry number attempt (0-based)"""
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+
+
+class LatencyHistogram:
+    """Attempt latencies for one (collection, operation): bucket counts plus recent samples for percentiles"""
+
+    def __init__(self, sample_size: int = 256):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=sample_size)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    def record(self, elapsed_ms: float, error: bool = False):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound), len(LATENCY_BUCKETS_MS))
+        self.buckets[index] += 1
+        self.samples.append(elapsed_ms)
+        self.calls += 1
+        if error:
+            self.errors += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def to_dict(self) -> Dict:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["gt_10000ms"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "rejected": self.rejected,
+            "p50_ms": round(self.percentile(0.5) or 0.0, 2),
+            "p95_ms": round(self.percentile(0.95) or 0.0, 2),
+            "p99_ms": round(self.percentile(0.99) or 0.0, 2),
+            "buckets": dict(zip(labels, self.buckets))
+        }
+
+
+class CircuitBreaker:
+    """Fails calls to a collection fast after repeated transient failures.
+
+    Opens after failure_threshold consecutive failures; after reset_seconds
+    one probe call is let through (half-open), and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.opens = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now - self.opened_at < self.reset_seconds:
+            return False
+        if self.state == "half_open" and now - self.probe_started_at < self.reset_seconds:
+            # A probe is already out (or was abandoned less than reset_seconds ago)
+            return False
+        self.state = "half_open"
+        self.probe_started_at = now
+        return True
+
+    def retry_after(self) -> float:
+        started = self.opened_at if self.state == "open" else self.probe_started_at
+        return max(0.0, self.reset_seconds - (time.monotonic() - started))
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.opens += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "retry_after_seconds": round(self.retry_after(), 1) if self.state != "closed" else 0.0
+        }
+
+
+class ResiliencePolicy:
+    """Retries, hedged reads and circuit breaking around single datastore attempts.
+
+    call() takes a zero-argument function that makes one attempt (e.g. one
+    FirestoreExecutor.run), so the same policy wraps the threaded, async and
+    SQLite backends. Non-transient errors (not found, invalid argument) are
+    raised unchanged; transient ones are retried per the operation's policy
+    and, once retries run out or the collection's circuit is open, raised
+    as DatastoreUnavailableError.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Dict]] = None, failure_threshold: int = 5,
+                 reset_seconds: float = 30.0):
+        self.policies = {operation: OperationPolicy(**options) for operation, options in (policies or {}).items()}
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._default_policy = OperationPolicy()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+    def policy_for(self, operation: str) -> OperationPolicy:
+        return self.policies.get(operation, self._default_policy)
+
+    def _breaker(self, collection: str) -> CircuitBreaker:
+        breaker = self._breakers.get(collection)
+        if breaker is None:
+            breaker = self._breakers.setdefault(collection, CircuitBreaker(self.failure_threshold, self.reset_seconds))
+        return breaker
+
+    def _histogram(self, collection: str, operation: str) -> LatencyHistogram:
+        histogram = self._histograms.get((collection, operation))
+        if histogram is None:
+            histogram = self._histograms.setdefault((collection, operation), LatencyHistogram())
+        return histogram
+
+    async def call(self, collection: str, operation: str, attempt: Callable[[], Awaitable]):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await self._call(collection, operation, attempt)
+            failed = False
+            return result
+        finally:
+            # One entry per logical call in the request's trace, retries and hedges included
+            record_call(collection, operation, (time.perf_counter() - started) * 1000, error=failed)
+
+    async def _call(self, collection: str, operation: str, attempt: Callable[[], Awaitable]):
+        policy = self.policy_for(operation)
+        breaker = self._breaker(collection)
+        histogram = self._histogram(collection, operation)
+        for retry in range(policy.retries + 1):
+            if not breaker.allow():
+                histogram.rejected += 1
+                raise DatastoreUnavailableError(collection, operation, "circuit open", breaker.retry_after())
+            try:
+                if policy.hedge:
+                    result = await self._hedged(policy, histogram, attempt)
+                else:
+                    result = await self._timed(histogram, attempt)
+            except Exception as e:
+                if not is_transient(e):
+                    # The datastore answered; the request itself was bad
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if retry == policy.retries:
+                    raise DatastoreUnavailableError(
+                        collection, operation, str(e) or type(e).__name__, breaker.retry_after()
+                    ) from e
+                histogram.retries += 1
+                await asyncio.sleep(policy.backoff(retry))
+                continue
+            breaker.record_success()
+            return result
+
+    async def _timed(self, histogram: LatencyHistogram, attempt: Callable[[], Awaitable]):
+        started = time.perf_counter()
+        try:
+            result = await attempt()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            histogram.record((time.perf_counter() - started) * 1000, error=True)
+            raise
+        histogram.record((time.perf_counter() - started) * 1000)
+        return result
+
+    async def _hedged(self, policy: OperationPolicy, histogram: LatencyHistogram, attempt: Callable[[], Awaitable]):
+        """Send a duplicate attempt once the first is slower than the p95; the first success wins"""
+        if len(histogram.samples) < policy.hedge_min_samples:
+            return await self._timed(histogram, attempt)
+        delay = max(policy.hedge_min_ms, histogram.percentile(0.95)) / 1000
+        primary = asyncio.ensure_future(self._timed(histogram, attempt))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            histogram.hedges += 1
+            hedge = asyncio.ensure_future(self._timed(histogram, attempt))
+            tasks.add(hedge)
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            histogram.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_metrics(self) -> Dict:
+        return {
+            "breakers": {name: breaker.to_dict() for name, breaker in sorted(self._breakers.items())},
+            "latency": {
+                f"{collection}.{operation}": histogram.to_dict()
+                for (collection, operation), histogram in sorted(self._histograms.items())
+            }
+        }
@@ -0,0 +1,110 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+
+from app.core.config import settings
+from app.services.firebase_service import FirebaseService
+
+logger = logging.getLogger(__name__)
+
+# Stored responses, document ID a hash of the scope and client key; expire via a
+# Firestore TTL policy on expires_at (deletion lags, so get() checks it too)
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+
+
+class IdempotencyStore:
+    """Responses of requests sent with an Idempotency-Key header, kept for a TTL.
+
+    A client retrying a request it never got an answer for sends the same
+    key, and gets the original response back instead of the request running
+    again. Keys are scoped (e.g. "check-in:{farmer_id}:{date}") so one key
+    cannot replay another farmer's or another day's response.
+    """
+
+    def __init__(self, db_service: Optional[FirebaseService] = None, ttl_seconds: Optional[float] = None):
+        self.db_service = db_service or FirebaseService()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.IDEMPOTENCY_KEY_TTL_SECONDS
+
+    @staticmethod
+    def _doc_id(scope: str, key: str) -> str:
+        return hashlib.sha256(f"{scope}\n{key}".encode("utf-8")).hexdigest()
+
+    async def get(self, scope: str, key: str) -> Optional[Dict]:
+        """Stored response for a key, or None if it is new or expired"""
+        try:
+            stored = await self.db_service.get_document(IDEMPOTENCY_COLLECTION, self._doc_id(scope, key))
+        except Exception as e:
+            # Without the store the request still runs; deterministic IDs keep it from duplicating
+            logger.error(f"Error reading idempotency key: {e}")
+            return None
+        return self._live_response(stored)
+
+    async def get_many(self, scoped_keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Stored responses for many (scope, key) pairs in one batched read.
+
+        Unlike get(), responses still queued behind are not seen; callers
+        need their own guard against repeats, as deterministic IDs give.
+        """
+        doc_ids = {self._doc_id(scope, key): (scope, key) for scope, key in scoped_keys}
+        try:
+            stored = await self.db_service.get_documents(IDEMPOTENCY_COLLECTION, list(doc_ids))
+        except Exception as e:
+            logger.error(f"Error reading idempotency keys: {e}")
+            return {}
+        responses = {}
+        for doc_id, document in stored.items():
+            response = self._live_response(document)
+            if response is not None:
+                responses[doc_ids[doc_id]] = response
+        return responses
+
+    @staticmethod
+    def _live_response(stored: Optional[Dict]) -> Optional[Dict]:
+        if not stored or stored.get("expires_at") is None:
+            return None
+        expires_at = stored["expires_at"]
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= datetime.now(timezone.utc):
+            return None
+        return stored.get("response")
+
+    async def save(self, scope: str, key: str, response: Dict):
+        """Remember a response for the key's TTL.
+
+        Written behind, so the response is not held up by it; get_document
+        sees the write at once, and failures are logged, not raised.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db_service.save_document(IDEMPOTENCY_COLLECTION, self._doc_id(scope, key), {
+                "scope": scope,
+                "response": response,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl_seconds)
+            }, write_behind=True)
+        except Exception as e:
+            logger.error(f"Error saving idempotency key: {e}")
+
+    async def save_many(self, responses: Dict[Tuple[str, str], Dict]):
+        """Remember responses for many (scope, key) pairs with batched writes; failures are logged"""
+        now = datetime.now(timezone.utc)
+        documents = {
+            self._doc_id(scope, key): {
+                "scope": scope,
+                "response": response,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl_seconds)
+            }
+            for (scope, key), response in responses.items()
+        }
+        try:
+            result = await self.db_service.save_documents_bulk(IDEMPOTENCY_COLLECTION, documents)
+            if result["failed"]:
+                logger.error(f"Error saving {len(result['failed'])} idempotency keys")
+        except Exception as e:
+            logger.error(f"Error saving idempotency keys: {e}")
+
@@ -0,0 +1,95 @@
+from typing import Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import threading
+
+
+class Journal:
+    """JSON-lines file made durable in groups, with the disk I/O on worker threads.
+
+    append() buffers a record and returns its position; sync(position)
+    waits until the record is fsynced. Records buffered by concurrent
+    callers are written by one worker thread with one fsync, so the event
+    loop never blocks on the disk and a burst of writes shares the cost.
+
+    lock is the owner's state lock: append() must be called holding it,
+    which keeps the journal order the same as the owner's, and rewrite()
+    calls its snapshot function holding it.
+    """
+
+    def __init__(self, path: str, lock: threading.Lock, encode: Optional[Callable] = None):
+        self.path = path
+        self._lock = lock
+        self._encode = encode
+        # Serializes writers of the file: flushes from worker threads and rewrites
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._buffer: List[str] = []
+        self._appended = 0
+        self._synced = 0
+        self._sync_task: Optional[asyncio.Future] = None
+        # Records in the file, for deciding when to rewrite it
+        self.records = 0
+
+    def append(self, record: Dict) -> int:
+        """Buffer a record; call holding the lock. Raises TypeError if it cannot be encoded"""
+        self._buffer.append(json.dumps(record, default=self._encode) + "\n")
+        self._appended += 1
+        return self._appended
+
+    async def sync(self, position: int):
+        """Wait until the records appended up to position are on disk"""
+        loop = asyncio.get_running_loop()
+        while self._synced < position:
+            task = self._sync_task
+            if task is None or task.done() or task.get_loop() is not loop:
+                task = self._sync_task = loop.create_task(asyncio.to_thread(self.flush))
+            # Shielded, so a cancelled waiter does not cancel the write others wait on
+            await asyncio.shield(task)
+
+    def flush(self):
+        """Write and fsync the buffered records; blocks, so run it on a worker thread"""
+        with self._file_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                position = self._appended
+            if lines:
+                self._file.write("".join(lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.records += len(lines)
+            self._synced = max(self._synced, position)
+
+    def rewrite(self, snapshot: Callable[[], List[Dict]]):
+        """Replace the file with the records snapshot() returns; blocks, like flush().
+
+        Buffered records are dropped: the snapshot, taken at the same time,
+        stands for everything still needed.
+        """
+        with self._file_lock:
+            with self._lock:
+                records = snapshot()
+                self._buffer = []
+                position = self._appended
+            if self._file is not None:
+                self._file.close()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=self._encode) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self.records = len(records)
+            self._synced = max(self._synced, position)
+
+    def close(self):
+        """Write what is buffered and close the file"""
+        if self._file is None:
+            return
+        self.flush()
+        with self._file_lock:
+            self._file.close()
+            self._file = None
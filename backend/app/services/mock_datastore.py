@@ -0,0 +1,300 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from datetime import date, datetime
+from bisect import bisect_left, bisect_right
+from app.services.firestore_filters import FILTER_OPERATORS, matches_filters, order_documents, project_document
+
+_RANGE_OPS = ("<", "<=", ">", ">=")
+# Pending index changes applied one by one; more than this triggers a re-sort
+_INCREMENTAL_MERGE_LIMIT = 64
+
+
+def _type_key(value) -> Optional[str]:
+    """Values are only range-compared with values of the same kind"""
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    return None
+
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class SortedIndex:
+    """Sorted (value, doc_id) pairs for range lookups on one field.
+
+    Inserts and removals are buffered and merged on the next lookup, so bulk
+    loads cost one sort instead of a list shift per document.
+    """
+
+    def __init__(self):
+        self._keys: List[tuple] = []
+        self._values: List = []
+        self._added: Set[tuple] = set()
+        self._removed: Set[tuple] = set()
+
+    def add(self, value, doc_id: str):
+        key = (value, doc_id)
+        if key in self._removed:
+            self._removed.discard(key)
+        else:
+            self._added.add(key)
+
+    def remove(self, value, doc_id: str):
+        key = (value, doc_id)
+        if key in self._added:
+            self._added.discard(key)
+        else:
+            self._removed.add(key)
+
+    def _merge(self):
+        if not self._added and not self._removed:
+            return
+        if len(self._added) + len(self._removed) <= _INCREMENTAL_MERGE_LIMIT:
+            # A few changes since the last lookup: patch the sorted lists in place
+            for key in self._removed:
+                i = bisect_left(self._keys, key)
+                if i < len(self._keys) and self._keys[i] == key:
+                    del self._keys[i]
+                    del self._values[i]
+            for key in self._added:
+                i = bisect_left(self._keys, key)
+                self._keys.insert(i, key)
+                self._values.insert(i, key[0])
+            self._added = set()
+            self._removed = set()
+            return
+        keys = [key for key in self._keys if key not in self._removed] if self._removed else self._keys
+        keys.extend(self._added)
+        keys.sort()
+        self._keys = keys
+        self._values = [value for value, _ in keys]
+        self._added = set()
+        self._removed = set()
+
+    def bounds(self, conditions: List[tuple]) -> Tuple[int, int]:
+        """Slice of the index satisfying every (op, value) range condition"""
+        self._merge()
+        start, end = 0, len(self._keys)
+        for op, value in conditions:
+            if op == ">":
+                start = max(start, bisect_right(self._values, value))
+            elif op == ">=":
+                start = max(start, bisect_left(self._values, value))
+            elif op == "<":
+                end = min(end, bisect_left(self._values, value))
+            else:
+                end = min(end, bisect_right(self._values, value))
+        return start, max(start, end)
+
+    def ids(self, start: int, end: int) -> Set[str]:
+        return {doc_id for _, doc_id in self._keys[start:end]}
+
+
+class MockCollection(dict):
+    """A mock collection ({doc_id: document}) with secondary indexes.
+
+    Hash indexes answer == and in filters; sorted indexes answer range
+    filters. Indexes are updated on every assignment and deletion, so
+    documents must be changed through the collection (item assignment or
+    patch), not mutated in place.
+    """
+
+    def __init__(self, data: Optional[Dict] = None, hash_fields: Iterable[str] = (), sorted_fields: Iterable[str] = ()):
+        super().__init__()
+        self.hash_fields = list(hash_fields)
+        self.sorted_fields = list(sorted_fields)
+        self._reset_indexes()
+        if data:
+            self.update(data)
+
+    def _reset_indexes(self):
+        self._hash: Dict[str, Dict] = {field: {} for field in self.hash_fields}
+        self._sorted: Dict[str, Dict[str, SortedIndex]] = {field: {} for field in self.sorted_fields}
+        # Values each document was indexed under, so removal works even if it was mutated since
+        self._indexed: Dict[str, Dict] = {}
+        # Insertion order, so query results keep the order of a plain dict scan
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+
+    def _index(self, doc_id: str, doc: Dict):
+        indexed = {}
+        for field in self.hash_fields:
+            value = doc.get(field)
+            if _hashable(value):
+                self._hash[field].setdefault(value, set()).add(doc_id)
+                indexed[("hash", field)] = value
+        for field in self.sorted_fields:
+            value = doc.get(field)
+            kind = _type_key(value)
+            if kind is not None:
+                index = self._sorted[field].get(kind)
+                if index is None:
+                    index = self._sorted[field][kind] = SortedIndex()
+                index.add(value, doc_id)
+                indexed[("sorted", field)] = value
+        self._indexed[doc_id] = indexed
+
+    def _unindex(self, doc_id: str):
+        for (index_type, field), value in self._indexed.pop(doc_id, {}).items():
+            if index_type == "hash":
+                bucket = self._hash[field].get(value)
+                if bucket is not None:
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self._hash[field][value]
+            else:
+                self._sorted[field][_type_key(value)].remove(value, doc_id)
+
+    def __setitem__(self, doc_id: str, doc: Dict):
+        if doc_id in self:
+            self._unindex(doc_id)
+        else:
+            self._order[doc_id] = self._next_order
+            self._next_order += 1
+        super().__setitem__(doc_id, doc)
+        self._index(doc_id, doc)
+
+    def __delitem__(self, doc_id: str):
+        super().__delitem__(doc_id)
+        self._unindex(doc_id)
+        del self._order[doc_id]
+
+    def pop(self, doc_id: str, *default):
+        if doc_id in self:
+            doc = self[doc_id]
+            del self[doc_id]
+            return doc
+        if default:
+            return default[0]
+        raise KeyError(doc_id)
+
+    def popitem(self):
+        doc_id = next(reversed(self))
+        return doc_id, self.pop(doc_id)
+
+    def setdefault(self, doc_id: str, default: Optional[Dict] = None):
+        if doc_id not in self:
+            self[doc_id] = default
+        return self[doc_id]
+
+    def update(self, *args, **kwargs):
+        for doc_id, doc in dict(*args, **kwargs).items():
+            self[doc_id] = doc
+
+    def clear(self):
+        super().clear()
+        self._reset_indexes()
+
+    def patch(self, doc_id: str, data: Dict) -> Dict:
+        """Merge fields into an existing document, keeping indexes current"""
+        doc = self[doc_id]
+        self._unindex(doc_id)
+        doc.update(data)
+        self._index(doc_id, doc)
+        return doc
+
+    def _candidates(self, filters: List[tuple]) -> Optional[Set[str]]:
+        """Document IDs the indexes say may match, or None if no index applies"""
+        # (size, ids) for hash lookups, (size, (index, start, end)) for range slices
+        sources = []
+        ranges: Dict[tuple, List[tuple]] = {}
+        for field, op, value in filters:
+            if field in self._hash and op == "==" and _hashable(value):
+                bucket = self._hash[field].get(value, set())
+                sources.append((len(bucket), bucket))
+            elif field in self._hash and op == "in" and all(_hashable(v) for v in value):
+                ids = set().union(*(self._hash[field].get(v, set()) for v in value))
+                sources.append((len(ids), ids))
+            elif field in self._sorted and op in _RANGE_OPS and _type_key(value) is not None:
+                ranges.setdefault((field, _type_key(value)), []).append((op, value))
+
+        for (field, kind), conditions in ranges.items():
+            index = self._sorted[field].get(kind)
+            if index is None:
+                return set()
+            start, end = index.bounds(conditions)
+            sources.append((end - start, (index, start, end)))
+
+        if not sources:
+            return None
+        sources.sort(key=lambda source: source[0])
+        candidates = None
+        for size, ids in sources:
+            if isinstance(ids, tuple):
+                if candidates is not None:
+                    # Cheaper to check the remaining range on the candidates themselves
+                    continue
+                index, start, end = ids
+                ids = index.ids(start, end)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        return candidates
+
+    def query(self, filters: Optional[List[tuple]] = None, order_by=None, start_after: Optional[Dict] = None,
+              limit: Optional[int] = None, select: Optional[List[str]] = None) -> List[Dict]:
+        """Documents matching all filters, in insertion order unless order_by is given.
+
+        With select, each result is a copy holding only those fields and the ID.
+        """
+        filters = filters or []
+        for _, op, _ in filters:
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported filter operator: {op}")
+
+        candidates = self._candidates(filters)
+        if candidates is None:
+            doc_ids = self.keys()
+        else:
+            doc_ids = sorted(candidates, key=self._order.__getitem__)
+        # Indexes narrow the candidates; every filter is still checked on the document
+        if not (order_by or start_after or limit is not None or select is not None):
+            return [self[doc_id] for doc_id in doc_ids if matches_filters(self[doc_id], filters)]
+        # Ordered and projected queries return the document ID with each document, as Firestore does
+        results = [
+            doc if doc.get("id") == doc_id else {**doc, "id": doc_id}
+            for doc_id, doc in ((doc_id, self[doc_id]) for doc_id in doc_ids)
+            if matches_filters(doc, filters)
+        ]
+        results = order_documents(results, order_by, start_after, limit)
+        return [project_document(doc, select) for doc in results] if select is not None else results
+
+
+class MockDataStore(dict):
+    """Collection name -> MockCollection, with indexes declared per collection.
+
+    Assigning a plain dict to a collection wraps it in an indexed
+    MockCollection, so existing code that replaces a whole collection keeps
+    working.
+    """
+
+    def __init__(self, collections: Optional[Dict[str, Dict]] = None, indexes: Optional[Dict[str, Dict]] = None):
+        super().__init__()
+        self.indexes = indexes or {}
+        for name, docs in (collections or {}).items():
+            self[name] = docs
+
+    def _wrap(self, name: str, docs: Optional[Dict]) -> MockCollection:
+        if isinstance(docs, MockCollection):
+            return docs
+        return MockCollection(docs, **self.indexes.get(name, {}))
+
+    def __setitem__(self, name: str, docs: Dict):
+        super().__setitem__(name, self._wrap(name, docs))
+
+    def setdefault(self, name: str, default: Optional[Dict] = None) -> MockCollection:
+        if name not in self:
+            self[name] = default
+        return self[name]
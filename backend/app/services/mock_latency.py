@@ -0,0 +1,71 @@
+from typing import Dict, Optional
+import asyncio
+import math
+import random
+
+
+class InjectedDatastoreError(ConnectionError):
+    """A failure injected in mock mode; transient, so it is retried like a dropped connection"""
+
+
+class LatencyDistribution:
+    """Log-normal round-trip time given its median and p95, plus a failure rate"""
+
+    def __init__(self, median_ms: float = 50.0, p95_ms: Optional[float] = None, failure_rate: float = 0.0):
+        self.median_ms = median_ms
+        self.p95_ms = p95_ms if p95_ms is not None else median_ms * 2
+        self.failure_rate = failure_rate
+        # 1.645 is the standard normal z-score of the 95th percentile
+        self.sigma = math.log(max(self.p95_ms, median_ms) / median_ms) / 1.645 if median_ms > 0 else 0.0
+
+    def sample_ms(self, rng: random.Random) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms * math.exp(rng.gauss(0.0, self.sigma))
+
+
+class LatencyInjector:
+    """Simulated datastore round trips for the mock FirebaseService.
+
+    Mock calls take microseconds, which hides N+1 query patterns that cost
+    50-150 ms per call against Firestore. profile maps an operation (read,
+    query, aggregate, write, delete) or a "collection.operation" override
+    to LatencyDistribution options; "default" covers operations not listed.
+    A seed makes runs repeatable.
+    """
+
+    def __init__(self, profile: Dict[str, Dict], seed: Optional[int] = None):
+        self.distributions = {name: LatencyDistribution(**options) for name, options in profile.items()}
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.injected_ms = 0.0
+
+    def distribution_for(self, collection: str, operation: str) -> Optional[LatencyDistribution]:
+        return (self.distributions.get(f"{collection}.{operation}")
+                or self.distributions.get(operation)
+                or self.distributions.get("default"))
+
+    async def round_trip(self, collection: str, operation: str):
+        """Wait one sampled round trip, then fail at the configured rate"""
+        distribution = self.distribution_for(collection, operation)
+        if distribution is None:
+            return
+        delay_ms = distribution.sample_ms(self._rng)
+        self.calls += 1
+        self.injected_ms += delay_ms
+        await asyncio.sleep(delay_ms / 1000)
+        if distribution.failure_rate and self._rng.random() < distribution.failure_rate:
+            self.failures += 1
+            raise InjectedDatastoreError(f"Injected {operation} failure on '{collection}'")
+
+    def get_metrics(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "injected_ms": round(self.injected_ms, 1),
+            "profile": {
+                name: {"median_ms": d.median_ms, "p95_ms": d.p95_ms, "failure_rate": d.failure_rate}
+                for name, d in sorted(self.distributions.items())
+            }
+        }
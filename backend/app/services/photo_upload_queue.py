@@ -0,0 +1,238 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import threading
+import time
+from app.services.journal import Journal
+
+
+class PhotoUpload:
+    """A photo saved locally that still has to reach Storage and be linked from its document"""
+
+    def __init__(self, seq: int, local_path: str, storage_path: str, content_type: str, collection: str,
+                 doc_id: str, field: str, enqueued_at: Optional[float] = None):
+        self.seq = seq
+        self.local_path = local_path
+        self.storage_path = storage_path
+        self.content_type = content_type
+        self.collection = collection
+        self.doc_id = doc_id
+        self.field = field
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.time()
+        self.attempts = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+
+    def to_record(self) -> Dict:
+        return {"s": self.seq, "l": self.local_path, "p": self.storage_path, "ct": self.content_type,
+                "c": self.collection, "i": self.doc_id, "f": self.field, "t": self.enqueued_at}
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "PhotoUpload":
+        return cls(record["s"], record["l"], record["p"], record["ct"], record["c"], record["i"], record["f"], record["t"])
+
+
+class PhotoUploadQueue:
+    """Uploads locally saved photos to Storage in the background, then patches the final URL in.
+
+    Requests save the photo to disk, store the local path in the document
+    and enqueue the upload, so they never wait on the uplink. The queue is a
+    JSON-lines journal (fsynced on every change, in groups and off the event
+    loop) replayed on start, so uploads survive restarts. Failed uploads are
+    retried with exponential backoff; after max_attempts they are written to
+    a dead-letter file next to the journal and the document keeps its local
+    URL.
+
+    upload(storage_path, local_path, content_type) returns the public URL;
+    patch(collection, doc_id, {field: url}) returns False if the document no
+    longer exists, in which case the upload is dropped.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        upload: Callable[[str, str, str], Awaitable[str]],
+        patch: Callable[[str, str, Dict], Awaitable[bool]],
+        poll_interval: float = 2.0,
+        max_attempts: int = 20,
+        backoff_seconds: float = 5.0,
+        max_backoff_seconds: float = 900.0,
+        max_concurrency: int = 4
+    ):
+        self.journal_path = journal_path
+        self.dead_letter_path = journal_path + ".failed"
+        self.upload = upload
+        self.patch = patch
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._queue: Dict[int, PhotoUpload] = {}
+        self._seq = 0
+        self._journal = Journal(journal_path, self._lock)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.enqueued = 0
+        self.uploaded = 0
+        self.failures = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self.replayed = 0
+        self.last_upload_age_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._replay()
+
+    def _replay(self):
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        continue
+                    if "a" in record:
+                        self._queue.pop(record["a"], None)
+                        continue
+                    upload = PhotoUpload.from_record(record)
+                    self._queue[upload.seq] = upload
+                    self._seq = max(self._seq, upload.seq)
+            self.replayed = len(self._queue)
+            if self.replayed:
+                print(f"Photo upload queue replayed {self.replayed} pending uploads")
+        self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with only the uploads still queued; blocks on the disk"""
+        self._journal.rewrite(lambda: [upload.to_record() for upload in self._queue.values()])
+
+    async def enqueue(self, local_path: str, storage_path: str, collection: str, doc_id: str, field: str,
+                      content_type: str = "image/jpeg"):
+        """Journal an upload and wake the worker; returns once the journal is on disk"""
+        with self._lock:
+            self._seq += 1
+            upload = PhotoUpload(self._seq, local_path, storage_path, content_type, collection, doc_id, field)
+            position = self._journal.append(upload.to_record())
+            self._queue[upload.seq] = upload
+            self.enqueued += 1
+        self.start()
+        await self._journal.sync(position)
+
+    def start(self):
+        """Start (or restart on a new event loop) the background worker"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run_worker())
+        self._wake.set()
+
+    async def stop(self):
+        """Stop the worker; uploads not yet finished stay journaled for the next start"""
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._journal.close()
+
+    async def _run_worker(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.process_due():
+                    pass
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Photo upload worker failed: {e}")
+
+    async def process_due(self) -> int:
+        """Upload up to max_concurrency photos that are due; returns how many were attempted"""
+        now = time.monotonic()
+        with self._lock:
+            due = [upload for upload in self._queue.values() if upload.retry_at <= now][:self.max_concurrency]
+        if due:
+            await asyncio.gather(*[self._process(upload) for upload in due])
+        return len(due)
+
+    async def _process(self, upload: PhotoUpload):
+        if not os.path.exists(upload.local_path):
+            print(f"Photo upload dropped, local file is gone: {upload.local_path}")
+            await self._finish(upload, dropped=True)
+            return
+        try:
+            url = await self.upload(upload.storage_path, upload.local_path, upload.content_type)
+            if not await self.patch(upload.collection, upload.doc_id, {upload.field: url}):
+                print(f"Photo upload dropped, {upload.collection}/{upload.doc_id} no longer exists")
+                await self._finish(upload, dropped=True)
+                return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._retry(upload, e)
+            return
+        await self._finish(upload)
+
+    async def _finish(self, upload: PhotoUpload, dropped: bool = False):
+        with self._lock:
+            self._queue.pop(upload.seq, None)
+            if dropped:
+                self.dropped += 1
+            else:
+                self.uploaded += 1
+                self.last_upload_age_seconds = time.time() - upload.enqueued_at
+            position = self._journal.append({"a": upload.seq}) if self._queue else None
+        if position is None:
+            await asyncio.to_thread(self._compact)
+        else:
+            await self._journal.sync(position)
+
+    async def _retry(self, upload: PhotoUpload, error: Exception):
+        with self._lock:
+            upload.attempts += 1
+            upload.last_error = self.last_error = str(error)
+            self.failures += 1
+            if upload.attempts < self.max_attempts:
+                upload.retry_at = time.monotonic() + min(
+                    self.backoff_seconds * 2 ** (upload.attempts - 1), self.max_backoff_seconds
+                )
+                return
+            print(f"Giving up on photo upload {upload.storage_path} after {upload.attempts} attempts: {error}")
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({**upload.to_record(), "error": upload.last_error}) + "\n")
+            self.dead_lettered += 1
+            self._queue.pop(upload.seq, None)
+            position = self._journal.append({"a": upload.seq})
+        await self._journal.sync(position)
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            uploads: List[PhotoUpload] = list(self._queue.values())
+        oldest = min((upload.enqueued_at for upload in uploads), default=None)
+        return {
+            "depth": len(uploads),
+            "retrying": sum(1 for upload in uploads if upload.attempts),
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            "enqueued": self.enqueued,
+            "uploaded": self.uploaded,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "dead_lettered": self.dead_lettered,
+            "replayed": self.replayed,
+            "last_upload_age_seconds": round(self.last_upload_age_seconds, 3)
+            if self.last_upload_age_seconds is not None else None,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,605 @@
+"""Embedded SQLite document store with the Firestore client surface FirebaseService uses.
+
+Documents live in one table as JSON, keyed by (collection, id). Commonly
+filtered fields are exposed as generated columns with an index each, so
+where() filters on them are answered from the index; other fields are read
+with json_extract(). Connections come from a small pool and the database
+runs in WAL mode, so readers never block the single writer.
+"""
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import base64
+import json
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import string
+import threading
+
+try:
+    from google.api_core.exceptions import AlreadyExists, NotFound
+except ImportError:
+    class NotFound(Exception):
+        """Raised when updating a document that does not exist"""
+
+    class AlreadyExists(Exception):
+        """Raised when creating a document that already exists"""
+
+# Tagged strings for values JSON cannot hold. The \x01 prefix keeps them
+# apart from ordinary strings in comparisons, and the fixed-width UTC
+# timestamp sorts chronologically.
+_DATETIME_TAG = "\x01dt:"
+_BYTES_TAG = "\x01b64:"
+_AUTO_ID_ALPHABET = string.ascii_letters + string.digits
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_RANGE_OPS = ("<", "<=", ">", ">=")
+
+DESCENDING = "DESCENDING"
+ASCENDING = "ASCENDING"
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            # Like the Firestore SDK, naive datetimes are taken as UTC
+            value = value.replace(tzinfo=timezone.utc)
+        return _DATETIME_TAG + value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    if isinstance(value, bytes):
+        return _BYTES_TAG + base64.b64encode(value).decode("ascii")
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, str):
+        if value.startswith(_DATETIME_TAG):
+            return datetime.strptime(value[len(_DATETIME_TAG):], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+        if value.startswith(_BYTES_TAG):
+            return base64.b64decode(value[len(_BYTES_TAG):])
+        return value
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def _dumps(data: Dict) -> str:
+    return json.dumps(_encode(data), separators=(",", ":"))
+
+
+def _loads(text: str) -> Dict:
+    return _decode(json.loads(text))
+
+
+def _json_path(field: str) -> str:
+    """Firestore field path ("a.b" is nested) -> SQLite JSON path, quoted for SQL"""
+    path = "$" + "".join('."{}"'.format(part.replace('"', '\\"')) for part in field.split("."))
+    return "'" + path.replace("'", "''") + "'"
+
+
+def _set_path(data: Dict, field: str, value):
+    """Apply an update() key, where dots address nested maps"""
+    parts = field.split(".")
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+
+def _select_columns(fields: List[str]) -> str:
+    """Columns holding the JSON of each selected field, NULL where it is missing"""
+    return ", ".join(f"data -> {_json_path(field)}" for field in fields) or "NULL"
+
+
+def _projected(values, fields: List[str]) -> Dict:
+    data: Dict = {}
+    for field, value in zip(fields, values):
+        if value is not None:
+            _set_path(data, field, _decode(json.loads(value)))
+    return data
+
+
+def _auto_id() -> str:
+    return "".join(secrets.choice(_AUTO_ID_ALPHABET) for _ in range(20))
+
+
+class SQLiteDocumentSnapshot:
+    def __init__(self, reference: "SQLiteDocumentReference", data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field: str):
+        value = self._data
+        for part in field.split("."):
+            value = value[part]
+        return value
+
+
+class SQLiteDocumentReference:
+    def __init__(self, client: "SQLiteClient", collection: str, doc_id: str):
+        self._client = client
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self, field_paths: Optional[List[str]] = None) -> SQLiteDocumentSnapshot:
+        columns = "data" if field_paths is None else _select_columns(field_paths)
+        with self._client.connection() as conn:
+            row = conn.execute(
+                f"SELECT 1, {columns} FROM documents WHERE collection = ? AND id = ?", (self.collection, self.id)
+            ).fetchone()
+        if row is None:
+            return SQLiteDocumentSnapshot(self, None)
+        return SQLiteDocumentSnapshot(self, _loads(row[1]) if field_paths is None else _projected(row[1:], field_paths))
+
+    def set(self, data: Dict, merge: bool = False):
+        with self._client.transaction() as conn:
+            self._client._apply(conn, self, "set_merge" if merge else "set", data)
+
+    def update(self, data: Dict):
+        with self._client.transaction() as conn:
+            self._client._apply(conn, self, "update", data)
+
+    def delete(self):
+        with self._client.transaction() as conn:
+            self._client._apply(conn, self, "delete", None)
+
+
+class SQLiteQuery:
+    def __init__(self, client: "SQLiteClient", collection: str, filters=(), orders=(), limit_count: Optional[int] = None,
+                 cursor: Optional[Dict] = None, fields: Optional[List[str]] = None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes) -> "SQLiteQuery":
+        query = SQLiteQuery(
+            self._client, self._collection, self._filters, self._orders, self._limit, self._cursor, self._fields
+        )
+        for name, value in changes.items():
+            setattr(query, name, value)
+        return query
+
+    def where(self, field: str, op: str, value) -> "SQLiteQuery":
+        return self._copy(_filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field: str, direction: str = ASCENDING) -> "SQLiteQuery":
+        return self._copy(_orders=self._orders + [(field, direction)])
+
+    def limit(self, count: int) -> "SQLiteQuery":
+        return self._copy(_limit=count)
+
+    def select(self, field_paths: Iterable[str]) -> "SQLiteQuery":
+        """Return only these fields; they are extracted in SQL, so other fields are never decoded"""
+        return self._copy(_fields=list(field_paths))
+
+    def start_after(self, document_fields) -> "SQLiteQuery":
+        """Resume after a {field: value} cursor over the ordered fields, or after a snapshot"""
+        if isinstance(document_fields, SQLiteDocumentSnapshot):
+            snapshot = document_fields
+            document_fields = {
+                field: snapshot.id if field == "__name__" else snapshot.get(field)
+                for field, _ in self._orders
+            }
+            document_fields.setdefault("__name__", snapshot.id)
+        return self._copy(_cursor=dict(document_fields))
+
+    def _cursor_condition(self, orders: List[tuple]):
+        """Keyset condition: (a > ?) OR (a = ? AND b > ?) OR ... over the ordered columns"""
+        clauses = []
+        params: List = []
+        equal_terms: List[str] = []
+        equal_params: List = []
+        for field, direction in orders:
+            if field not in self._cursor:
+                break
+            value = self._cursor[field]
+            if field == "__name__" and not isinstance(value, str):
+                value = value.id
+            column = self._client._column(field)
+            op = "<" if direction == DESCENDING else ">"
+            clauses.append(" AND ".join(equal_terms + [f"{column} {op} ?"]))
+            params.extend(equal_params + [_encode(value)])
+            equal_terms.append(f"{column} = ?")
+            equal_params.append(_encode(value))
+        if not clauses:
+            return None, []
+        return "(" + " OR ".join(f"({clause})" for clause in clauses) + ")", params
+
+    def _sql(self):
+        conditions = ["collection = ?"]
+        params: List = [self._collection]
+        for field, op, value in self._filters:
+            condition, condition_params = self._client._condition(field, op, value)
+            conditions.append(condition)
+            params.extend(condition_params)
+        orders = list(self._orders)
+        if not any(field == "__name__" for field, _ in orders):
+            # Ties are broken by document ID, as in Firestore
+            orders.append(("__name__", orders[-1][1] if orders else ASCENDING))
+        order_terms = []
+        for field, direction in orders:
+            column = self._client._column(field)
+            if field != "__name__":
+                # Firestore leaves out documents that lack an ordered field; explicit nulls are kept
+                # (json_type is 'null' for them) and sort first, as SQL NULLs do
+                conditions.append(f"json_type(data, {_json_path(field)}) IS NOT NULL")
+            order_terms.append(f"{column} {'DESC' if direction == DESCENDING else 'ASC'}")
+        if self._cursor:
+            condition, condition_params = self._cursor_condition(orders)
+            if condition:
+                conditions.append(condition)
+                params.extend(condition_params)
+        columns = "data" if self._fields is None else _select_columns(self._fields)
+        sql = f"SELECT id, {columns} FROM documents WHERE {' AND '.join(conditions)} ORDER BY {', '.join(order_terms)}"
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+        return sql, params
+
+    def get(self) -> List[SQLiteDocumentSnapshot]:
+        sql, params = self._sql()
+        with self._client.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [
+            SQLiteDocumentSnapshot(
+                SQLiteDocumentReference(self._client, self._collection, row[0]),
+                _loads(row[1]) if self._fields is None else _projected(row[1:], self._fields)
+            )
+            for row in rows
+        ]
+
+    def stream(self) -> Iterator[SQLiteDocumentSnapshot]:
+        return iter(self.get())
+
+    def count(self, alias: Optional[str] = None) -> "SQLiteAggregationQuery":
+        return SQLiteAggregationQuery(self).count(alias)
+
+    def sum(self, field: str, alias: Optional[str] = None) -> "SQLiteAggregationQuery":
+        return SQLiteAggregationQuery(self).sum(field, alias)
+
+    def avg(self, field: str, alias: Optional[str] = None) -> "SQLiteAggregationQuery":
+        return SQLiteAggregationQuery(self).avg(field, alias)
+
+
+class SQLiteAggregationResult:
+    def __init__(self, alias: str, value):
+        self.alias = alias
+        self.value = value
+
+
+class SQLiteAggregationQuery:
+    """count/sum/avg computed in SQL over a query's matching documents"""
+
+    def __init__(self, query: SQLiteQuery):
+        self._query = query
+        self._aggregations: List[tuple] = []
+
+    def _add(self, kind: str, field: Optional[str], alias: Optional[str]) -> "SQLiteAggregationQuery":
+        self._aggregations.append((kind, field, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias: Optional[str] = None) -> "SQLiteAggregationQuery":
+        return self._add("count", None, alias)
+
+    def sum(self, field: str, alias: Optional[str] = None) -> "SQLiteAggregationQuery":
+        return self._add("sum", field, alias)
+
+    def avg(self, field: str, alias: Optional[str] = None) -> "SQLiteAggregationQuery":
+        return self._add("avg", field, alias)
+
+    def get(self) -> List[List[SQLiteAggregationResult]]:
+        terms = []
+        for kind, field, _ in self._aggregations:
+            if kind == "count":
+                terms.append("COUNT(*)")
+                continue
+            # Like Firestore, only numeric values are summed or averaged
+            value = f"json_extract(data, {_json_path(field)})"
+            numeric = f"CASE WHEN typeof({value}) IN ('integer', 'real') THEN {value} END"
+            terms.append(f"SUM({numeric})" if kind == "sum" else f"AVG({numeric})")
+        inner_sql, params = self._query._copy(_fields=None)._sql()
+        with self._query._client.connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(terms)} FROM ({inner_sql})", params).fetchone()
+        results = []
+        for (kind, _, alias), value in zip(self._aggregations, row):
+            if kind == "sum" and value is None:
+                value = 0
+            results.append(SQLiteAggregationResult(alias, value))
+        return [results]
+
+
+class SQLiteCollectionReference(SQLiteQuery):
+    def __init__(self, client: "SQLiteClient", collection: str):
+        super().__init__(client, collection)
+        self.id = collection
+
+    def document(self, doc_id: Optional[str] = None) -> SQLiteDocumentReference:
+        return SQLiteDocumentReference(self._client, self._collection, doc_id or _auto_id())
+
+
+class SQLiteWriteBatch:
+    """Writes applied atomically in one transaction on commit()"""
+
+    def __init__(self, client: "SQLiteClient"):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference: SQLiteDocumentReference, data: Dict, merge: bool = False):
+        self._writes.append((reference, "set_merge" if merge else "set", data))
+
+    def create(self, reference: SQLiteDocumentReference, data: Dict):
+        self._writes.append((reference, "create", data))
+
+    def update(self, reference: SQLiteDocumentReference, data: Dict):
+        self._writes.append((reference, "update", data))
+
+    def delete(self, reference: SQLiteDocumentReference):
+        self._writes.append((reference, "delete", None))
+
+    def commit(self):
+        with self._client.transaction() as conn:
+            for reference, kind, data in self._writes:
+                self._client._apply(conn, reference, kind, data)
+        self._writes = []
+
+
+class SQLiteClient:
+    """Firestore-style client over a SQLite database file"""
+
+    def __init__(self, path: str, pool_size: int = 4, indexed_fields: Iterable[str] = ()):
+        self.path = path
+        self.pool_size = pool_size
+        self.indexed_fields = [field for field in indexed_fields if _FIELD_NAME.match(field)]
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as conn:
+            self._create_schema(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+            "UNIQUE (collection, id))"
+        )
+        existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(documents)")}
+        for field in self.indexed_fields:
+            column = f"f_{field}"
+            if column not in existing:
+                conn.execute(
+                    f"ALTER TABLE documents ADD COLUMN {column} "
+                    f"GENERATED ALWAYS AS (json_extract(data, {_json_path(field)})) VIRTUAL"
+                )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_documents_{field} ON documents (collection, {column})")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as conn:
+            # Take the write lock up front so read-modify-write updates cannot interleave
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _column(self, field: str) -> str:
+        if field in self.indexed_fields:
+            return f"f_{field}"
+        if field == "__name__":
+            return "id"
+        return f"json_extract(data, {_json_path(field)})"
+
+    def _condition(self, field: str, op: str, value):
+        """SQL for one where() filter, with the same type rules as Firestore"""
+        column = self._column(field)
+        if op == "==":
+            if value is None:
+                return f"{column} IS NULL", []
+            return f"{column} = ?", [_encode(value)]
+        if op == "!=":
+            if value is None:
+                return f"{column} IS NOT NULL", []
+            return f"{column} IS NOT NULL AND {column} != ?", [_encode(value)]
+        if op in ("in", "not-in"):
+            values = [_encode(item) for item in value]
+            placeholders = ", ".join("?" for _ in values) or "NULL"
+            if op == "in":
+                return f"{column} IN ({placeholders})", values
+            return f"{column} IS NOT NULL AND {column} NOT IN ({placeholders})", values
+        if op in ("array-contains", "array-contains-any"):
+            values = [_encode(value)] if op == "array-contains" else [_encode(item) for item in value]
+            placeholders = ", ".join("?" for _ in values) or "NULL"
+            return (
+                f"EXISTS (SELECT 1 FROM json_each(data, {_json_path(field)}) WHERE value IN ({placeholders}))",
+                values
+            )
+        if op in _RANGE_OPS:
+            # Range filters only match values of the same type
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                type_check = f"typeof({column}) IN ('integer', 'real')"
+            elif isinstance(value, datetime):
+                type_check = f"substr({column}, 1, 4) = char(1) || 'dt:'"
+            else:
+                type_check = f"typeof({column}) = 'text' AND substr({column}, 1, 1) != char(1)"
+            return f"{type_check} AND {column} {op} ?", [_encode(value)]
+        raise ValueError(f"Unsupported filter operator: {op}")
+
+    def _apply(self, conn: sqlite3.Connection, reference: SQLiteDocumentReference, kind: str, data: Optional[Dict]):
+        key = (reference.collection, reference.id)
+        if kind == "delete":
+            conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?", key)
+            return
+        if kind == "create":
+            if conn.execute("SELECT 1 FROM documents WHERE collection = ? AND id = ?", key).fetchone():
+                raise AlreadyExists(f"Document already exists: {reference.collection}/{reference.id}")
+            document = data
+        elif kind == "set":
+            document = data
+        else:
+            row = conn.execute("SELECT data FROM documents WHERE collection = ? AND id = ?", key).fetchone()
+            if row is None and kind == "update":
+                raise NotFound(f"No document to update: {reference.collection}/{reference.id}")
+            document = _loads(row[0]) if row else {}
+            for field, value in data.items():
+                if kind == "update":
+                    _set_path(document, field, value)
+                else:
+                    document[field] = value
+        conn.execute(
+            "INSERT INTO documents (collection, id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection, id) DO UPDATE SET data = excluded.data",
+            (*key, _dumps(document))
+        )
+
+    def transform(self, reference: SQLiteDocumentReference, transform: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        """Read-modify-write one document; the write lock is held throughout, so there are no retries"""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND id = ?", (reference.collection, reference.id)
+            ).fetchone()
+            current = _loads(row[0]) if row else None
+            updated = transform(current)
+            if updated is None:
+                return current
+            self._apply(conn, reference, "set", updated)
+            return updated
+
+    def collection(self, name: str) -> SQLiteCollectionReference:
+        return SQLiteCollectionReference(self, name)
+
+    def batch(self) -> SQLiteWriteBatch:
+        return SQLiteWriteBatch(self)
+
+    def get_all(self, references: List[SQLiteDocumentReference]) -> Iterator[SQLiteDocumentSnapshot]:
+        by_collection: Dict[str, List[SQLiteDocumentReference]] = {}
+        for reference in references:
+            by_collection.setdefault(reference.collection, []).append(reference)
+        found = {}
+        with self.connection() as conn:
+            for collection, refs in by_collection.items():
+                ids = [ref.id for ref in refs]
+                rows = conn.execute(
+                    f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({', '.join('?' for _ in ids)})",
+                    [collection, *ids]
+                ).fetchall()
+                found.update({(collection, doc_id): data for doc_id, data in rows})
+        for reference in references:
+            data = found.get((reference.collection, reference.id))
+            yield SQLiteDocumentSnapshot(reference, _loads(data) if data is not None else None)
+
+    def get_metrics(self) -> Dict:
+        return {
+            "path": self.path,
+            "pool_size": self.pool_size,
+            "connections": self._created,
+            "idle_connections": self._pool.qsize(),
+            "indexed_fields": list(self.indexed_fields)
+        }
+
+    def close(self):
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+                # Keeps the planner's statistics current for the indexed columns
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+class LocalBlob:
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self._bucket = bucket
+        self.name = name
+        self.path = os.path.normpath(os.path.join(bucket.root, *name.split("/")))
+        if not self.path.startswith(os.path.normpath(bucket.root) + os.sep):
+            raise ValueError(f"Invalid object name: {name}")
+
+    def upload_from_string(self, data, content_type: str = None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+
+    def upload_from_filename(self, filename: str, content_type: str = None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type)
+
+    def download_as_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def make_public(self):
+        # Files under the uploads directory are already served by the app
+        pass
+
+    def delete(self):
+        if not os.path.exists(self.path):
+            raise NotFound(f"No such object: {self.name}")
+        os.remove(self.path)
+
+    @property
+    def public_url(self) -> str:
+        return f"{self._bucket.base_url}/{self.name}"
+
+
+class LocalBucket:
+    """Storage bucket on the local filesystem, served from base_url"""
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
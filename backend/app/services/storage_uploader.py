@@ -0,0 +1,151 @@
+from typing import Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import time
+
+# Resumable uploads are sent in chunks that are a multiple of 256 KiB
+_CHUNK_ALIGNMENT = 256 * 1024
+
+
+class StorageUploader:
+    """Runs blocking Storage uploads on their own small thread pool.
+
+    The pool size caps concurrent uploads, so a burst of check-in photos
+    cannot starve Firestore calls or saturate the uplink; uploads beyond it
+    wait their turn. Objects larger than resumable_threshold are sent as a
+    resumable upload in chunk_size pieces, so a dropped connection only
+    resends the current chunk. With public_bucket (the bucket grants public
+    read access, e.g. to allUsers) the public URL is computed directly,
+    without the per-object make_public() round trip.
+    """
+
+    def __init__(self, max_concurrency: int = 4, timeout: float = 120.0, resumable_threshold: int = 8 * 1024 * 1024,
+                 chunk_size: int = 8 * 1024 * 1024, public_bucket: bool = False, sample_size: int = 256):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.resumable_threshold = resumable_threshold
+        self.chunk_size = max(_CHUNK_ALIGNMENT, chunk_size - chunk_size % _CHUNK_ALIGNMENT)
+        self.public_bucket = public_bucket
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="storage")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self.uploads = 0
+        self.resumable_uploads = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.bytes_uploaded = 0
+        self.upload_seconds = 0.0
+        self.samples = deque(maxlen=sample_size)
+
+    def _blob(self, bucket, path: str, size: int):
+        blob = bucket.blob(path)
+        if size > self.resumable_threshold:
+            # Setting a chunk size switches the client to a chunked resumable upload
+            blob.chunk_size = self.chunk_size
+        return blob
+
+    def _public_url(self, blob) -> str:
+        if not self.public_bucket:
+            blob.make_public()
+        return blob.public_url
+
+    async def _submit(self, func, size: int, *args) -> str:
+        loop = asyncio.get_running_loop()
+        ran = {"value": False}
+
+        def call():
+            ran["value"] = True
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = func(*args)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+            # Time on the wire only, not time spent waiting for a free slot
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.upload_seconds += elapsed
+                self.samples.append(elapsed * 1000)
+            return result
+
+        def on_done(_):
+            # An upload cancelled while still waiting for a slot never ran
+            if not ran["value"]:
+                with self._lock:
+                    self._queued -= 1
+
+        with self._lock:
+            self._queued += 1
+        future = self._pool.submit(call)
+        future.add_done_callback(on_done)
+        try:
+            url = await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.failures += 1
+                self.timeouts += 1
+            raise asyncio.TimeoutError(f"Storage upload timed out after {self.timeout}s")
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        with self._lock:
+            self.uploads += 1
+            self.bytes_uploaded += size
+            if size > self.resumable_threshold:
+                self.resumable_uploads += 1
+        return url
+
+    async def upload(self, bucket, path: str, data: bytes, content_type: str) -> str:
+        """Upload bytes and return the object's public URL"""
+        def upload():
+            blob = self._blob(bucket, path, len(data))
+            blob.upload_from_string(data, content_type=content_type)
+            return self._public_url(blob)
+        return await self._submit(upload, len(data))
+
+    async def upload_from_path(self, bucket, path: str, local_path: str, content_type: str) -> str:
+        """Upload a local file without reading it into memory, e.g. a processed video"""
+        size = os.path.getsize(local_path)
+
+        def upload():
+            blob = self._blob(bucket, path, size)
+            blob.upload_from_filename(local_path, content_type=content_type)
+            return self._public_url(blob)
+        return await self._submit(upload, size)
+
+    async def delete(self, bucket, path: str):
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(loop.run_in_executor(self._pool, lambda: bucket.blob(path).delete()), self.timeout)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            ordered = sorted(self.samples)
+            seconds, uploaded = self.upload_seconds, self.bytes_uploaded
+            queued, in_flight = self._queued, self._in_flight
+        p50 = ordered[len(ordered) // 2] if ordered else 0.0
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queued": queued,
+            "in_flight": in_flight,
+            "uploads": self.uploads,
+            "resumable_uploads": self.resumable_uploads,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "bytes_uploaded": uploaded,
+            "throughput_mb_per_s": round(uploaded / seconds / (1024 * 1024), 3) if seconds else 0.0,
+            "p50_ms": round(p50, 2),
+            "p95_ms": round(p95, 2),
+            "public_bucket": self.public_bucket
+        }
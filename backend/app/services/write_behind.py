@@ -0,0 +1,398 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from app.services.firestore_filters import apply_update
+from app.services.journal import Journal
+
+# Journal records written since the last compaction before the file is rewritten
+_COMPACT_AFTER_RECORDS = 10000
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Cannot journal value of type {type(value).__name__}")
+
+
+def _decode(obj: Dict):
+    if len(obj) == 1 and "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+def _merge_updates(older: Dict, newer: Dict) -> Dict:
+    """One update equivalent to applying older and then newer"""
+    merged = dict(older)
+    for key, value in newer.items():
+        # A newer value for a map replaces earlier writes to its nested fields
+        for existing in [k for k in merged if k == key or k.startswith(key + ".")]:
+            del merged[existing]
+        parent = next((k for k in merged if key.startswith(k + ".")), None)
+        if parent is not None and isinstance(merged[parent], dict):
+            merged[parent] = apply_update(merged[parent], {key[len(parent) + 1:]: value})
+        else:
+            merged[key] = value
+    return merged
+
+
+class PendingWrite:
+    """The net effect of the writes to one document that are not yet applied"""
+
+    def __init__(self, collection: str, doc_id: str, kind: str, data: Optional[Dict], seq: int,
+                 enqueued_at: Optional[float] = None):
+        self.collection = collection
+        self.doc_id = doc_id
+        self.kind = kind
+        self.data = data
+        self.seq = seq
+        # Wall-clock time of the oldest write folded into this one, for lag
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.time()
+        self.attempts = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.collection, self.doc_id)
+
+    def absorb(self, newer: "PendingWrite"):
+        """Fold a later write to the same document into this one"""
+        if newer.kind == "update":
+            if self.kind == "set":
+                self.data = apply_update(self.data, newer.data)
+            elif self.kind == "update":
+                self.data = _merge_updates(self.data, newer.data)
+            # An update after a delete fails in Firestore, so the delete stands
+        else:
+            self.kind = newer.kind
+            self.data = newer.data
+        self.seq = newer.seq
+
+    def to_record(self) -> Dict:
+        return {"s": self.seq, "c": self.collection, "i": self.doc_id, "k": self.kind,
+                "d": self.data, "t": self.enqueued_at}
+
+
+class WriteBehindQueue:
+    """Acknowledges writes once journaled and applies them to the datastore in batches.
+
+    Each write is appended to a local JSON-lines journal (flushed and fsynced,
+    in groups and off the event loop) before enqueue() returns, so writes
+    survive a crash and are replayed the next time the queue is created. Writes to the same document are coalesced
+    while they wait. A background task hands pending writes to apply() in
+    batches per collection; writes that keep failing are moved to a
+    dead-letter file next to the journal instead of being retried forever.
+
+    apply(collection, [(doc_id, kind, data)]) must return
+    {"succeeded": [doc_id, ...], "failed": {doc_id: error}}, as
+    FirebaseService._write_bulk does. Replaying may apply a write twice,
+    which is harmless since sets, updates and deletes are idempotent.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        apply: Callable[[str, List[tuple]], Awaitable[Dict]],
+        flush_interval: float = 1.0,
+        max_batch: int = 500,
+        max_attempts: int = 8,
+        max_retry_delay: float = 300.0
+    ):
+        self.journal_path = journal_path
+        self.dead_letter_path = journal_path + ".failed"
+        self.apply = apply
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], PendingWrite] = {}
+        self._in_flight: Dict[Tuple[str, str], PendingWrite] = {}
+        self._seq = 0
+        self._journal = Journal(journal_path, self._lock, _encode)
+        # The flusher task and its wake-up event belong to one event loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flushing = False
+        self.enqueued = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.replayed = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+        self._replay()
+
+    # Journal
+
+    def _replay(self):
+        """Rebuild pending writes from the journal left by a previous process"""
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line, object_hook=_decode)
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        continue
+                    if "a" in record:
+                        for collection, doc_id, seq in record["a"]:
+                            write = self._pending.get((collection, doc_id))
+                            if write is not None and write.seq <= seq:
+                                del self._pending[(collection, doc_id)]
+                        continue
+                    write = PendingWrite(record["c"], record["i"], record["k"], record["d"], record["s"], record["t"])
+                    self._seq = max(self._seq, write.seq)
+                    self._add(write)
+            self.replayed = len(self._pending)
+            self.coalesced = 0
+            if self.replayed:
+                print(f"Write-behind journal replayed {self.replayed} pending writes")
+        self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with only the writes still pending; blocks on the disk"""
+        self._journal.rewrite(lambda: [
+            write.to_record() for write in list(self._in_flight.values()) + list(self._pending.values())
+        ])
+
+    # Queue
+
+    def _add(self, write: PendingWrite):
+        existing = self._pending.get(write.key)
+        if existing is None:
+            self._pending[write.key] = write
+        else:
+            existing.absorb(write)
+            self.coalesced += 1
+
+    async def enqueue(self, collection: str, doc_id: str, kind: str, data: Optional[Dict] = None):
+        """Journal a set, update or delete and schedule it; returns once the journal is on disk.
+
+        Raises TypeError if data holds values that cannot be journaled
+        (anything JSON cannot represent, except datetimes).
+        """
+        if kind not in ("set", "update", "delete"):
+            raise ValueError(f"Unsupported write kind: {kind}")
+        with self._lock:
+            self._seq += 1
+            write = PendingWrite(collection, doc_id, kind, copy.deepcopy(data), self._seq)
+            position = self._journal.append(write.to_record())
+            self._add(write)
+            self.enqueued += 1
+            full = len(self._pending) >= self.max_batch
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+        await self._journal.sync(position)
+
+    def pending_write(self, collection: str, doc_id: str) -> Optional[PendingWrite]:
+        """The write still to be applied to a document, if any"""
+        with self._lock:
+            return self._pending.get((collection, doc_id)) or self._in_flight.get((collection, doc_id))
+
+    def overlay(self, collection: str, doc_id: str, doc: Optional[Dict]) -> Optional[Dict]:
+        """doc as it will read once the pending writes to it are applied"""
+        with self._lock:
+            writes = [w for w in (self._in_flight.get((collection, doc_id)), self._pending.get((collection, doc_id)))
+                      if w is not None]
+            for write in writes:
+                if write.kind == "set":
+                    doc = copy.deepcopy(write.data)
+                elif write.kind == "delete":
+                    doc = None
+                elif doc is not None:
+                    doc = apply_update(doc, write.data)
+        return doc
+
+    def has_pending(self, collection: str, doc_id: str) -> bool:
+        return self.pending_write(collection, doc_id) is not None
+
+    # Flushing
+
+    def _ensure_flusher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run_flusher())
+
+    def start(self):
+        """Start flushing, e.g. the writes replayed from the journal; call from the event loop"""
+        self._ensure_flusher()
+        if self._pending:
+            self._wake.set()
+
+    async def _run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.flush() >= self.max_batch:
+                    pass
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Write-behind flush failed: {e}")
+
+    def _take_batch(self) -> List[PendingWrite]:
+        now = time.monotonic()
+        with self._lock:
+            batch = [w for w in self._pending.values() if w.retry_at <= now and w.key not in self._in_flight]
+            batch = batch[:self.max_batch]
+            for write in batch:
+                del self._pending[write.key]
+                self._in_flight[write.key] = write
+        return batch
+
+    async def flush(self) -> int:
+        """Apply up to max_batch pending writes that are due; returns how many were attempted"""
+        if self._flushing:
+            return 0
+        self._flushing = True
+        try:
+            batch = self._take_batch()
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            by_collection: Dict[str, List[PendingWrite]] = {}
+            for write in batch:
+                by_collection.setdefault(write.collection, []).append(write)
+            try:
+                results = await asyncio.gather(*[
+                    self.apply(collection, [(w.doc_id, w.kind, w.data) for w in writes])
+                    for collection, writes in by_collection.items()
+                ], return_exceptions=True)
+            except asyncio.CancelledError:
+                # Put the batch back; it is applied again later, which is harmless
+                with self._lock:
+                    for write in batch:
+                        del self._in_flight[write.key]
+                        newer = self._pending.pop(write.key, None)
+                        self._pending[write.key] = write
+                        if newer is not None:
+                            write.absorb(newer)
+                raise
+
+            acked, dead, position = [], [], None
+            with self._lock:
+                for (collection, writes), result in zip(by_collection.items(), results):
+                    failed = {w.doc_id: str(result) for w in writes} if isinstance(result, Exception) else result["failed"]
+                    for write in writes:
+                        del self._in_flight[write.key]
+                        if write.doc_id not in failed:
+                            acked.append([write.collection, write.doc_id, write.seq])
+                            self.flushed += 1
+                            continue
+                        self.failures += 1
+                        write.attempts += 1
+                        write.last_error = self.last_error = failed[write.doc_id]
+                        if write.attempts >= self.max_attempts:
+                            acked.append([write.collection, write.doc_id, write.seq])
+                            dead.append(write)
+                            continue
+                        # Retry with exponential backoff, ahead of any write that arrived meanwhile
+                        write.retry_at = time.monotonic() + min(
+                            self.flush_interval * 2 ** write.attempts, self.max_retry_delay
+                        )
+                        newer = self._pending.pop(write.key, None)
+                        self._pending[write.key] = write
+                        if newer is not None:
+                            write.absorb(newer)
+                if dead:
+                    # Rare, so written inline: the record must be on disk before the ack
+                    self._dead_letter(dead)
+                compact = not self._pending and not self._in_flight
+                if acked and not compact:
+                    position = self._journal.append({"a": acked})
+            if compact or self._journal.records > _COMPACT_AFTER_RECORDS:
+                await asyncio.to_thread(self._compact)
+            elif position is not None:
+                await self._journal.sync(position)
+            self.flushes += 1
+            self.last_flush_at = time.time()
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            return len(batch)
+        finally:
+            self._flushing = False
+
+    def _dead_letter(self, writes: List[PendingWrite]):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for write in writes:
+                print(f"Write-behind gave up on {write.collection}/{write.doc_id} "
+                      f"after {write.attempts} attempts: {write.last_error}")
+                f.write(json.dumps({**write.to_record(), "error": write.last_error}, default=_encode) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += len(writes)
+
+    async def drain(self, timeout: float = 30.0) -> bool:
+        """Flush everything pending, ignoring retry backoff; True if nothing is left.
+
+        Writes still pending after a failure or the timeout stay in the
+        journal and are replayed on the next start.
+        """
+        if self._task is not None and self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+                for write in self._pending.values():
+                    write.retry_at = 0.0
+            failures = self.failures
+            # Stop at the first failure rather than burn through the retry budget
+            if not await self.flush() or self.failures > failures:
+                break
+        with self._lock:
+            remaining = len(self._pending)
+        if remaining:
+            print(f"Write-behind drain stopped; {remaining} writes left in the journal")
+        return not remaining
+
+    def close(self):
+        self._journal.close()
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            writes = list(self._pending.values()) + list(self._in_flight.values())
+            oldest = min((w.enqueued_at for w in writes), default=None)
+            retrying = sum(1 for w in writes if w.attempts)
+            in_flight = len(self._in_flight)
+        return {
+            "pending": len(writes) - in_flight,
+            "in_flight": in_flight,
+            "retrying": retrying,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "replayed": self.replayed,
+            "journal_records": self._journal.records,
+            "last_flush_at": datetime.fromtimestamp(self.last_flush_at).isoformat() if self.last_flush_at else None,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "last_error": self.last_error
+        }
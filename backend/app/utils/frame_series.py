@@ -0,0 +1,90 @@
+import io
+import os
+from typing import Dict, List, Optional
+import numpy as np
+
+# Relative series paths (as stored in analysis documents) resolve against the backend directory,
+# like the other uploads, not against the working directory of whichever process reads them
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Per-frame scalar columns and their stored dtypes; defect counts are a separate frames x defects matrix
+FRAME_COLUMNS = {
+    "frame_number": np.int32,
+    "timestamp": np.float64,
+    "total_beans": np.int32,
+    "good_beans": np.int32,
+    "defect_beans": np.int32,
+    "quality_score": np.float32
+}
+
+
+def pack_frame_analyses(frame_analyses: List[Dict]) -> bytes:
+    """Compressed NPZ holding frame analyses column by column, ordered by timestamp"""
+    frames = sorted(frame_analyses, key=lambda frame: frame["timestamp"])
+    names = sorted({name for frame in frames for name in frame.get("defect_counts", {})})
+    columns = {
+        column: np.array([frame.get(column, 0) for frame in frames], dtype=dtype)
+        for column, dtype in FRAME_COLUMNS.items()
+    }
+    counts = np.zeros((len(frames), len(names)), dtype=np.int32)
+    index = {name: i for i, name in enumerate(names)}
+    for row, frame in enumerate(frames):
+        for name, count in frame.get("defect_counts", {}).items():
+            counts[row, index[name]] = count
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, defect_names=np.array(names, dtype=str), defect_counts=counts, **columns)
+    return buffer.getvalue()
+
+
+def resolve_series_path(path: str) -> str:
+    """Absolute location of a stored series path"""
+    return os.path.join(BASE_DIR, path)
+
+
+def save_frame_series(path: str, frame_analyses: List[Dict]) -> Dict:
+    """Write frame analyses to path as NPZ; returns the pointer stored in the analysis document"""
+    data = pack_frame_analyses(frame_analyses)
+    full_path = resolve_series_path(path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = full_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, full_path)
+    timestamps = [frame["timestamp"] for frame in frame_analyses]
+    return {
+        "path": path,
+        "format": "npz",
+        "frames": len(frame_analyses),
+        "start_time": min(timestamps) if timestamps else 0.0,
+        "end_time": max(timestamps) if timestamps else 0.0,
+        "size_bytes": len(data)
+    }
+
+
+def load_frame_series(path: str, start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+    """Frame analyses with start <= timestamp <= end, rebuilt as the dicts process_video produced.
+
+    Raises FileNotFoundError if the series file has been removed.
+    """
+    with np.load(resolve_series_path(path), allow_pickle=False) as data:
+        timestamps = data["timestamp"]
+        first = int(np.searchsorted(timestamps, start, side="left")) if start is not None else 0
+        last = int(np.searchsorted(timestamps, end, side="right")) if end is not None else len(timestamps)
+        columns = {column: data[column][first:last].tolist() for column in FRAME_COLUMNS}
+        names = data["defect_names"].tolist()
+        counts = data["defect_counts"][first:last]
+    frames = []
+    for row in range(last - first):
+        frame = {column: values[row] for column, values in columns.items()}
+        frame["defect_counts"] = {name: int(count) for name, count in zip(names, counts[row]) if count}
+        frames.append(frame)
+    return frames
+
+
+def delete_frame_series(path: str) -> bool:
+    """Remove a series file; False if it was already gone"""
+    try:
+        os.remove(resolve_series_path(path))
+    except FileNotFoundError:
+        return False
+    return True
@@ -17,10 +17,28 @@ def init_firebase_apps():
     
     return source_db, target_db
 
+def iter_collection(query, page_size=500):
+    """Yield documents page by page, each page resuming after the last document.
+
+    Unlike one long stream(), no server-side cursor stays open while the
+    caller writes each document to the target project.
+    """
+    query = query.order_by("__name__")
+    last_doc = None
+    while True:
+        page_query = query.limit(page_size)
+        if last_doc is not None:
+            page_query = page_query.start_after(last_doc)
+        docs = page_query.get()
+        yield from docs
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
 def get_farms_mapping(target_db):
     """Get existing farms from target database"""
     farms_ref = target_db.collection('farms')
-    farms = farms_ref.stream()
+    farms = iter_collection(farms_ref)
     
     farms_mapping = {}
     for farm in farms:
@@ -86,7 +104,7 @@ def clone_farmers_data(source_db, target_db):
     
     # Get farmers from source
     farmers_ref = source_db.collection('farmers')
-    farmers = farmers_ref.stream()
+    farmers = iter_collection(farmers_ref)
     
     count = 0
     for farmer in farmers:
@@ -131,7 +149,7 @@ def clone_attendance_data(source_db, target_db):
     
     # Get farmer mappings from target to know their farms
     farmers_ref = target_db.collection('farmers')
-    farmers = farmers_ref.stream()
+    farmers = iter_collection(farmers_ref.select(['farm_id', 'farm_name']))
     
     farmer_farm_mapping = {}
     for farmer in farmers:
@@ -7,6 +7,7 @@ import asyncio
 import random
 from datetime import datetime, timedelta
 from typing import List, Dict
+from app.services.attendance_service import AttendanceService
 from app.services.firebase_service import FirebaseService
 
 class MissingAttendanceFiller:
@@ -196,26 +197,20 @@ class MissingAttendanceFiller:
             # Create attendance records for this date
             records = await self.create_attendance_for_date(date_str)
             
-            # Batch write to Firebase (500 records at a time)
-            batch = self.firebase.db.batch()
-            batch_count = 0
+            # Bulk write to Firebase (chunked to 500-op batches, committed concurrently)
+            documents = {attendance_ref.document().id: record for record in records}
+            result = await self.firebase.save_documents_bulk('attendance', documents)
             
-            for record in records:
-                doc_ref = attendance_ref.document()
-                batch.set(doc_ref, record)
-                batch_count += 1
-                
-                if batch_count >= 500:
-                    batch.commit()
-                    batch = self.firebase.db.batch()
-                    batch_count = 0
-            
-            # Commit remaining records
-            if batch_count > 0:
-                batch.commit()
-            
-            total_records += len(records)
-            print(f"  ✅ Added {len(records)} records for {date_str}")
+            total_records += len(result['succeeded'])
+            print(f"  ✅ Added {len(result['succeeded'])} records for {date_str}")
+            if result['failed']:
+                print(f"  ❌ Failed to add {len(result['failed'])} records for {date_str}")
+        
+        # Bulk writes skip the daily rollups /stats reads; recompute them for these dates
+        rollups = await AttendanceService().rebuild_rollups_for_dates(
+            [datetime.strptime(date_str, "%Y-%m-%d").date() for date_str in missing_dates]
+        )
+        print(f"📊 Rebuilt {rollups} daily attendance rollups")
         
         print(f"✅ Successfully filled {len(missing_dates)} missing dates with {total_records} total records!")
         return total_records
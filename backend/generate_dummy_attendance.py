@@ -13,6 +13,7 @@ import sys
 # Add the app directory to Python path
 sys.path.append('/mnt/data/AIFace/AICoffeePortal/backend')
 
+from app.services.attendance_service import AttendanceService
 from app.services.firebase_service import FirebaseService
 
 class AttendanceDummyGenerator:
@@ -42,20 +43,11 @@ class AttendanceDummyGenerator:
             print(f"Error getting farms: {e}")
             return []
     
-    async def check_existing_attendance(self, farmer_id: str, target_date: date) -> bool:
-        """Check if attendance already exists for farmer on specific date"""
-        try:
-            date_str = target_date.isoformat()
-            filters = [
-                ("farmer_id", "==", farmer_id),
-                ("date", "==", date_str)
-            ]
-            
-            records = await self.firebase_service.query_documents("attendance", filters=filters)
-            return len(records) > 0
-        except Exception as e:
-            print(f"Error checking existing attendance: {e}")
-            return True  # Assume exists to avoid duplicates on error
+    async def get_existing_farmer_ids(self, target_date: date) -> set:
+        """Get IDs of farmers that already have attendance on a specific date"""
+        date_str = target_date.isoformat()
+        records = await self.firebase_service.query_documents("attendance", filters=[("date", "==", date_str)])
+        return {record.get("farmer_id") for record in records}
     
     def generate_realistic_times(self, target_date: date) -> Dict:
         """Generate realistic check-in and check-out times"""
@@ -95,19 +87,24 @@ class AttendanceDummyGenerator:
     
     async def generate_attendance_for_date(self, target_date: date, farmers: List[Dict]) -> int:
         """Generate attendance data for a specific date"""
-        generated_count = 0
-        
         # 70-90% of farmers attend on any given day
         attendance_rate = random.uniform(0.7, 0.9)
         attending_farmers = random.sample(farmers, int(len(farmers) * attendance_rate))
         
         print(f"Generating attendance for {target_date.isoformat()}: {len(attending_farmers)}/{len(farmers)} farmers")
         
+        try:
+            existing_farmer_ids = await self.get_existing_farmer_ids(target_date)
+        except Exception as e:
+            print(f"Error checking existing attendance: {e}")
+            return 0  # Skip the day to avoid duplicates on error
+        
+        pending_records = {}
         for farmer in attending_farmers:
             farmer_id = farmer["id"]
             
             # Check if attendance already exists
-            if await self.check_existing_attendance(farmer_id, target_date):
+            if farmer_id in existing_farmer_ids:
                 print(f"  Skipping {farmer_id} - attendance already exists")
                 continue
             
@@ -143,12 +140,14 @@ class AttendanceDummyGenerator:
                     "longitude": random.uniform(105.8, 105.9)
                 }
             
-            try:
-                await self.firebase_service.save_document("attendance", doc_id, attendance_data)
-                generated_count += 1
-                print(f"  ✅ Generated attendance for {farmer.get('name', farmer_id)}")
-            except Exception as e:
-                print(f"  ❌ Error generating attendance for {farmer_id}: {e}")
+            pending_records[doc_id] = attendance_data
+        
+        # Save the whole day with batched writes
+        result = await self.firebase_service.save_documents_bulk("attendance", pending_records)
+        generated_count = len(result["succeeded"])
+        print(f"  ✅ Generated {generated_count} attendance records")
+        for doc_id, error in result["failed"].items():
+            print(f"  ❌ Error generating attendance {doc_id}: {error}")
         
         return generated_count
     
@@ -166,6 +165,7 @@ class AttendanceDummyGenerator:
         print(f"📊 Working with {len(farmers)} farmers across {len(farms)} farms")
         
         total_generated = 0
+        generated_dates = []
         
         # Generate data for each day
         for i in range(days_back):
@@ -178,10 +178,15 @@ class AttendanceDummyGenerator:
             
             daily_count = await self.generate_attendance_for_date(target_date, farmers)
             total_generated += daily_count
+            generated_dates.append(target_date)
             
             # Small delay to avoid overwhelming Firebase
             await asyncio.sleep(0.1)
         
+        # Bulk writes skip the daily rollups /stats reads; recompute them for these dates
+        rollups = await AttendanceService().rebuild_rollups_for_dates(generated_dates)
+        print(f"📊 Rebuilt {rollups} daily attendance rollups")
+        
         print(f"🎉 Dummy data generation completed!")
         print(f"📈 Generated {total_generated} attendance records across {days_back} days")
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark API endpoints offline against the mock datastore with simulated
+round-trip latency (MOCK_DATASTORE_LATENCY), and count datastore calls per
+request from the X-Datastore-Calls trace header.
+
+Mock calls normally take microseconds, so an endpoint that makes one call
+per farmer looks fast; with realistic latency its cost shows up. Seeds
+--farms farms with --farmers farmers each and today's attendance for
+--present of them, then requests each endpoint --requests times.
+
+--max-calls ENDPOINT=N fails (exit status 1) when an endpoint makes more
+than N datastore calls per request, so the script can guard against
+regressions in CI.
+
+Usage:
+    python scripts/benchmark_endpoints.py --farms 5 --farmers 40 --median-ms 80
+    python scripts/benchmark_endpoints.py --max-calls /attendance/today=3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, datetime
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["USE_MOCK_FIREBASE"] = "true"
+
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.main import app
+from app.services.attendance_service import AttendanceService
+from app.services.firebase_service import FirebaseService
+
+ENDPOINTS = ["/attendance/today", "/attendance/stats"]
+
+
+def seed(service, farms, farmers_per_farm, present):
+    """Bulk-load farms, farmers and today's attendance into the mock datastore"""
+    today = date.today()
+    farm_docs, farmer_docs, attendance_docs = {}, {}, {}
+    for f in range(farms):
+        farm_id = f"bench_farm_{f}"
+        farm_docs[farm_id] = {"id": farm_id, "name": f"Bench Farm {f}", "location": "Da Lat"}
+        for i in range(farmers_per_farm):
+            farmer_id = f"{farm_id}_farmer_{i}"
+            farmer_docs[farmer_id] = {"id": farmer_id, "name": f"Farmer {f}-{i}", "farm_id": farm_id, "is_active": True}
+            if i < farmers_per_farm * present:
+                attendance_id = f"bench_attendance_{farmer_id}"
+                attendance_docs[attendance_id] = {
+                    "id": attendance_id,
+                    "farmer_id": farmer_id,
+                    "farm_id": farm_id,
+                    "date": today.isoformat(),
+                    "check_in_time": datetime.combine(today, datetime.min.time()).replace(hour=7 + i % 3),
+                    "status": "working"
+                }
+
+    async def load():
+        await service.save_documents_bulk("farms", farm_docs)
+        await service.save_documents_bulk("farmers", farmer_docs)
+        await service.save_documents_bulk("attendance", attendance_docs)
+        await AttendanceService().rebuild_rollups_for_dates([today])
+    asyncio.run(load())
+    return len(farm_docs), len(farmer_docs), len(attendance_docs)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--farms", type=int, default=5)
+    parser.add_argument("--farmers", type=int, default=40, help="Farmers per farm")
+    parser.add_argument("--present", type=float, default=0.8, help="Fraction of farmers checked in today")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per endpoint")
+    parser.add_argument("--median-ms", type=float, help="Median round trip for every operation (p95 is twice it)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls that fail transiently")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for sampled latencies")
+    parser.add_argument("--endpoint", action="append", help="Endpoint to benchmark (repeatable)")
+    parser.add_argument("--max-calls", action="append", default=[], metavar="ENDPOINT=N",
+                        help="Fail if an endpoint makes more than N datastore calls per request")
+    args = parser.parse_args()
+
+    budgets = {}
+    for budget in args.max_calls:
+        endpoint, _, calls = budget.rpartition("=")
+        budgets[endpoint] = int(calls)
+
+    service = FirebaseService()
+    farms, farmers, attendance = seed(service, args.farms, args.farmers, args.present)
+
+    # Seeding ran without latency; the injector is built on the first call after this
+    settings.MOCK_DATASTORE_LATENCY = True
+    settings.MOCK_DATASTORE_LATENCY_SEED = args.seed
+    if args.median_ms is not None or args.failure_rate:
+        profile = {}
+        for operation, options in settings.MOCK_DATASTORE_LATENCY_PROFILE.items():
+            median = args.median_ms if args.median_ms is not None else options["median_ms"]
+            profile[operation] = {
+                "median_ms": median,
+                "p95_ms": median * 2 if args.median_ms is not None else options["p95_ms"],
+                "failure_rate": args.failure_rate
+            }
+        settings.MOCK_DATASTORE_LATENCY_PROFILE = profile
+
+    token = create_access_token({"sub": "admin_1", "email": "admin@aicoffee.com", "role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+    print(f"Seeded {farms} farms, {farmers} farmers, {attendance} attendance records for today")
+    print(f"Latency profile: {settings.MOCK_DATASTORE_LATENCY_PROFILE}")
+
+    failed = False
+    with TestClient(app) as client:
+        for endpoint in args.endpoint or ENDPOINTS:
+            timings, calls, datastore_ms, errors = [], [], [], 0
+            trace = ""
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                response = client.get(f"{settings.API_V1_STR}{endpoint}", headers=headers)
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+                calls.append(int(response.headers.get("X-Datastore-Calls", 0)))
+                datastore_ms.append(float(response.headers.get("X-Datastore-Time-Ms", 0)))
+                trace = response.headers.get("X-Datastore-Trace", "")
+            per_request = max(calls)
+            print(f"\n{endpoint}")
+            print(f"  latency      p50 {percentile(timings, 0.5):8.1f} ms   p95 {percentile(timings, 0.95):8.1f} ms")
+            print(f"  datastore    {per_request} calls/request, {sum(datastore_ms) / len(datastore_ms):.1f} ms summed")
+            print(f"  last trace   {trace}")
+            if errors:
+                print(f"  errors       {errors}/{args.requests} requests failed")
+            budget = budgets.get(endpoint)
+            if budget is not None and per_request > budget:
+                print(f"  FAIL         {per_request} datastore calls exceeds the budget of {budget}")
+                failed = True
+
+    print(f"\nLatency injection: {service.get_metrics()['latency_injection']}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
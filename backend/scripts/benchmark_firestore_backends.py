@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare thread-wrapped and native async FirebaseService backends for
+concurrent document reads.
+
+With FIRESTORE_EMULATOR_HOST set, both backends read from the local
+Firestore emulator. Otherwise a stand-in client is used that simulates a
+fixed network round trip (time.sleep for the sync SDK, asyncio.sleep for
+the async one), which isolates the cost of thread hops and pool saturation.
+
+Usage:
+    python scripts/benchmark_firestore_backends.py --reads 1000 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.firebase_service import (
+    FirebaseService, get_document_cache, get_query_cache, shutdown_firestore_executor, stop_live_mirrors
+)
+from app.services.firebase_async_service import AsyncFirebaseService
+
+
+class _StandInSnapshot:
+    def __init__(self, doc_id):
+        self.id = doc_id
+        self.exists = True
+
+    def to_dict(self):
+        return {"name": f"Farmer {self.id}", "farm_id": "farm_1"}
+
+
+class _StandInDocument:
+    def __init__(self, doc_id, latency, is_async):
+        self.id = doc_id
+        self._latency = latency
+        self._is_async = is_async
+
+    def get(self, *args, **kwargs):
+        if self._is_async:
+            return self._get_async()
+        time.sleep(self._latency)
+        return _StandInSnapshot(self.id)
+
+    async def _get_async(self):
+        await asyncio.sleep(self._latency)
+        return _StandInSnapshot(self.id)
+
+
+class _StandInCollection:
+    def __init__(self, latency, is_async):
+        self._latency = latency
+        self._is_async = is_async
+
+    def document(self, doc_id):
+        return _StandInDocument(doc_id, self._latency, self._is_async)
+
+
+class StandInClient:
+    """Minimal Firestore client surface used by get_document"""
+
+    def __init__(self, latency, is_async):
+        self._latency = latency
+        self._is_async = is_async
+
+    def collection(self, name):
+        return _StandInCollection(self._latency, self._is_async)
+
+
+def build_services(latency):
+    """Create both backends without touching real Firebase credentials"""
+    threaded = object.__new__(FirebaseService)
+    native = object.__new__(AsyncFirebaseService)
+    threaded.bucket = native.bucket = None
+
+    emulator = os.getenv("FIRESTORE_EMULATOR_HOST")
+    if emulator:
+        from google.cloud import firestore
+        project = os.getenv("GCLOUD_PROJECT", "benchmark")
+        threaded.db = firestore.Client(project=project)
+        native.db = firestore.AsyncClient(project=project)
+        source = f"emulator at {emulator}"
+    else:
+        threaded.db = StandInClient(latency, is_async=False)
+        native.db = StandInClient(latency, is_async=True)
+        source = f"stand-in client with {latency * 1000:.0f} ms simulated round trip"
+    return threaded, native, source
+
+
+def seed_emulator(client, doc_ids):
+    batch = client.batch()
+    for i, doc_id in enumerate(doc_ids):
+        batch.set(client.collection("farmers").document(doc_id), {"name": f"Farmer {doc_id}", "farm_id": "farm_1"})
+        if (i + 1) % 500 == 0:
+            batch.commit()
+            batch = client.batch()
+    batch.commit()
+
+
+def reset_read_caches():
+    """Drop cached documents and live mirrors, so every run reads from the backend"""
+    get_document_cache().clear()
+    get_query_cache().clear()
+    stop_live_mirrors()
+
+
+async def run_reads(service, doc_ids):
+    reset_read_caches()
+    start = time.perf_counter()
+    results = await asyncio.gather(*[service.get_document("farmers", doc_id) for doc_id in doc_ids])
+    elapsed = time.perf_counter() - start
+    assert all(results), "Some reads returned no document"
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=1000, help="Concurrent reads per run")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated round trip for the stand-in client")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per backend (best is reported)")
+    args = parser.parse_args()
+
+    # Route calls to the real backends even if the app is configured for mock mode
+    settings.USE_MOCK_FIREBASE = False
+
+    threaded, native, source = build_services(args.latency_ms / 1000)
+    doc_ids = [f"bench_farmer_{i}" for i in range(args.reads)]
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        seed_emulator(threaded.db, doc_ids)
+
+    print(f"Benchmarking {args.reads} concurrent reads against {source}")
+    print(f"Thread pool size: {settings.FIRESTORE_MAX_WORKERS}")
+
+    results = {}
+    for name, service in (("threaded", threaded), ("async", native)):
+        timings = [await run_reads(service, doc_ids) for _ in range(args.runs)]
+        best = min(timings)
+        results[name] = best
+        print(f"  {name:<9} best {best * 1000:8.1f} ms  ->  {args.reads / best:10.0f} reads/s")
+
+    print(f"Speed-up of native async: {results['threaded'] / results['async']:.1f}x")
+    shutdown_firestore_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,6 +10,7 @@ import os
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.services.attendance_service import AttendanceService, attendance_id
 from app.services.firebase_service import FirebaseService
 from app.core.config import settings
 
@@ -131,9 +132,8 @@ async def create_attendance_record(farmer_id, farmer_name, farm_id, date, patter
             "updated_at": check_out_time.isoformat()
         })
     
-    # Generate document ID
-    timestamp = check_in_time.strftime("%Y%m%d_%H%M%S")
-    doc_id = f"attendance_{farmer_id}_{timestamp}"
+    # Generate document ID, one per farmer per day
+    doc_id = attendance_id(farmer_id, attendance_data["date"])
     attendance_data["id"] = doc_id
     
     # Save to Firebase
@@ -248,6 +248,10 @@ async def main():
     
     print(f"\nTotal attendance records created: {created_count}")
     
+    # Records written directly skip the daily rollups /stats reads; recompute them
+    rollups = await AttendanceService().rebuild_rollups_for_dates([yesterday, today])
+    print(f"Rebuilt {rollups} daily attendance rollups")
+    
     # Print summary
     print("\nSummary by farm:")
     for farm_id, location in FARM_LOCATIONS.items():
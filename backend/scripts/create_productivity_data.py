@@ -46,7 +46,7 @@ DISEASE_TYPES = [
 ]
 
 async def create_coffee_beans_analysis(farmer_id, farmer_name, farm_id, date, quality_pattern="good"):
-    """Create a coffee beans analysis record"""
+    """Create a coffee beans analysis record (saved in bulk by main)"""
     pattern = QUALITY_PATTERNS[quality_pattern]
     
     # Generate analysis data
@@ -123,13 +123,10 @@ async def create_coffee_beans_analysis(farmer_id, farmer_name, farm_id, date, qu
     doc_id = f"beans_{farmer_id}_{date.strftime('%Y%m%d')}_{random.randint(1000, 9999)}"
     analysis_data["id"] = doc_id
     
-    # Save to Firebase
-    await firebase_service.save_document("coffee_beans_analyses", doc_id, analysis_data)
-    
     return analysis_data
 
 async def create_coffee_leaves_analysis(farmer_id, farmer_name, farm_id, date, health_pattern="healthy"):
-    """Create a coffee leaves analysis record"""
+    """Create a coffee leaves analysis record (saved in bulk by main)"""
     pattern = DISEASE_PATTERNS[health_pattern]
     
     # Generate analysis data
@@ -212,9 +209,6 @@ async def create_coffee_leaves_analysis(farmer_id, farmer_name, farm_id, date, h
     doc_id = f"leaves_{farmer_id}_{date.strftime('%Y%m%d')}_{random.randint(1000, 9999)}"
     analysis_data["id"] = doc_id
     
-    # Save to Firebase
-    await firebase_service.save_document("coffee_leaves_analyses", doc_id, analysis_data)
-    
     return analysis_data
 
 async def main():
@@ -258,8 +252,8 @@ async def main():
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=30)
     
-    beans_count = 0
-    leaves_count = 0
+    beans_analyses = {}
+    leaves_analyses = {}
     
     # Iterate through each day
     current_date = start_date
@@ -276,33 +270,44 @@ async def main():
             if random.random() < profile["analysis_frequency"] / 7:  # Weekly frequency to daily
                 # Create coffee beans analysis
                 try:
-                    await create_coffee_beans_analysis(
+                    analysis = await create_coffee_beans_analysis(
                         farmer_id=farmer_id,
                         farmer_name=farmer_name,
                         farm_id=farm_id,
                         date=current_date,
                         quality_pattern=profile["quality_pattern"]
                     )
-                    beans_count += 1
+                    beans_analyses[analysis["id"]] = analysis
                 except Exception as e:
                     print(f"  Error creating beans analysis for {farmer_name}: {e}")
                 
                 # Sometimes create leaves analysis too (50% chance)
                 if random.random() < 0.5:
                     try:
-                        await create_coffee_leaves_analysis(
+                        analysis = await create_coffee_leaves_analysis(
                             farmer_id=farmer_id,
                             farmer_name=farmer_name,
                             farm_id=farm_id,
                             date=current_date,
                             health_pattern=profile["health_pattern"]
                         )
-                        leaves_count += 1
+                        leaves_analyses[analysis["id"]] = analysis
                     except Exception as e:
                         print(f"  Error creating leaves analysis for {farmer_name}: {e}")
         
         current_date += timedelta(days=1)
     
+    # Save everything with batched writes
+    print(f"\nSaving {len(beans_analyses)} beans and {len(leaves_analyses)} leaves analyses...")
+    beans_result, leaves_result = await asyncio.gather(
+        firebase_service.save_documents_bulk("coffee_beans_analyses", beans_analyses),
+        firebase_service.save_documents_bulk("coffee_leaves_analyses", leaves_analyses)
+    )
+    beans_count = len(beans_result["succeeded"])
+    leaves_count = len(leaves_result["succeeded"])
+    for doc_id, error in {**beans_result["failed"], **leaves_result["failed"]}.items():
+        print(f"  Error saving analysis {doc_id}: {error}")
+    
     print(f"\nTotal analyses created:")
     print(f"  Coffee beans analyses: {beans_count}")
     print(f"  Coffee leaves analyses: {leaves_count}")
@@ -8,75 +8,59 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.firebase_service import FirebaseService
+from app.utils.frame_series import delete_frame_series
 
 async def delete_old_videos():
     """Delete old video analyses"""
     firebase = FirebaseService()
     
     try:
-        # Get all video analyses
-        analyses = await firebase.query_documents(
-            collection="coffee_beans_analyses",
-            filters=[("is_video", "==", True)]
-        )
+        print("Deleting all video analyses...")
         
-        if not analyses:
-            print("No video analyses found")
-            return
-        
-        print(f"Found {len(analyses)} video analyses")
+        found_count = 0
+        deleted_count = 0
+        series_count = 0
         
-        # Show all video analyses first
-        print("\nVideo analyses to delete:")
-        for analysis in analyses:
+        # Stream video analyses page by page; only the fields printed are read
+        async for analysis in firebase.iter_documents(
+            "coffee_beans_analyses",
+            filters=[("is_video", "==", True)],
+            select=["created_at", "user_id", "frame_series"]
+        ):
+            found_count += 1
             doc_id = analysis.get('id')
             created_at = analysis.get('created_at', 'Unknown')
             user_id = analysis.get('user_id', 'Unknown')
             print(f"  - ID: {doc_id}")
             print(f"    Created: {created_at}")
             print(f"    User: {user_id}")
-        
-        # Auto confirm deletion
-        print("\nProceeding to delete all video analyses...")
-        
-        deleted_count = 0
-        
-        for analysis in analyses:
-            doc_id = analysis.get('id')
+            
             if doc_id:
-                try:
-                    # Delete from Firestore
-                    await firebase.delete_document("coffee_beans_analyses", doc_id)
+                # Delete from Firestore; paging resumes after this document, so deletes are safe
+                if await firebase.delete_document("coffee_beans_analyses", doc_id):
                     deleted_count += 1
                     print(f"Deleted: {doc_id}")
-                except Exception as e:
-                    print(f"Error deleting {doc_id}: {e}")
+                    # The per-frame results live in a file the document points to
+                    series = analysis.get('frame_series')
+                    if series:
+                        try:
+                            if delete_frame_series(series["path"]):
+                                series_count += 1
+                        except OSError as e:
+                            print(f"Error deleting frame series of {doc_id}: {e}")
+                else:
+                    print(f"Error deleting {doc_id}")
         
-        print(f"\nTotal documents deleted: {deleted_count}")
+        if not found_count:
+            print("No video analyses found")
+            return
+        
+        print(f"\nFound {found_count} video analyses")
+        print(f"Total documents deleted: {deleted_count}")
+        print(f"Total frame series files deleted: {series_count}")
         
     except Exception as e:
         print(f"Error: {e}")
 
-async def delete_document(firebase, collection, doc_id):
-    """Helper function to delete a document"""
-    # Since FirebaseService doesn't have delete_document, we'll set it to empty
-    # or you can implement actual deletion
-    try:
-        # Get the collection reference
-        if firebase.use_real_firebase:
-            doc_ref = firebase.db.collection(collection).document(doc_id)
-            doc_ref.delete()
-        else:
-            # For mock mode, remove from mock data
-            if collection in firebase._mock_data and doc_id in firebase._mock_data[collection]:
-                del firebase._mock_data[collection][doc_id]
-        print(f"Deleted {doc_id}")
-    except Exception as e:
-        print(f"Error deleting {doc_id}: {e}")
-
-# Monkey patch the delete method
-from app.services.firebase_service import FirebaseService
-FirebaseService.delete_document = delete_document
-
 if __name__ == "__main__":
     asyncio.run(delete_old_videos())
\ No newline at end of file
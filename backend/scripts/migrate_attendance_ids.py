@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Move attendance records to per-farmer, per-day document IDs
+(attendance_{farmer_id}_{date}) and delete the duplicates left by retried
+check-ins under the old timestamped IDs.
+
+Of a farmer's records on a date, the one with the latest check-in is kept,
+the same one the history endpoints used to pick when they deduplicated at
+read time, and the daily rollups of each date changed are rebuilt. Run it
+before deploying the endpoints without that step, when no photo uploads are
+pending.
+
+Usage:
+    python scripts/migrate_attendance_ids.py --days 90 --dry-run
+    python scripts/migrate_attendance_ids.py --from 2025-01-01 --to 2025-03-31
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import date, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.attendance_service import AttendanceService, attendance_id
+from app.services.firebase_service import FirebaseService, shutdown_firestore_executor
+
+
+def plan_date(records, date_str):
+    """Records to save under their new IDs and IDs to delete, for one date"""
+    by_farmer = {}
+    for record in records:
+        if record.get("farmer_id"):
+            by_farmer.setdefault(record["farmer_id"], []).append(record)
+
+    saves, deletes = {}, []
+    for farmer_id, farmer_records in by_farmer.items():
+        doc_id = attendance_id(farmer_id, date_str)
+        if len(farmer_records) == 1 and farmer_records[0]["id"] == doc_id:
+            continue
+        keep = max(farmer_records, key=lambda record: str(record.get("check_in_time") or ""))
+        saves[doc_id] = {**keep, "id": doc_id}
+        deletes.extend(record["id"] for record in farmer_records if record["id"] != doc_id)
+    return saves, deletes
+
+
+async def migrate(dates, concurrency, dry_run):
+    service = FirebaseService()
+    attendance_service = AttendanceService()
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {"moved": 0, "deleted": 0, "failed": 0}
+
+    async def migrate_date(target_date):
+        date_str = target_date.isoformat()
+        async with semaphore:
+            try:
+                records = await service.query_documents("attendance", filters=[("date", "==", date_str)], cache=False)
+                saves, deletes = plan_date(records, date_str)
+                if saves and not dry_run:
+                    # Save the kept records first, so a failure never loses a farmer's day
+                    result = await service.save_documents_bulk("attendance", saves)
+                    if result["failed"]:
+                        raise RuntimeError(f"{len(result['failed'])} records not saved")
+                    result = await service.delete_documents_bulk("attendance", deletes)
+                    if result["failed"]:
+                        raise RuntimeError(f"{len(result['failed'])} duplicates not deleted")
+                    await attendance_service.rebuild_rollups_for_dates([target_date])
+                totals["moved"] += len(saves)
+                totals["deleted"] += len(deletes)
+                if saves:
+                    print(f"  {date_str}  {len(saves)} farmers, {len(deletes)} old records removed")
+            except Exception as e:
+                totals["failed"] += 1
+                print(f"  {date_str}  FAILED: {e}")
+
+    await asyncio.gather(*[migrate_date(target_date) for target_date in dates])
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=date.today(),
+                        help="Last date (YYYY-MM-DD), default today")
+    parser.add_argument("--days", type=int, default=30, help="Dates to migrate ending at --to, if --from is not given")
+    parser.add_argument("--concurrency", type=int, default=8, help="Dates migrated in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    date_from = args.date_from or args.date_to - timedelta(days=args.days - 1)
+    dates = [date_from + timedelta(days=i) for i in range((args.date_to - date_from).days + 1)]
+    print(f"{'Checking' if args.dry_run else 'Migrating'} attendance IDs for {len(dates)} dates")
+
+    totals = asyncio.run(migrate(dates, args.concurrency, args.dry_run))
+    print(f"Done: {totals['moved']} farmer-days {'to move' if args.dry_run else 'moved'}, "
+          f"{totals['deleted']} old records {'to remove' if args.dry_run else 'removed'}, {totals['failed']} dates failed")
+    shutdown_firestore_executor()
+    sys.exit(1 if totals["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
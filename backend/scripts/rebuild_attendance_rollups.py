@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Recompute the per-farm daily attendance rollups (attendance_daily) from raw
+attendance records, several dates in parallel.
+
+Run once after enabling ATTENDANCE_ROLLUPS_ENABLED to backfill past dates,
+and whenever a rollup may have drifted (e.g. a rollup update failed after
+its attendance record was saved). Check-ins recorded while a date is being
+rebuilt can be lost, so rebuild today's rollups when check-ins are quiet.
+
+Usage:
+    python scripts/rebuild_attendance_rollups.py --from 2025-01-01 --to 2025-03-31
+    python scripts/rebuild_attendance_rollups.py --days 7 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.attendance_service import AttendanceService
+from app.services.firebase_service import shutdown_firestore_executor
+
+
+async def rebuild(dates, concurrency):
+    service = AttendanceService()
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def rebuild_date(target_date):
+        nonlocal failures
+        async with semaphore:
+            try:
+                written = await service.rebuild_rollups(target_date)
+                print(f"  {target_date.isoformat()}  {written} rollups")
+            except Exception as e:
+                failures += 1
+                print(f"  {target_date.isoformat()}  FAILED: {e}")
+
+    await asyncio.gather(*[rebuild_date(target_date) for target_date in dates])
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=date.today(),
+                        help="Last date (YYYY-MM-DD), default today")
+    parser.add_argument("--days", type=int, default=30, help="Dates to rebuild ending at --to, if --from is not given")
+    parser.add_argument("--concurrency", type=int, default=8, help="Dates rebuilt in parallel")
+    args = parser.parse_args()
+
+    date_from = args.date_from or args.date_to - timedelta(days=args.days - 1)
+    dates = [date_from + timedelta(days=i) for i in range((args.date_to - date_from).days + 1)]
+    print(f"Rebuilding attendance rollups for {len(dates)} dates, {args.concurrency} at a time")
+
+    start = time.perf_counter()
+    failures = asyncio.run(rebuild(dates, args.concurrency))
+    print(f"Done in {time.perf_counter() - start:.1f}s, {failures} dates failed")
+    shutdown_firestore_executor()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -103,7 +103,7 @@ export const farmersApi = baseApi.injectEndpoints({
       to_date: string;
       total_records: number;
       limit: number;
-      offset: number;
+      next_page_token: string | null;
       attendances: any[];
     }, string>({
       query: (farmerId) => `/farmers/${farmerId}/attendances`,